@@ -0,0 +1,458 @@
+"""
+A set of functions for keeping a bitmap index of target and type presence across samples.
+
+Each sample is given an ordinal (its position in the index), and each target and type has a
+bitset where bit `i` is set if it was found in sample `i`. Set questions across a cohort
+(e.g. samples of type IV that lack mecA) are then a few bitwise operations.
+
+Each bitset in the file has room for more samples than it holds, so adding a sample only
+writes the bits it sets, its name and the header. The index is only rewritten (with twice
+the room) once the room runs out.
+"""
+import fcntl
+import json
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+BITMAP_MAGIC = b"CAMLHMP-BITMAP-2\n"
+BITMAP_KINDS = ["target", "type"]
+
+# The least room a rewritten index leaves for samples, keys and the header (in bytes)
+MIN_CAPACITY = 1024
+MIN_SLOTS = 64
+HEADER_SIZE = 4096
+
+
+def empty_bitmap_index(schema: str) -> dict:
+    """
+    Create an empty bitmap index.
+
+    Args:
+        schema (str): The schema ID of the framework the index is for
+
+    Returns:
+        dict: the index, with its schema, samples and bitsets
+
+    Examples:
+        >>> from camlhmp.bitmap import empty_bitmap_index
+        >>> index = empty_bitmap_index("sccmec")
+    """
+    return {"schema": schema, "samples": [], "ordinals": {}, "bitsets": {}, "live": 0}
+
+
+@contextmanager
+def lock_bitmap_index(path: str, exclusive: bool = False):
+    """
+    Lock a bitmap index (`{path}.lock`) while it is read or updated.
+
+    Readers share the lock, and an index that has never been updated has nothing to wait on.
+
+    Args:
+        path (str): The bitmap index file
+        exclusive (bool, optional): Lock out all other readers and writers. Defaults to False.
+
+    Examples:
+        >>> from camlhmp.bitmap import lock_bitmap_index
+        >>> with lock_bitmap_index("cohort.bitmap"):
+        ...     index = read_index("cohort.bitmap")
+    """
+    lock_path = f"{path}.lock"
+    if not exclusive and not Path(lock_path).exists():
+        yield
+        return
+
+    with open(lock_path, "a" if exclusive else "r") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def read_header(fh, path: str) -> list:
+    """
+    Read the header of an open bitmap index.
+
+    Args:
+        fh (file): The bitmap index, opened in binary mode
+        path (str): The bitmap index file (for errors)
+
+    Returns:
+        list: the header, and the offset its bitsets start at
+
+    Raises:
+        ValueError: if the file is not a bitmap index
+
+    Examples:
+        >>> from camlhmp.bitmap import read_header
+        >>> with open("cohort.bitmap", "rb") as fh:
+        ...     header, start = read_header(fh, "cohort.bitmap")
+    """
+    fh.seek(0)
+    if fh.readline() != BITMAP_MAGIC:
+        raise ValueError(f"{path} is not a camlhmp bitmap index")
+    line = fh.readline()
+    return [json.loads(line), len(BITMAP_MAGIC) + len(line)]
+
+
+def write_header(fh, header: dict, size: int):
+    """
+    Write the header of an open bitmap index in place, padded to its reserved size.
+
+    Args:
+        fh (file): The bitmap index, opened in binary mode
+        header (dict): The header
+        size (int): The bytes reserved for the header
+
+    Raises:
+        ValueError: if the header does not fit in its reserved size
+
+    Examples:
+        >>> from camlhmp.bitmap import write_header
+        >>> write_header(fh, header, size)
+    """
+    line = json.dumps(header).encode()
+    if len(line) >= size:
+        raise ValueError(f"Bitmap header needs {len(line) + 1} bytes, only {size} are reserved")
+    fh.seek(len(BITMAP_MAGIC))
+    fh.write(line.ljust(size - 1) + b"\n")
+
+
+def read_index(path: str) -> dict:
+    """
+    Read a bitmap index from a file, without taking its lock.
+
+    Args:
+        path (str): The bitmap index file
+
+    Returns:
+        dict: the index, with its schema, samples and bitsets
+
+    Raises:
+        ValueError: if the file is not a bitmap index
+
+    Examples:
+        >>> from camlhmp.bitmap import read_index
+        >>> index = read_index("cohort.bitmap")
+    """
+    with open(path, "rb") as fh:
+        header, start = read_header(fh, path)
+        nbytes = header["capacity"] // 8
+        data = fh.read(len(header["keys"]) * nbytes)
+        fh.seek(start + header["slots"] * nbytes)
+        names = fh.read(header["names_end"] - fh.tell())
+
+    # Bits past the last sample belong to an update that was never finished
+    count = header["count"]
+    mask = (1 << count) - 1
+    bitsets = {}
+    for slot, key in enumerate(header["keys"]):
+        bitsets[key] = int.from_bytes(data[slot * nbytes : (slot + 1) * nbytes], "little") & mask
+
+    # A re-typed sample has a new ordinal, only its latest one is live
+    samples = names.decode().split("\n")[:count]
+    ordinals = {sample: i for i, sample in enumerate(samples)}
+    live = bytearray((count + 7) // 8)
+    for ordinal in ordinals.values():
+        live[ordinal // 8] |= 1 << (ordinal % 8)
+
+    return {
+        "schema": header["schema"],
+        "samples": samples,
+        "ordinals": ordinals,
+        "bitsets": bitsets,
+        "live": int.from_bytes(live, "little"),
+    }
+
+
+def read_bitmap_index(path: str) -> dict:
+    """
+    Read a bitmap index from a file.
+
+    Args:
+        path (str): The bitmap index file
+
+    Returns:
+        dict: the index, with its schema, samples and bitsets
+
+    Raises:
+        ValueError: if the file is not a bitmap index
+
+    Examples:
+        >>> from camlhmp.bitmap import read_bitmap_index
+        >>> index = read_bitmap_index("cohort.bitmap")
+    """
+    with lock_bitmap_index(path):
+        return read_index(path)
+
+
+def write_bitmap_index(index: dict, path: str):
+    """
+    Write a bitmap index to a file, replacing it atomically.
+
+    The file is a JSON header (schema, room and keys), then a bitset for each key and the
+    sample names. The header and bitsets are written with room to spare (at least twice
+    what the index holds), so samples and keys can later be added in place.
+
+    Args:
+        index (dict): The bitmap index
+        path (str): The bitmap index file
+
+    Examples:
+        >>> from camlhmp.bitmap import write_bitmap_index
+        >>> write_bitmap_index(index, "cohort.bitmap")
+    """
+    keys = sorted(index["bitsets"])
+    count = len(index["samples"])
+    capacity = max(MIN_CAPACITY, (2 * count + 7) // 8 * 8)
+    slots = max(MIN_SLOTS, 2 * len(keys))
+    nbytes = capacity // 8
+    names = "".join(f"{sample}\n" for sample in index["samples"]).encode()
+
+    header = {"schema": index["schema"], "capacity": capacity, "slots": slots, "keys": keys, "count": count}
+    size = max(HEADER_SIZE, (2 * len(json.dumps(header)) + HEADER_SIZE - 1) // HEADER_SIZE * HEADER_SIZE)
+    names_start = len(BITMAP_MAGIC) + size + slots * nbytes
+    header.update(names_end=names_start + len(names), pending=None)
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as fh:
+        fh.write(BITMAP_MAGIC)
+        write_header(fh, header, size)
+        for key in keys:
+            fh.write(index["bitsets"][key].to_bytes(nbytes, "little"))
+        # Unused slots are left as a hole, which reads back as zeros
+        fh.seek(names_start)
+        fh.write(names)
+    os.replace(tmp_path, path)
+
+
+def get_states(target_states: dict, type_states: dict) -> dict:
+    """
+    Get the bitset key of each target and type state.
+
+    Args:
+        target_states (dict): Whether each target was found {target: bool}
+        type_states (dict): Whether each type was matched {type: bool}
+
+    Returns:
+        dict: whether each key is set {"kind:name": bool}
+
+    Examples:
+        >>> from camlhmp.bitmap import get_states
+        >>> get_states({"mecA": True}, {"IV": False})
+        {'target:mecA': True, 'type:IV': False}
+    """
+    states = {}
+    for kind, kind_states in zip(BITMAP_KINDS, [target_states, type_states]):
+        for name, found in kind_states.items():
+            states[f"{kind}:{name}"] = bool(found)
+    return states
+
+
+def add_sample(index: dict, sample: str, target_states: dict, type_states: dict) -> int:
+    """
+    Add (or replace) the target and type states of a sample in a bitmap index.
+
+    The sample always gets a new ordinal, so only the bits it sets are touched. When a
+    sample is re-typed, its previous ordinal is no longer live and is left out of queries.
+
+    Args:
+        index (dict): The bitmap index
+        sample (str): The sample name
+        target_states (dict): Whether each target was found {target: bool}
+        type_states (dict): Whether each type was matched {type: bool} (e.g. the status of
+            each type from `check_types`)
+
+    Returns:
+        int: the ordinal of the sample
+
+    Examples:
+        >>> from camlhmp.bitmap import add_sample
+        >>> type_states = {type: vals["status"] for type, vals in type_hits.items()}
+        >>> add_sample(index, "sample01", target_results, type_states)
+    """
+    ordinal = len(index["samples"])
+    bit = 1 << ordinal
+    if sample in index["ordinals"]:
+        index["live"] &= ~(1 << index["ordinals"][sample])
+    index["samples"].append(sample)
+    index["ordinals"][sample] = ordinal
+    index["live"] |= bit
+
+    for key, found in get_states(target_states, type_states).items():
+        index["bitsets"].setdefault(key, 0)
+        if found:
+            index["bitsets"][key] |= bit
+    return ordinal
+
+
+def has_room(header: dict, size: int, keys: list) -> bool:
+    """
+    Check if a sample (and any new keys) can be added to a bitmap index in place.
+
+    Args:
+        header (dict): The header of the bitmap index
+        size (int): The bytes reserved for the header
+        keys (list): The keys of the index, with any the sample adds
+
+    Returns:
+        bool: True if there is room for the sample, and no update was left unfinished
+
+    Examples:
+        >>> from camlhmp.bitmap import has_room
+        >>> has_room(header, size, keys)
+    """
+    # Leave space in the header for the counts and offsets to grow a few digits
+    header_length = len(json.dumps({**header, "keys": keys, "pending": header["count"]})) + 64
+    return (
+        header["pending"] is None
+        and header["count"] < header["capacity"]
+        and len(keys) <= header["slots"]
+        and header_length < size
+    )
+
+
+def update_bitmap_index(path: str, schema: str, sample: str, target_states: dict, type_states: dict) -> int:
+    """
+    Add a sample to a bitmap index file, creating it if needed.
+
+    The sample is added in place, writing only the bits it sets, its name and the header.
+    The update holds a lock (`{path}.lock`), so many samples can update the same index at
+    the same time. If an update was interrupted, or the index is out of room, it is first
+    rewritten with `write_bitmap_index`.
+
+    Args:
+        path (str): The bitmap index file
+        schema (str): The schema ID of the framework the sample was typed with
+        sample (str): The sample name
+        target_states (dict): Whether each target was found {target: bool}
+        type_states (dict): Whether each type was matched {type: bool}
+
+    Returns:
+        int: the ordinal of the sample
+
+    Raises:
+        ValueError: if the index is for a different schema
+
+    Examples:
+        >>> from camlhmp.bitmap import update_bitmap_index
+        >>> update_bitmap_index("cohort.bitmap", "sccmec", "sample01", target_states, type_states)
+    """
+    states = get_states(target_states, type_states)
+    with lock_bitmap_index(path, exclusive=True):
+        if Path(path).exists():
+            with open(path, "rb") as fh:
+                header, start = read_header(fh, path)
+            if header["schema"] != schema:
+                raise ValueError(f"{path} is an index of {header['schema']}, not {schema}")
+            keys = header["keys"] + sorted(set(states) - set(header["keys"]))
+            if not has_room(header, start - len(BITMAP_MAGIC), keys):
+                logging.debug(f"Rewriting {path} with room for more samples")
+                index = read_index(path)
+                for key in keys:
+                    index["bitsets"].setdefault(key, 0)
+                write_bitmap_index(index, path)
+        else:
+            index = empty_bitmap_index(schema)
+            index["bitsets"] = dict.fromkeys(states, 0)
+            write_bitmap_index(index, path)
+
+        with open(path, "r+b") as fh:
+            header, start = read_header(fh, path)
+            size = start - len(BITMAP_MAGIC)
+            nbytes = header["capacity"] // 8
+            ordinal = header["count"]
+            header["keys"] += sorted(set(states) - set(header["keys"]))
+
+            # Mark the update as pending until it is done, so an interrupted one is cleaned up
+            write_header(fh, {**header, "pending": ordinal}, size)
+            bit = 1 << (ordinal % 8)
+            for slot, key in enumerate(header["keys"]):
+                if states.get(key):
+                    offset = start + slot * nbytes + ordinal // 8
+                    fh.seek(offset)
+                    byte = fh.read(1)[0]
+                    fh.seek(offset)
+                    fh.write(bytes([byte | bit]))
+            name = f"{sample}\n".encode()
+            fh.seek(header["names_end"])
+            fh.write(name)
+            header.update(count=ordinal + 1, names_end=header["names_end"] + len(name), pending=None)
+            write_header(fh, header, size)
+    logging.debug(f"Added {sample} to {path} as sample {ordinal}")
+    return ordinal
+
+
+def query_bitmap(
+    index: dict, has: list = None, lacks: list = None, types: list = None, not_types: list = None
+) -> int:
+    """
+    Find the samples matching a set of conditions.
+
+    Args:
+        index (dict): The bitmap index
+        has (list, optional): Targets that must have been found. Defaults to None.
+        lacks (list, optional): Targets that must not have been found. Defaults to None.
+        types (list, optional): Samples matching any of these types. Defaults to None.
+        not_types (list, optional): Samples matching none of these types. Defaults to None.
+
+    Returns:
+        int: a bitset of the matching samples (see `get_samples` and `int.bit_count`)
+
+    Raises:
+        KeyError: if a target or type is not in the index
+
+    Examples:
+        >>> from camlhmp.bitmap import query_bitmap
+        >>> matches = query_bitmap(index, types=["IV"], lacks=["mecA"])
+        >>> matches.bit_count()
+    """
+
+    def bitset(kind, name):
+        key = f"{kind}:{name}"
+        if key not in index["bitsets"]:
+            raise KeyError(f"{kind} {name} is not in the index")
+        return index["bitsets"][key]
+
+    # Only the latest ordinal of each sample is live
+    matches = index["live"]
+    for target in has or []:
+        matches &= bitset("target", target)
+    for target in lacks or []:
+        matches &= ~bitset("target", target)
+    if types:
+        any_type = 0
+        for type in types:
+            any_type |= bitset("type", type)
+        matches &= any_type
+    for type in not_types or []:
+        matches &= ~bitset("type", type)
+    return matches
+
+
+def get_samples(index: dict, bits: int) -> list:
+    """
+    Get the names of the samples in a bitset.
+
+    Args:
+        index (dict): The bitmap index
+        bits (int): A bitset of samples (e.g. from `query_bitmap`)
+
+    Returns:
+        list: the sample names, in order of their ordinals
+
+    Examples:
+        >>> from camlhmp.bitmap import get_samples
+        >>> samples = get_samples(index, query_bitmap(index, has=["ccrA2"]))
+    """
+    # Walk the set bits of the binary string (lowest first), rather than shifting copies
+    # of a large bitset
+    digits = bin(bits)[:1:-1]
+    samples = []
+    ordinal = digits.find("1")
+    while ordinal != -1:
+        samples.append(index["samples"][ordinal])
+        ordinal = digits.find("1", ordinal + 1)
+    return samples
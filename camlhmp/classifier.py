@@ -0,0 +1,211 @@
+"""
+An in-process API for typing many samples against a framework.
+
+A `Classifier` is built once from a framework (its types, target lengths and engine), then
+called on each sample. Results are returned as dicts, nothing is printed or written, so
+camlhmp can be embedded in other Python applications.
+"""
+import logging
+import tempfile
+from pathlib import Path
+from typing import Union
+
+from camlhmp.engines import available_engines, get_engine, get_engine_params
+from camlhmp.engines.blast import HIT_LIMIT_PARAMS, get_blastn_tasks
+from camlhmp.framework import (check_regions, check_types, get_types,
+                               read_framework)
+from camlhmp.parsers.blast import (finalize_alleles, finalize_regions,
+                                   finalize_targets, get_blast_allele_hits,
+                                   get_blast_region_hits,
+                                   get_blast_target_hits)
+from camlhmp.utils import get_tmpdir, parse_seq_lengths, validate_file
+
+CLASSIFIER_MODES = ["targets", "regions", "alleles"]
+
+# Same as the defaults of the camlhmp-blast-* commands
+DEFAULT_MIN_PIDENT = 95
+DEFAULT_MIN_COVERAGE = 95
+
+
+class Classifier:
+    """
+    Type samples against a framework, without any console output or files written.
+
+    Thresholds not provided are taken from the framework's `engine.params`, falling back to
+    the defaults of the CLI commands.
+
+    Attributes:
+        framework (dict): The parsed framework
+        targets (str): The targets in FASTA format
+        mode (str): How the framework is evaluated ('targets', 'regions' or 'alleles')
+        min_pident (float): The minimum percent identity to count a hit
+        min_coverage (int): The minimum percent coverage to count a hit
+        engine (Engine): The engine declared by the framework
+        types (dict): The types of the framework (from `get_types`)
+        target_lengths (dict): The length of each target (regions only)
+        tasks (dict): The blastn task of each target (BLAST+ blastn frameworks only)
+        engine_params (dict): The parameters passed through to the engine
+
+    Examples:
+        >>> from camlhmp.classifier import Classifier
+        >>> classifier = Classifier("sccmec.yaml", "sccmec.fasta")
+        >>> for sample, assembly in assemblies.items():
+        ...     results = classifier.classify(assembly, prefix=sample)
+        ...     print(sample, results["result"]["type"])
+    """
+
+    def __init__(
+        self,
+        framework: Union[str, dict],
+        targets: str,
+        mode: str = "targets",
+        min_pident: float = None,
+        min_coverage: int = None,
+        blast_task: str = None,
+        preset: str = None,
+        params: dict = None,
+    ):
+        """
+        Load a framework and prepare it to type samples.
+
+        Args:
+            framework (str|dict): The framework YAML file, or an already parsed framework
+            targets (str): The targets in FASTA format
+            mode (str, optional): How the framework is evaluated ('targets', 'regions' or
+                'alleles'). Defaults to "targets".
+            min_pident (float, optional): The minimum percent identity to count a hit.
+                Defaults to the framework's params, or 95.
+            min_coverage (int, optional): The minimum percent coverage to count a hit.
+                Defaults to the framework's params, or 95.
+            blast_task (str, optional): The blastn task to search with, 'auto' selects one for
+                each target by its length and `min_pident`. Defaults to the engine parameters'
+                task, or "auto".
+            preset (str, optional): A named set of engine parameters, replacing the framework's
+                preset. Defaults to None.
+            params (dict, optional): Parameters to pass to the engine, taking precedence over
+                the framework's. Defaults to None.
+
+        Raises:
+            ValueError: if the mode, engine, tool or an engine parameter is not supported
+        """
+        if mode not in CLASSIFIER_MODES:
+            raise ValueError(f"Unsupported mode ('{mode}'), expected one of: {', '.join(CLASSIFIER_MODES)}")
+        self.framework = read_framework(validate_file(framework)) if not isinstance(framework, dict) else framework
+        self.targets = str(validate_file(targets))
+        self.mode = mode
+
+        thresholds = self.framework["engine"].get("params")
+        thresholds = thresholds if isinstance(thresholds, dict) else {}
+        self.min_pident = min_pident if min_pident is not None else thresholds.get("min_pident", DEFAULT_MIN_PIDENT)
+        self.min_coverage = (
+            min_coverage if min_coverage is not None else thresholds.get("min_coverage", DEFAULT_MIN_COVERAGE)
+        )
+
+        engine = self.framework["engine"]["type"]
+        if engine not in available_engines():
+            raise ValueError(f"Unsupported engine ('{engine}'), available engines: {list(available_engines())}")
+        self.engine = get_engine(engine)
+        self.tool = self.engine.validate_tool(self.framework["engine"]["tool"])
+
+        # Everything that only depends on the framework is prepared once
+        self.types = get_types(self.framework) if mode != "alleles" else {}
+        self.target_lengths = parse_seq_lengths(self.targets, "fasta") if mode == "regions" else {}
+        self.engine_params = get_engine_params(self.engine, self.tool, self.framework, preset=preset, params=params)
+        task = self.engine_params.pop("task", "auto")
+        blast_task = blast_task or task
+        if mode == "regions":
+            for param in HIT_LIMIT_PARAMS:
+                if self.engine_params.pop(param, None) is not None:
+                    logging.warning(f"{param} would limit the hits a region's coverage is summed from, ignoring it")
+
+        self.tasks = None
+        if self.engine.name == "blast" and self.tool == "blastn":
+            self.tasks = get_blastn_tasks(self.targets, self.min_pident, task=blast_task)
+        if hasattr(self.engine, "get_target_index"):
+            self.engine.get_target_index(self.targets)
+        logging.debug(f"Classifier ready for {self.framework['metadata']['id']} ({mode})")
+
+    def search(self, subject: str) -> list:
+        """
+        Search the targets against a sample.
+
+        Regions are searched without thresholds, as coverage is summed across all hits.
+
+        Args:
+            subject (str): The sample in FASTA format (optionally compressed)
+
+        Returns:
+            list: the hits, with the columns of `BLASTN_COLS`
+        """
+        params = {"tasks": self.tasks, **self.engine_params}
+        if self.mode == "regions":
+            _, hits, _ = self.engine.search(self.tool, subject, self.targets, 0, 0, params=params)
+        else:
+            _, hits, _ = self.engine.search(
+                self.tool, subject, self.targets, self.min_pident, self.min_coverage, params=params
+            )
+        return hits
+
+    def classify_hits(self, hits: list, prefix: str = "camlhmp") -> dict:
+        """
+        Type a sample from the hits of a search.
+
+        Args:
+            hits (list): The hits of the sample (e.g. from `search` or `read_blast_hits`)
+            prefix (str, optional): The sample name. Defaults to "camlhmp".
+
+        Returns:
+            dict: the final `result`, the `details` against each type, the per-target
+                `targets` results and the `hits`
+        """
+        args = [self.framework, self.min_pident, self.min_coverage, self.tasks, self.engine_params]
+        details = []
+        if self.mode == "targets":
+            target_results = get_blast_target_hits(
+                self.framework["targets"], [hit["qseqid"] for hit in hits if hit["qseqid"] != "NO_HITS"]
+            )
+            result, details = finalize_targets(prefix, target_results, check_types(self.types, target_results), *args)
+        elif self.mode == "regions":
+            target_results = get_blast_region_hits(self.target_lengths, hits, self.min_pident, self.min_coverage)
+            result, details = finalize_regions(
+                prefix, check_regions(self.types, target_results, self.min_coverage), *args
+            )
+        else:
+            target_results = get_blast_allele_hits(self.framework["targets"], hits, self.min_pident, self.min_coverage)
+            result = finalize_alleles(prefix, target_results, *args)
+
+        return {"result": result, "details": details, "targets": target_results, "hits": hits}
+
+    def classify(self, subject: Union[str, Path], prefix: str = "camlhmp") -> dict:
+        """
+        Type a sample.
+
+        Args:
+            subject (str|Path): The sample in FASTA format (optionally compressed)
+            prefix (str, optional): The sample name. Defaults to "camlhmp".
+
+        Returns:
+            dict: the final `result`, the `details` against each type, the per-target
+                `targets` results and the `hits`
+        """
+        return self.classify_hits(self.search(validate_file(subject)), prefix)
+
+    def classify_sequences(self, sequences: dict, prefix: str = "camlhmp") -> dict:
+        """
+        Type a sample held in memory.
+
+        Args:
+            sequences (dict): The sequences of the sample {name: sequence}
+            prefix (str, optional): The sample name. Defaults to "camlhmp".
+
+        Returns:
+            dict: the final `result`, the `details` against each type, the per-target
+                `targets` results and the `hits`
+        """
+        with tempfile.TemporaryDirectory(prefix="camlhmp-", dir=get_tmpdir()) as tmpdir:
+            # The engines read subjects from a file
+            subject = f"{tmpdir}/subject.fasta"
+            with open(subject, "w") as fh:
+                for name, seq in sequences.items():
+                    fh.write(f">{name}\n{seq}\n")
+            return self.classify_hits(self.search(subject), prefix)
@@ -0,0 +1,278 @@
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import rich
+import rich.console
+import rich.traceback
+import rich_click as click
+from rich import print
+from rich.logging import RichHandler
+from rich.table import Table
+
+from camlhmp.classifier import CLASSIFIER_MODES
+from camlhmp.concordance import check_concordance, get_sample_names
+from camlhmp.engines import parse_engine_params
+from camlhmp.framework import print_version, read_framework
+from camlhmp.utils import file_exists_error, validate_file, write_tsv
+
+# Set up Rich
+stderr = rich.console.Console(stderr=True)
+rich.traceback.install(console=stderr, width=200, word_wrap=True, extra_lines=1)
+click.rich_click.USE_RICH_MARKUP = True
+click.rich_click.OPTION_GROUPS = {
+    "camlhmp": [
+        {
+            "name": "Required Options",
+            "options": [
+                "--yaml",
+                "--targets",
+            ],
+        },
+        {
+            "name": "Input Options",
+            "options": [
+                "--fofn",
+            ],
+        },
+        {
+            "name": "Concordance Options",
+            "options": [
+                "--mode",
+                "--preset",
+                "--engine-param",
+                "--min-pident",
+                "--min-coverage",
+            ],
+        },
+        {
+            "name": "Additional Options",
+            "options": [
+                "--prefix",
+                "--outdir",
+                "--force",
+                "--verbose",
+                "--silent",
+                "--version",
+                "--help",
+            ],
+        },
+    ]
+}
+
+
+@click.command()
+@click.argument("inputs", nargs=-1)
+@click.option(
+    "--yaml",
+    "-y",
+    required=True,
+    default=os.environ.get("CAML_YAML", None),
+    show_default=True,
+    help="YAML file documenting the targets and types",
+)
+@click.option(
+    "--targets",
+    "-t",
+    required=False if "--version" in sys.argv else True,
+    default=os.environ.get("CAML_TARGETS", None),
+    show_default=True,
+    help="Query targets in FASTA format",
+)
+@click.option(
+    "--fofn",
+    "-f",
+    help="A file with the path of a reference sample on each line (for many inputs)",
+)
+@click.option(
+    "--mode",
+    "-m",
+    type=click.Choice(CLASSIFIER_MODES, case_sensitive=False),
+    default="targets",
+    show_default=True,
+    help="How the framework is evaluated (e.g. 'regions' for camlhmp-blast-regions frameworks)",
+)
+@click.option(
+    "--preset",
+    help="The named set of engine parameters to check (blast: fast, sensitive)",
+)
+@click.option(
+    "--engine-param",
+    multiple=True,
+    help="A parameter to pass to the engine as KEY=VALUE (e.g. max_hsps=1) to check (repeatable)",
+)
+@click.option(
+    "--min-pident",
+    type=float,
+    help="Minimum percent identity to count a hit (default: the framework's, or 95)",
+)
+@click.option(
+    "--min-coverage",
+    type=int,
+    help="Minimum percent coverage to count a hit (default: the framework's, or 95)",
+)
+@click.option(
+    "--outdir",
+    "-o",
+    type=click.Path(exists=False),
+    default="./",
+    show_default=True,
+    help="Directory to write output",
+)
+@click.option(
+    "--prefix",
+    "-p",
+    type=str,
+    default="camlhmp",
+    show_default=True,
+    help="Prefix to use for output files",
+)
+@click.option("--force", is_flag=True, help="Overwrite existing reports")
+@click.option("--verbose", is_flag=True, help="Increase the verbosity of output")
+@click.option("--silent", is_flag=True, help="Only critical errors will be printed")
+@click.option("--version", is_flag=True, help="Print schema and camlhmp version")
+def camlhmp_blast_concordance(
+    inputs,
+    yaml,
+    targets,
+    fofn,
+    mode,
+    preset,
+    engine_param,
+    min_pident,
+    min_coverage,
+    prefix,
+    outdir,
+    force,
+    verbose,
+    silent,
+    version,
+):
+    """🐪 camlhmp-blast-concordance 🐪 - Check if engine parameters change the types called for reference samples"""
+    # Setup logs
+    logging.basicConfig(
+        format="%(asctime)s:%(name)s:%(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        handlers=[
+            RichHandler(rich_tracebacks=True, console=rich.console.Console(stderr=True))
+        ],
+    )
+    logging.getLogger().setLevel(
+        logging.ERROR if silent else logging.DEBUG if verbose else logging.INFO
+    )
+
+    # Verify input files are available
+    yaml_path = validate_file(yaml)
+
+    # Read the YAML file
+    framework = read_framework(yaml_path)
+
+    # If prompted, print the schema and camlhmp version, then exit
+    if version:
+        print_version(framework)
+
+    # Collect the reference samples, a file of filenames avoids command line limits
+    paths = list(inputs)
+    if fofn:
+        with open(validate_file(fofn), "rt") as fh:
+            paths.extend(line.strip() for line in fh if line.strip())
+    if not paths:
+        raise click.UsageError("No reference samples to check, provide FASTA files or --fofn")
+    if not preset and not engine_param:
+        raise click.UsageError("Nothing to check, provide --preset and/or --engine-param")
+    samples = get_sample_names([str(validate_file(path)) for path in paths])
+    targets_path = validate_file(targets)
+
+    # Create the output directory
+    logging.debug(f"Creating output directory: {outdir}")
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+
+    # Output files
+    concordance_tsv = f"{outdir}/{prefix}.concordance.tsv".replace("//", "/")
+    file_exists_error(concordance_tsv, force)
+
+    # Describe the command line arguments
+    console = rich.console.Console(stderr=True)
+    print(
+        "[italic]Running [deep_sky_blue1]camlhmp-blast-concordance[/deep_sky_blue1] with following parameters:[/italic]",
+        file=sys.stderr,
+    )
+    print(f"[italic]    --inputs {len(samples)} samples[/italic]", file=sys.stderr)
+    print(f"[italic]    --yaml {yaml}[/italic]", file=sys.stderr)
+    print(f"[italic]    --targets {targets}[/italic]", file=sys.stderr)
+    print(f"[italic]    --mode {mode}[/italic]", file=sys.stderr)
+    print(f"[italic]    --preset {preset}[/italic]", file=sys.stderr)
+    print(f"[italic]    --engine-param {','.join(engine_param)}[/italic]", file=sys.stderr)
+    print(f"[italic]    --min-pident {min_pident}[/italic]", file=sys.stderr)
+    print(f"[italic]    --min-coverage {min_coverage}[/italic]", file=sys.stderr)
+    print(f"[italic]    --outdir {outdir}[/italic]", file=sys.stderr)
+    print(f"[italic]    --prefix {prefix}[/italic]\n", file=sys.stderr)
+
+    print(
+        f"[italic]Typing {len(samples)} samples with and without the engine parameters...[/italic]",
+        file=sys.stderr,
+    )
+    start_time = time.perf_counter()
+    rows = check_concordance(
+        framework,
+        targets_path,
+        samples,
+        mode=mode,
+        preset=preset,
+        params=parse_engine_params(engine_param),
+        min_pident=min_pident,
+        min_coverage=min_coverage,
+    )
+    print(f"[italic]    Total time: {time.perf_counter() - start_time:.2f}s[/italic]", file=sys.stderr)
+
+    # Finalize the results
+    print("[italic]Final Results...[/italic]", file=sys.stderr)
+    type_table = Table(title=f"{framework['metadata']['name']}")
+    type_table.add_column("sample", style="white")
+    type_table.add_column("baseline_type", style="white")
+    type_table.add_column("preset_type", style="white")
+    type_table.add_column("concordant", style="cyan")
+    type_table.add_column("baseline_time", style="cyan")
+    type_table.add_column("preset_time", style="cyan")
+    for row in rows:
+        type_table.add_row(
+            row["sample"],
+            row["baseline_type"],
+            row["preset_type"],
+            str(row["concordant"]),
+            f"{row['baseline_time']:.2f}",
+            f"{row['preset_time']:.2f}",
+        )
+    console.print(type_table)
+
+    discordant = [row["sample"] for row in rows if not row["concordant"]]
+    baseline_time = sum(row["baseline_time"] for row in rows)
+    preset_time = sum(row["preset_time"] for row in rows)
+    print(
+        f"[italic]{len(rows) - len(discordant)} of {len(rows)} samples are concordant "
+        f"(baseline {baseline_time:.2f}s, preset {preset_time:.2f}s)[/italic]",
+        file=sys.stderr,
+    )
+    if discordant:
+        logging.warning(f"The engine parameters change the call for: {', '.join(discordant)}")
+
+    # Write the results
+    print("[italic]Writing outputs...[/italic]", file=sys.stderr)
+    print(
+        f"[italic]Concordance of each sample written to [deep_sky_blue1]{concordance_tsv}[/deep_sky_blue1][/italic]",
+        file=sys.stderr,
+    )
+    write_tsv(rows, concordance_tsv)
+
+
+def main():
+    if len(sys.argv) == 1:
+        camlhmp_blast_concordance.main(["--help"])
+    else:
+        camlhmp_blast_concordance()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import rich
+import rich.console
+import rich.traceback
+import rich_click as click
+from rich import print
+from rich.logging import RichHandler
+from rich.table import Table
+
+from camlhmp.engines import (available_engines, get_engine, get_engine_params,
+                             parse_engine_params)
+from camlhmp.engines.blast import BLASTN_TASK_CHOICES
+from camlhmp.framework import print_version, read_framework
+from camlhmp.parsers.blast import read_blast_hits
+from camlhmp.sweep import (SWEEP_MODES, flag_type_changes, get_task_groups,
+                           parse_grid, sweep_thresholds)
+from camlhmp.utils import (file_exists_error, parse_seq_lengths,
+                           validate_engine, validate_file, write_tsv)
+
+# Set up Rich
+stderr = rich.console.Console(stderr=True)
+rich.traceback.install(console=stderr, width=200, word_wrap=True, extra_lines=1)
+click.rich_click.USE_RICH_MARKUP = True
+click.rich_click.OPTION_GROUPS = {
+    "camlhmp": [
+        {
+            "name": "Required Options",
+            "options": [
+                "--input",
+                "--yaml",
+                "--targets",
+            ],
+        },
+        {
+            "name": "Sweep Options",
+            "options": [
+                "--mode",
+                "--pident-grid",
+                "--coverage-grid",
+                "--blast-task",
+                "--preset",
+                "--engine-param",
+                "--from-hits",
+            ],
+        },
+        {
+            "name": "Additional Options",
+            "options": [
+                "--prefix",
+                "--outdir",
+                "--force",
+                "--verbose",
+                "--silent",
+                "--version",
+                "--help",
+            ],
+        },
+    ]
+}
+
+
+@click.command()
+@click.option(
+    "--input",
+    "-i",
+    required=False if "--version" in sys.argv or "--from-hits" in sys.argv else True,
+    help="Input file in FASTA format to classify",
+)
+@click.option(
+    "--yaml",
+    "-y",
+    required=True,
+    default=os.environ.get("CAML_YAML", None),
+    show_default=True,
+    help="YAML file documenting the targets and types",
+)
+@click.option(
+    "--targets",
+    "-t",
+    required=False if "--version" in sys.argv else True,
+    default=os.environ.get("CAML_TARGETS", None),
+    show_default=True,
+    help="Query targets in FASTA format",
+)
+@click.option(
+    "--mode",
+    "-m",
+    type=click.Choice(SWEEP_MODES, case_sensitive=False),
+    default="targets",
+    show_default=True,
+    help="How the framework is evaluated (e.g. 'regions' for camlhmp-blast-regions frameworks)",
+)
+@click.option(
+    "--pident-grid",
+    default="90,95,99",
+    show_default=True,
+    help="Minimum percent identities to evaluate, comma separated or 'start:stop:step'",
+)
+@click.option(
+    "--coverage-grid",
+    default="80,90,95",
+    show_default=True,
+    help="Minimum percent coverages to evaluate, comma separated or 'start:stop:step'",
+)
+@click.option(
+    "--blast-task",
+    type=click.Choice(BLASTN_TASK_CHOICES, case_sensitive=False),
+    default="auto",
+    show_default=True,
+    help="The blastn task to search with ('auto' selects one for each target by its length and each identity of the grid)",
+)
+@click.option(
+    "--preset",
+    help="A named set of engine parameters (blast: fast, sensitive), replaces the framework's preset",
+)
+@click.option(
+    "--engine-param",
+    multiple=True,
+    help="A parameter to pass to the engine as KEY=VALUE (e.g. max_hsps=1), overrides the framework (repeatable)",
+)
+@click.option(
+    "--from-hits",
+    type=click.Path(exists=False),
+    help="Sweep a hits TSV of a previous run instead of searching the input (thresholds can only be raised)",
+)
+@click.option(
+    "--outdir",
+    "-o",
+    type=click.Path(exists=False),
+    default="./",
+    show_default=True,
+    help="Directory to write output",
+)
+@click.option(
+    "--prefix",
+    "-p",
+    type=str,
+    default="camlhmp",
+    show_default=True,
+    help="Prefix to use for output files",
+)
+@click.option("--force", is_flag=True, help="Overwrite existing reports")
+@click.option("--verbose", is_flag=True, help="Increase the verbosity of output")
+@click.option("--silent", is_flag=True, help="Only critical errors will be printed")
+@click.option("--version", is_flag=True, help="Print schema and camlhmp version")
+def camlhmp_blast_sweep(
+    input,
+    yaml,
+    targets,
+    mode,
+    pident_grid,
+    coverage_grid,
+    blast_task,
+    preset,
+    engine_param,
+    from_hits,
+    prefix,
+    outdir,
+    force,
+    verbose,
+    silent,
+    version,
+):
+    """🐪 camlhmp-blast-sweep 🐪 - Evaluate a framework across a grid of thresholds from a single search"""
+    # Setup logs
+    logging.basicConfig(
+        format="%(asctime)s:%(name)s:%(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        handlers=[
+            RichHandler(rich_tracebacks=True, console=rich.console.Console(stderr=True))
+        ],
+    )
+    logging.getLogger().setLevel(
+        logging.ERROR if silent else logging.DEBUG if verbose else logging.INFO
+    )
+
+    # Verify input files are available
+    yaml_path = validate_file(yaml)
+
+    # Read the YAML file
+    framework = read_framework(yaml_path)
+
+    # If prompted, print the schema and camlhmp version, then exit
+    if version:
+        print_version(framework)
+
+    # Verify remaining input files
+    input_path = None if from_hits else validate_file(input)
+    from_hits_path = validate_file(from_hits) if from_hits else None
+    targets_path = validate_file(targets)
+    pidents = parse_grid(pident_grid)
+    coverages = parse_grid(coverage_grid)
+
+    # Create the output directory
+    logging.debug(f"Creating output directory: {outdir}")
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+
+    # Output files
+    sweep_tsv = f"{outdir}/{prefix}.sweep.tsv".replace("//", "/")
+    blast_tsv = f"{outdir}/{prefix}.{framework['engine']['tool']}.tsv".replace("//", "/")
+
+    # Make sure output files don't already exist
+    file_exists_error(sweep_tsv, force)
+    if not from_hits:
+        file_exists_error(blast_tsv, force)
+
+    # Describe the command line arguments
+    console = rich.console.Console(stderr=True)
+    print(
+        "[italic]Running [deep_sky_blue1]camlhmp-blast-sweep[/deep_sky_blue1] with following parameters:[/italic]",
+        file=sys.stderr,
+    )
+    print(f"[italic]    --input {input}[/italic]", file=sys.stderr)
+    print(f"[italic]    --yaml {yaml}[/italic]", file=sys.stderr)
+    print(f"[italic]    --targets {targets}[/italic]", file=sys.stderr)
+    print(f"[italic]    --mode {mode}[/italic]", file=sys.stderr)
+    print(f"[italic]    --pident-grid {pident_grid}[/italic]", file=sys.stderr)
+    print(f"[italic]    --coverage-grid {coverage_grid}[/italic]", file=sys.stderr)
+    print(f"[italic]    --blast-task {blast_task}[/italic]", file=sys.stderr)
+    print(f"[italic]    --preset {preset}[/italic]", file=sys.stderr)
+    print(f"[italic]    --engine-param {','.join(engine_param)}[/italic]", file=sys.stderr)
+    print(f"[italic]    --from-hits {from_hits}[/italic]", file=sys.stderr)
+    print(f"[italic]    --outdir {outdir}[/italic]", file=sys.stderr)
+    print(f"[italic]    --prefix {prefix}[/italic]\n", file=sys.stderr)
+
+    print(
+        f"[italic]Starting camlhmp for {framework['metadata']['name']}...[/italic]",
+        file=sys.stderr,
+    )
+
+    # Search at the loosest thresholds of the grid, the hits of each search are then
+    # masked for every combination of thresholds it covers
+    min_coverage = 0 if mode == "regions" else coverages[0]
+    searches = []
+    if from_hits:
+        print(f"[italic]Reading {framework['engine']['tool']} hits from {from_hits}...[/italic]", file=sys.stderr)
+        min_pident = 0 if mode == "regions" else pidents[0]
+        _, blast_stdout = read_blast_hits(from_hits_path, min_pident, min_coverage, framework["engine"]["tool"])
+        searches.append([blast_stdout, pidents])
+    else:
+        engine = get_engine(
+            validate_engine("camlhmp-blast-sweep", framework["engine"]["type"], list(available_engines()))
+        )
+        engine.validate_tool(framework["engine"]["tool"])
+
+        # Parameters passed through to the engine (a preset, the framework's, then the command line)
+        engine_params = get_engine_params(
+            engine, framework["engine"]["tool"], framework, preset=preset, params=parse_engine_params(engine_param)
+        )
+        if "task" in engine_params:
+            # A task given with --blast-task takes precedence
+            task = engine_params.pop("task")
+            blast_task = blast_task if "--blast-task" in sys.argv else task
+
+        # Tasks depend on the identity, so search once for each set of tasks in the grid
+        groups = [[None, pidents]]
+        if engine.name == "blast" and framework["engine"]["tool"] == "blastn":
+            groups = get_task_groups(targets_path, pidents, task=blast_task)
+
+        print(f"[italic]Running {framework['engine']['tool']}...[/italic]", file=sys.stderr)
+        start_time = time.perf_counter()
+        for tasks, group_pidents in groups:
+            min_pident = 0 if mode == "regions" else group_pidents[0]
+            _, blast_stdout, blast_stderr = engine.search(
+                framework["engine"]["tool"],
+                input_path,
+                targets_path,
+                min_pident,
+                min_coverage,
+                params={"tasks": tasks, **engine_params},
+            )
+            if blast_stderr:
+                logging.debug(f"{framework['engine']['tool']} stderr: {blast_stderr}")
+            searches.append([blast_stdout, group_pidents])
+        print(f"[italic]    Search time: {time.perf_counter() - start_time:.2f}s[/italic]", file=sys.stderr)
+
+    # Get lengths of the targets
+    target_lengths = parse_seq_lengths(targets_path, "fasta") if mode == "regions" else None
+
+    # Evaluate every combination of thresholds
+    print(
+        f"[italic]Evaluating {len(pidents) * len(coverages)} combinations of thresholds...[/italic]",
+        file=sys.stderr,
+    )
+    sweep = []
+    for blast_stdout, group_pidents in searches:
+        sweep += sweep_thresholds(
+            prefix, framework, blast_stdout, group_pidents, coverages, mode=mode, target_lengths=target_lengths
+        )
+    sweep = flag_type_changes(prefix, sweep)
+    if sweep[0]["type_changed"]:
+        logging.warning(f"The type called for {prefix} changes across the grid of thresholds")
+
+    # Finalize the results
+    print("[italic]Final Results...[/italic]", file=sys.stderr)
+    type_table = Table(title=f"{framework['metadata']['name']}")
+    type_table.add_column("sample", style="white")
+    type_table.add_column("min_pident", style="white")
+    type_table.add_column("min_coverage", style="white")
+    type_table.add_column("type", style="white")
+    type_table.add_column("targets", style="cyan")
+    type_table.add_column("type_changed", style="cyan")
+    for row in sweep:
+        type_table.add_row(
+            row["sample"],
+            str(row["min_pident"]),
+            str(row["min_coverage"]),
+            row["type"],
+            row["targets"],
+            str(row["type_changed"]),
+        )
+    console.print(type_table)
+
+    # Write the results
+    print("[italic]Writing outputs...[/italic]", file=sys.stderr)
+    print(
+        f"[italic]Results for each combination of thresholds written to [deep_sky_blue1]{sweep_tsv}[/deep_sky_blue1][/italic]",
+        file=sys.stderr,
+    )
+    write_tsv(sweep, sweep_tsv)
+
+    if not from_hits:
+        # Hits of the search at the lowest identity, which can be swept again with --from-hits
+        print(
+            f"[italic]{framework['engine']['tool']} results written to [deep_sky_blue1]{blast_tsv}[/deep_sky_blue1][/italic]",
+            file=sys.stderr,
+        )
+        write_tsv(searches[0][0], blast_tsv)
+
+
+def main():
+    if len(sys.argv) == 1:
+        camlhmp_blast_sweep.main(["--help"])
+    else:
+        camlhmp_blast_sweep()
+
+
+if __name__ == "__main__":
+    main()
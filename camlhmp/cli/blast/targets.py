@@ -1,6 +1,9 @@
 import logging
 import os
 import sys
+import tempfile
+import time
+from contextlib import nullcontext
 from pathlib import Path
 
 import rich
@@ -11,11 +14,32 @@ from rich import print
 from rich.logging import RichHandler
 from rich.table import Table
 
-import camlhmp
-from camlhmp.engines.blast import run_blast
+from camlhmp.bitmap import update_bitmap_index
+from camlhmp.engines import available_engines, get_engine, get_engine_params, parse_engine_params
+from camlhmp.engines.blast import BLASTN_COLS, BLASTN_TASK_CHOICES, get_blastn_tasks
 from camlhmp.framework import check_types, get_types, print_version, read_framework
-from camlhmp.parsers.blast import get_blast_target_hits
-from camlhmp.utils import file_exists_error, validate_file, write_tsv
+from camlhmp.jsonl import JSONL_STDOUT, get_record, write_record
+from camlhmp.orfs import restore_orf_coordinates, subject_orfs
+from camlhmp.parquet import import_pyarrow, write_parquet
+from camlhmp.parsers.blast import (
+    HITS_OUTPUTS,
+    filter_hits,
+    finalize_targets,
+    get_blast_target_hits,
+    read_blast_hits,
+)
+from camlhmp.prefilter import (
+    PREFILTER_MODES,
+    SEED_SIZE,
+    get_subject_prefilter_conflicts,
+    prefilter_subject,
+    prefilter_targets,
+    restore_subject_coordinates,
+)
+from camlhmp.state import get_reusable_hits, get_run_state, write_run_state
+from camlhmp.store import get_target_rows, store_run
+from camlhmp.summary import append_summary, get_summary_columns
+from camlhmp.utils import COMPRESSION_EXTENSIONS, file_exists_error, get_tmpdir, validate_engine, validate_file, write_tsv
 
 DB_PATH = str(Path(__file__).parent.absolute()).replace("bin", "data")
 
@@ -40,11 +64,35 @@ click.rich_click.OPTION_GROUPS = {
                 "--min-coverage",
             ],
         },
+        {
+            "name": "Engine Options",
+            "options": [
+                "--blastdb-cache",
+                "--blastdb-cache-size",
+                "--blast-task",
+                "--preset",
+                "--engine-param",
+                "--prefilter",
+                "--subject-prefilter",
+                "--orfs",
+                "--from-hits",
+                "--incremental",
+            ],
+        },
         {
             "name": "Additional Options",
             "options": [
                 "--prefix",
                 "--outdir",
+                "--summary",
+                "--summary-details",
+                "--parquet",
+                "--db",
+                "--bitmap",
+                "--jsonl",
+                "--jsonl-hits",
+                "--hits-output",
+                "--hits-compression",
                 "--force",
                 "--verbose",
                 "--silent",
@@ -60,7 +108,7 @@ click.rich_click.OPTION_GROUPS = {
 @click.option(
     "--input",
     "-i",
-    required=False if "--version" in sys.argv else True,
+    required=False if "--version" in sys.argv or "--from-hits" in sys.argv else True,
     help="Input file in FASTA format to classify",
 )
 @click.option(
@@ -95,6 +143,51 @@ click.rich_click.OPTION_GROUPS = {
     show_default=True,
     help="Prefix to use for output files",
 )
+@click.option(
+    "--summary",
+    type=click.Path(exists=False),
+    help="Also append the final result to this TSV, shared across samples (compressed if ending in .gz or .zst)",
+)
+@click.option(
+    "--summary-details",
+    type=click.Path(exists=False),
+    help="Also append the results against each type to this TSV, shared across samples",
+)
+@click.option(
+    "--parquet",
+    type=click.Path(exists=False),
+    help="Also write the result, details and hit tables as Parquet datasets to this directory (requires pyarrow)",
+)
+@click.option(
+    "--db",
+    "results_db",
+    type=click.Path(exists=False),
+    help="Also record the run in this SQLite database, shared across samples (see camlhmp-query)",
+)
+@click.option(
+    "--bitmap",
+    type=click.Path(exists=False),
+    help="Also add the sample to this bitmap index of target and type presence (see camlhmp-query)",
+)
+@click.option(
+    "--jsonl",
+    help="Also write a JSON record of the sample to this file, or '-' to stream it to STDOUT",
+)
+@click.option("--jsonl-hits", is_flag=True, help="Include the hits in the JSON record")
+@click.option(
+    "--hits-output",
+    type=click.Choice(HITS_OUTPUTS, case_sensitive=False),
+    default="all",
+    show_default=True,
+    help="Which hits to write: all, only those passing thresholds, or only those supporting the call",
+)
+@click.option(
+    "--hits-compression",
+    type=click.Choice(list(COMPRESSION_EXTENSIONS), case_sensitive=False),
+    default="none",
+    show_default=True,
+    help="Compress the hits TSV (zstd requires zstandard)",
+)
 @click.option(
     "--min-pident",
     default=95,
@@ -107,6 +200,62 @@ click.rich_click.OPTION_GROUPS = {
     show_default=True,
     help="Minimum percent coverage to count a hit",
 )
+@click.option(
+    "--blastdb-cache",
+    type=click.Path(exists=False),
+    default=os.environ.get("CAML_BLASTDB_CACHE", None),
+    show_default=True,
+    help="Directory to cache a BLAST database (and ORFs) of the input, reused across frameworks",
+)
+@click.option(
+    "--blastdb-cache-size",
+    default=100,
+    show_default=True,
+    help="Maximum number of databases to keep in the cache",
+)
+@click.option(
+    "--blast-task",
+    type=click.Choice(BLASTN_TASK_CHOICES, case_sensitive=False),
+    default="auto",
+    show_default=True,
+    help="The blastn task to search with ('auto' selects one for each target by its length and --min-pident)",
+)
+@click.option(
+    "--preset",
+    help="A named set of engine parameters (blast: fast, sensitive), replaces the framework's preset",
+)
+@click.option(
+    "--engine-param",
+    multiple=True,
+    help="A parameter to pass to the engine as KEY=VALUE (e.g. max_hsps=1), overrides the framework (repeatable)",
+)
+@click.option(
+    "--prefilter",
+    type=click.Choice(PREFILTER_MODES, case_sensitive=False),
+    default="off",
+    show_default=True,
+    help="Drop targets without enough shared k-mers to have a hit ('safe' never drops a true hit)",
+)
+@click.option(
+    "--subject-prefilter",
+    is_flag=True,
+    help="Only search regions of the input sharing seeds with the targets",
+)
+@click.option(
+    "--orfs",
+    is_flag=True,
+    help="Search protein targets against ORFs of the input with blastp instead of tblastn",
+)
+@click.option(
+    "--from-hits",
+    type=click.Path(exists=False),
+    help="Re-type from a hits TSV of a previous run instead of searching the input (thresholds can only be raised)",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Record the run state, and reuse the hits in --outdir if the input, targets and search settings are unchanged",
+)
 @click.option("--force", is_flag=True, help="Overwrite existing reports")
 @click.option("--verbose", is_flag=True, help="Increase the verbosity of output")
 @click.option("--silent", is_flag=True, help="Only critical errors will be printed")
@@ -117,8 +266,27 @@ def camlhmp_blast_targets(
     targets,
     prefix,
     outdir,
+    summary,
+    summary_details,
+    parquet,
+    results_db,
+    bitmap,
+    jsonl,
+    jsonl_hits,
+    hits_output,
+    hits_compression,
     min_pident,
     min_coverage,
+    blastdb_cache,
+    blastdb_cache_size,
+    blast_task,
+    preset,
+    engine_param,
+    prefilter,
+    subject_prefilter,
+    orfs,
+    from_hits,
+    incremental,
     force,
     verbose,
     silent,
@@ -148,25 +316,31 @@ def camlhmp_blast_targets(
         print_version(framework)
 
     # Verify remaining input files
-    input_path = validate_file(input)
+    input_path = None if from_hits else validate_file(input)
+    from_hits_path = validate_file(from_hits) if from_hits else None
     targets_path = validate_file(targets)
     logging.debug(f"Processing {targets}")
 
+    # Parquet outputs need the optional pyarrow, fail before any searching
+    if parquet:
+        import_pyarrow()
+
     # Create the output directory
     logging.debug(f"Creating output directory: {outdir}")
     Path(outdir).mkdir(parents=True, exist_ok=True)
 
     # Output files
     result_tsv = f"{outdir}/{prefix}.tsv".replace("//", "/")
-    blast_tsv = f"{outdir}/{prefix}.{framework['engine']['tool']}.tsv".replace(
+    blast_tsv = f"{outdir}/{prefix}.{framework['engine']['tool']}.tsv{COMPRESSION_EXTENSIONS[hits_compression]}".replace(
         "//", "/"
     )
     details_tsv = f"{outdir}/{prefix}.details.tsv".replace("//", "/")
+    state_json = f"{outdir}/{prefix}.state.json".replace("//", "/")
 
-    # Make sure output files don't already exist
-    file_exists_error(result_tsv, force)
-    file_exists_error(blast_tsv, force)
-    file_exists_error(details_tsv, force)
+    # Make sure output files don't already exist (incremental runs update them)
+    file_exists_error(result_tsv, force or incremental)
+    file_exists_error(blast_tsv, force or incremental)
+    file_exists_error(details_tsv, force or incremental)
 
     # Check if params are set in the YAML (only change if not set on the command line)
     if "params" in framework["engine"] and isinstance(framework["engine"]["params"], dict):
@@ -177,7 +351,6 @@ def camlhmp_blast_targets(
             if "min_coverage" in framework["engine"]["params"]:
                 min_coverage = framework["engine"]["params"]["min_coverage"]
 
-
     # Describe the command line arguments
     console = rich.console.Console(stderr=True)
     print(
@@ -189,25 +362,165 @@ def camlhmp_blast_targets(
     print(f"[italic]    --targets {targets}[/italic]", file=sys.stderr)
     print(f"[italic]    --outdir {outdir}[/italic]", file=sys.stderr)
     print(f"[italic]    --prefix {prefix}[/italic]", file=sys.stderr)
+    print(f"[italic]    --summary {summary}[/italic]", file=sys.stderr)
+    print(f"[italic]    --summary-details {summary_details}[/italic]", file=sys.stderr)
+    print(f"[italic]    --parquet {parquet}[/italic]", file=sys.stderr)
+    print(f"[italic]    --db {results_db}[/italic]", file=sys.stderr)
+    print(f"[italic]    --bitmap {bitmap}[/italic]", file=sys.stderr)
+    print(f"[italic]    --jsonl {jsonl}[/italic]", file=sys.stderr)
+    print(f"[italic]    --jsonl-hits {jsonl_hits}[/italic]", file=sys.stderr)
+    print(f"[italic]    --hits-output {hits_output}[/italic]", file=sys.stderr)
+    print(f"[italic]    --hits-compression {hits_compression}[/italic]", file=sys.stderr)
     print(f"[italic]    --min-pident {min_pident}[/italic]", file=sys.stderr)
-    print(f"[italic]    --min-coverage {min_coverage}[/italic]\n", file=sys.stderr)
+    print(f"[italic]    --min-coverage {min_coverage}[/italic]", file=sys.stderr)
+    print(f"[italic]    --blastdb-cache {blastdb_cache}[/italic]", file=sys.stderr)
+    print(f"[italic]    --blast-task {blast_task}[/italic]", file=sys.stderr)
+    print(f"[italic]    --preset {preset}[/italic]", file=sys.stderr)
+    print(f"[italic]    --engine-param {','.join(engine_param)}[/italic]", file=sys.stderr)
+    print(f"[italic]    --prefilter {prefilter}[/italic]", file=sys.stderr)
+    print(f"[italic]    --subject-prefilter {subject_prefilter}[/italic]", file=sys.stderr)
+    print(f"[italic]    --orfs {orfs}[/italic]", file=sys.stderr)
+    print(f"[italic]    --from-hits {from_hits}[/italic]", file=sys.stderr)
+    print(f"[italic]    --incremental {incremental}[/italic]\n", file=sys.stderr)
 
     print(
         f"[italic]Starting camlhmp for {framework['metadata']['name']}...[/italic]",
         file=sys.stderr,
     )
 
-    # Verify the engine is a support blast subcommand
-    if framework["engine"]["type"] not in ["blast"]:
-        raise ValueError(
-            f"Unsupported engine ({framework['engine']['type']}), camlhmp-blast-targets only supports blast"
+    # Load the engine declared by the framework
+    engine = get_engine(
+        validate_engine(
+            "camlhmp-blast-targets", framework["engine"]["type"], list(available_engines())
         )
-
-    # Run blast
-    print(f"[italic]Running {framework['engine']['tool']}...[/italic]", file=sys.stderr)
-    hits, blast_stdout, blast_stderr = run_blast(
-        framework['engine']['tool'], input_path, targets_path, min_pident, min_coverage
     )
+    engine.validate_tool(framework["engine"]["tool"])
+
+    # Parameters passed through to the engine (a preset, the framework's, then the command line)
+    engine_params = {}
+    if not from_hits:
+        engine_params = get_engine_params(
+            engine, framework["engine"]["tool"], framework, preset=preset, params=parse_engine_params(engine_param)
+        )
+    if "task" in engine_params:
+        # A task given with --blast-task takes precedence
+        task = engine_params.pop("task")
+        blast_task = blast_task if "--blast-task" in sys.argv else task
+
+    # Select the blastn task of each target, unknown for hits of another run
+    tasks = None
+    if engine.name == "blast" and framework["engine"]["tool"] == "blastn" and not from_hits:
+        tasks = get_blastn_tasks(targets_path, min_pident, task=blast_task)
+    search_params = {"tasks": tasks, **engine_params}
+
+    # Reuse the hits of a previous run if only the type definitions have changed
+    run_state = None
+    if incremental and not from_hits:
+        run_state = get_run_state(
+            input_path,
+            targets_path,
+            framework,
+            hits_tsv=blast_tsv,
+            hits_output=hits_output,
+            hits_compression=hits_compression,
+            min_pident=min_pident,
+            min_coverage=min_coverage,
+            prefilter=prefilter,
+            subject_prefilter=subject_prefilter,
+            blast_tasks=tasks,
+            engine_params=engine_params,
+            orfs=orfs,
+        )
+        # Only a complete set of hits can be reused
+        previous_hits = get_reusable_hits(state_json, run_state)
+        if previous_hits:
+            print("[italic]Input, targets and search settings are unchanged, reusing previous hits[/italic]", file=sys.stderr)
+            from_hits = from_hits_path = previous_hits
+
+    if from_hits:
+        # Re-use the hits of a previous run, no need to search the input
+        print(f"[italic]Reading {framework['engine']['tool']} hits from {from_hits}...[/italic]", file=sys.stderr)
+        hits, blast_stdout = read_blast_hits(
+            from_hits_path, min_pident, min_coverage, framework["engine"]["tool"]
+        )
+    else:
+        # Run blast
+        print(f"[italic]Running {framework['engine']['tool']}...[/italic]", file=sys.stderr)
+        with tempfile.TemporaryDirectory(prefix="camlhmp-", dir=get_tmpdir()) as tmpdir:
+            # Optionally drop targets that cannot possibly have a hit
+            query_path = targets_path
+            kept = None
+            if prefilter != "off" and framework["engine"]["tool"] == "blastn":
+                query_path = f"{tmpdir}/targets.fasta"
+                kept, dropped = prefilter_targets(
+                    input_path, targets_path, query_path, min_pident, min_coverage, mode=prefilter
+                )
+                print(
+                    f"[italic]    Prefilter kept {len(kept)} of {len(kept) + len(dropped)} targets[/italic]",
+                    file=sys.stderr,
+                )
+            elif prefilter != "off":
+                logging.warning(f"--prefilter only supports blastn, skipping for {framework['engine']['tool']}")
+
+            # Optionally only search the regions of the input that share seeds with the targets
+            subject_path = input_path
+            windows = None
+            # Seeds of the subject prefilter are only guaranteed to be shared with megablast hits
+            conflicts = get_subject_prefilter_conflicts(tasks, engine_params, engine=engine.name)
+            if subject_prefilter and conflicts:
+                logging.warning(
+                    f"--subject-prefilter requires megablast words of at least {SEED_SIZE} bp, "
+                    f"skipping for {', '.join(conflicts)}"
+                )
+            elif subject_prefilter and framework["engine"]["tool"] == "blastn":
+                subject_path = f"{tmpdir}/subject.fasta"
+                windows, kept_bp, total_bp = prefilter_subject(input_path, query_path, subject_path)
+                print(
+                    f"[italic]    Subject prefilter kept {kept_bp} of {total_bp} bp in {len(windows)} regions[/italic]",
+                    file=sys.stderr,
+                )
+            elif subject_prefilter:
+                logging.warning(f"--subject-prefilter only supports blastn, skipping for {framework['engine']['tool']}")
+
+            # Optionally search protein targets against ORFs predicted from the input
+            tool = framework["engine"]["tool"]
+            subject = nullcontext([subject_path, None, 0])
+            if orfs and tool == "tblastn":
+                tool = engine.validate_tool("blastp")
+                # Cached ORFs stay locked until the search is done, so they are not evicted
+                subject = subject_orfs(input_path, tmpdir, blastdb_cache, blastdb_cache_size)
+            elif orfs:
+                logging.warning(f"--orfs only supports tblastn, skipping for {tool}")
+
+            with subject as (subject_path, orfs_tsv, orf_time):
+                if orfs_tsv:
+                    print(f"[italic]    ORF prediction time: {orf_time:.2f}s[/italic]", file=sys.stderr)
+                blastdb = (
+                    engine.prepare_index(input_path, blastdb_cache, blastdb_cache_size)
+                    if blastdb_cache and windows is None and orfs_tsv is None
+                    else nullcontext([None, 0])
+                )
+                with blastdb as (db, index_time):
+                    start_time = time.perf_counter()
+                    if (kept is None or kept) and (windows is None or windows):
+                        hits, blast_stdout, blast_stderr = engine.search(
+                            tool, subject_path, query_path, min_pident, min_coverage, index=db, params=search_params
+                        )
+                    else:
+                        # Every target or region of the input was dropped, nothing to search
+                        hits, blast_stdout, blast_stderr = [
+                            [], [dict(zip(BLASTN_COLS, ["NO_HITS"] * len(BLASTN_COLS)))], ""
+                        ]
+                    search_time = time.perf_counter() - start_time
+                    if blast_stderr:
+                        logging.debug(f"{tool} stderr: {blast_stderr}")
+                if windows:
+                    blast_stdout = restore_subject_coordinates(blast_stdout, windows)
+                if orfs_tsv:
+                    blast_stdout = restore_orf_coordinates(blast_stdout, orfs_tsv)
+        if db:
+            print(f"[italic]    Index build time: {index_time:.2f}s[/italic]", file=sys.stderr)
+        print(f"[italic]    Search time: {search_time:.2f}s[/italic]", file=sys.stderr)
     target_results = get_blast_target_hits(framework["targets"], hits)
 
     # Process the hits against the types
@@ -227,72 +540,27 @@ def camlhmp_blast_targets(
     type_table.add_column("params", style="cyan")
     type_table.add_column("comment", style="cyan")
 
-    final_type = []
-    final_targets = []
-
-    # Get a list of targets that met the threshold
-    for target, status in target_results.items():
-        if status:
-            final_targets.append(target)
-
     # Get the final type(s)
-    final_details = []
-    for type, vals in type_hits.items():
-        final_details.append(
-            {
-                "sample": prefix,
-                "type": type,
-                "status": vals["status"],
-                "targets": ",".join(vals["targets"]),
-                "missing": ",".join(vals["missing"]),
-                "schema": framework["metadata"]["id"],
-                "schema_version": framework["metadata"]["version"],
-                "camlhmp_version": camlhmp.__version__,
-                "params": f"min-coverage={min_coverage};min-pident={min_pident}",
-                "comment": vals["comment"],
-            }
-        )
-        if vals["status"]:
-            final_type.append(type)
-
-    # Generate a comment based on the results
-    comment = ""
-    if not len(final_type):
-        if len(final_targets):
-            comment = "A type could not be determined, but one or more targets found"
-        else:
-            comment = "A type could not be determined"
-    elif len(final_type) > 1:
-        comment = f"Found matches for multiple types including: {', '.join(final_type)}"
-        final_type = ["multiple"]
-
-    final_type = ",".join(final_type) if len(final_type) > 0 else "-"
-    type_table.add_row(
-        prefix,
-        final_type,
-        ",".join(final_targets),
-        framework["metadata"]["id"],
-        framework["metadata"]["version"],
-        camlhmp.__version__,
-        f"min-coverage={min_coverage};min-pident={min_pident}",
-        comment,
+    final_result, final_details = finalize_targets(
+        prefix, target_results, type_hits, framework, min_pident, min_coverage, tasks, engine_params
     )
-    console.print(type_table)
+    type_table.add_row(*final_result.values())
+    if jsonl != JSONL_STDOUT:
+        # Keep the console quiet when records are streamed to a pipeline
+        console.print(type_table)
+
+    # Limit the hits that are written
+    blast_hits = blast_stdout
+    if hits_output == "passed":
+        blast_hits = filter_hits(blast_stdout, [target for target, status in target_results.items() if status])
+    elif hits_output == "typed":
+        typed_targets = [target for vals in type_hits.values() if vals["status"] for target in vals["targets"]]
+        blast_hits = filter_hits(blast_stdout, typed_targets)
 
     # Write the results
     print("[italic]Writing outputs...[/italic]", file=sys.stderr)
 
     # Write final prediction
-    final_result = {
-        "sample": prefix,
-        "type": final_type,
-        "targets": ",".join(final_targets),
-        "schema": framework["metadata"]["id"],
-        "schema_version": framework["metadata"]["version"],
-        "camlhmp_version": camlhmp.__version__,
-        "params": f"min-coverage={min_coverage};min-pident={min_pident}",
-        "comment": comment,
-    }
     print(
         f"[italic]Final predicted type written to [deep_sky_blue1]{result_tsv}[/deep_sky_blue1][/italic]",
         file=sys.stderr,
@@ -308,10 +576,72 @@ def camlhmp_blast_targets(
 
     # Write blast results
     print(
-        f"[italic]{framework['engine']['tool']} results written to [deep_sky_blue1]{blast_tsv}[/deep_sky_blue1][/italic]",
+        f"[italic]{framework['engine']['tool']} results ({hits_output} hits) written to [deep_sky_blue1]{blast_tsv}[/deep_sky_blue1][/italic]",
         file=sys.stderr,
     )
-    write_tsv(blast_stdout, blast_tsv)
+    write_tsv(blast_hits, blast_tsv)
+
+    # Append to the summaries shared across samples
+    if summary:
+        print(
+            f"[italic]Final predicted type appended to [deep_sky_blue1]{summary}[/deep_sky_blue1][/italic]",
+            file=sys.stderr,
+        )
+        append_summary([final_result], summary, get_summary_columns(framework, "targets"))
+    if summary_details:
+        print(
+            f"[italic]Results against each type appended to [deep_sky_blue1]{summary_details}[/deep_sky_blue1][/italic]",
+            file=sys.stderr,
+        )
+        append_summary(final_details, summary_details, get_summary_columns(framework, "targets", details=True))
+
+    # Write typed, columnar copies of the tables
+    if parquet:
+        print(
+            f"[italic]Parquet datasets written to [deep_sky_blue1]{parquet}[/deep_sky_blue1][/italic]",
+            file=sys.stderr,
+        )
+        schema = [framework["metadata"]["id"], framework["metadata"]["version"]]
+        write_parquet([final_result], parquet, "results", prefix, *schema)
+        write_parquet(final_details, parquet, "details", prefix, *schema)
+        write_parquet(blast_hits, parquet, "hits", prefix, *schema)
+
+    # Record the run in a database that can be queried across samples
+    if results_db:
+        print(f"[italic]Run recorded in [deep_sky_blue1]{results_db}[/deep_sky_blue1][/italic]", file=sys.stderr)
+        store_run(
+            results_db,
+            {**final_result, "mode": "targets"},
+            final_details,
+            get_target_rows("targets", target_results, min_coverage),
+        )
+
+    # Add the sample to a bitmap index for fast cohort-wide set queries
+    if bitmap:
+        print(f"[italic]Sample added to [deep_sky_blue1]{bitmap}[/deep_sky_blue1][/italic]", file=sys.stderr)
+        update_bitmap_index(
+            bitmap,
+            framework["metadata"]["id"],
+            prefix,
+            {row["target"]: row["status"] for row in get_target_rows("targets", target_results, min_coverage)},
+            {type: vals["status"] for type, vals in type_hits.items()},
+        )
+
+    # Stream a record of the sample, for pipelines to consume without reading files
+    if jsonl:
+        print(
+            f"[italic]JSON record written to [deep_sky_blue1]{'STDOUT' if jsonl == JSONL_STDOUT else jsonl}[/deep_sky_blue1][/italic]",
+            file=sys.stderr,
+        )
+        write_record(get_record("targets", final_result, final_details, blast_hits if jsonl_hits else None), jsonl)
+
+    # Record what was searched, so later runs can reuse the hits
+    if run_state:
+        print(
+            f"[italic]Run state written to [deep_sky_blue1]{state_json}[/deep_sky_blue1][/italic]",
+            file=sys.stderr,
+        )
+        write_run_state(run_state, state_json)
 
 
 def main():
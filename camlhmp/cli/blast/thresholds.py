@@ -12,9 +12,10 @@ from rich.table import Table
 
 import camlhmp
 from camlhmp.engines.blast import run_blast
+from camlhmp.faidx import fetch_seqs
 from camlhmp.framework import check_types, get_types, print_camlhmp_version
 from camlhmp.parsers.blast import get_blast_target_hits
-from camlhmp.utils import file_exists_error, validate_file, parse_seqs, write_tsv
+from camlhmp.utils import file_exists_error, validate_file, write_tsv
 
 # Set up Rich
 stderr = rich.console.Console(stderr=True)
@@ -141,7 +142,7 @@ def camlhmp_blast_thresholds(
 
     # Create the output directory
     logging.debug(f"Creating output directory: {outdir}")
-    Path(f"{outdir}/reference_seqs").mkdir(parents=True, exist_ok=True)
+    Path(outdir).mkdir(parents=True, exist_ok=True)
 
     # Output files
     thresholds_tsv = f"{outdir}/{prefix}.tsv".replace("//", "/")
@@ -169,17 +170,14 @@ def camlhmp_blast_thresholds(
 
     # Get reference seqeunce names
     reference_seqs = {}
-    for seq in parse_seqs(input_path, "fasta"):
-        if seq.id not in reference_seqs:
-            reference_seqs[seq.id] = []
-        reference_seqs[seq.id].append(seq.seq)
+    for name, seq in fetch_seqs(input_path):
+        if name not in reference_seqs:
+            reference_seqs[name] = []
+        reference_seqs[name].append(seq)
 
-    # Write seqs for each reference into separate files
-    print(
-        f"[italic]Writing reference seqeuences to {outdir}/reference_seqs...[/italic]",
-        file=sys.stderr,
-    )
+    # Keep the seqs of each reference in memory, they are piped to BLAST+ at each threshold
     reference_failures = {}
+    reference_fastas = {}
     for ref, seqs in sorted(reference_seqs.items()):
         if ref not in reference_failures:
             reference_failures[ref] = {
@@ -188,9 +186,9 @@ def camlhmp_blast_thresholds(
                 "hits": "-",
                 "comment": "",
             }
-        with open(f"{outdir}/reference_seqs/{ref}.fasta", "w") as fh:
-            for seq in seqs:
-                fh.write(f">{ref}\n{seq}\n")
+        reference_fastas[ref] = "".join(f">{ref}\n{seq}\n" for seq in seqs).encode()
+    with open(input_path, "rb") as fh:
+        input_fasta = fh.read()
 
     # Run blast for each reference seq, adjusting thresholds each time
     references = reference_seqs.keys()
@@ -206,7 +204,7 @@ def camlhmp_blast_thresholds(
                 # Run blast
                 logging.debug(f"Running {ref} with pident={pident} and coverage={coverage}")
                 hits, blast_stdout, blast_stderr = run_blast(
-                    blast, f"{outdir}/reference_seqs/{ref}.fasta", input_path, pident, coverage
+                    blast, reference_fastas[ref], input_fasta, pident, coverage
                 )
                 # Determine if we've gotten a hit that's not the reference, if so, we've failed
                 for hit, status in get_blast_target_hits(references, hits).items():
@@ -0,0 +1,324 @@
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+import rich
+import rich.console
+import rich.traceback
+import rich_click as click
+from rich import print
+from rich.logging import RichHandler
+from rich.table import Table
+
+from camlhmp.classifier import CLASSIFIER_MODES
+from camlhmp.concordance import get_sample_names
+from camlhmp.framework import print_version, read_framework, write_preset
+from camlhmp.tune import (TUNE_COLS, TUNE_MIN_SPEEDUP, get_tune_candidates,
+                          get_tuned_params, tune_engine_params)
+from camlhmp.utils import file_exists_error, validate_file, write_tsv
+
+# Set up Rich
+stderr = rich.console.Console(stderr=True)
+rich.traceback.install(console=stderr, width=200, word_wrap=True, extra_lines=1)
+click.rich_click.USE_RICH_MARKUP = True
+click.rich_click.OPTION_GROUPS = {
+    "camlhmp": [
+        {
+            "name": "Required Options",
+            "options": [
+                "--yaml",
+                "--targets",
+            ],
+        },
+        {
+            "name": "Input Options",
+            "options": [
+                "--fofn",
+            ],
+        },
+        {
+            "name": "Tuning Options",
+            "options": [
+                "--mode",
+                "--word-sizes",
+                "--min-pident",
+                "--min-coverage",
+                "--min-speedup",
+            ],
+        },
+        {
+            "name": "Preset Options",
+            "options": [
+                "--preset-name",
+                "--activate",
+                "--dry-run",
+            ],
+        },
+        {
+            "name": "Additional Options",
+            "options": [
+                "--prefix",
+                "--outdir",
+                "--force",
+                "--verbose",
+                "--silent",
+                "--version",
+                "--help",
+            ],
+        },
+    ]
+}
+
+
+@click.command()
+@click.argument("inputs", nargs=-1)
+@click.option(
+    "--yaml",
+    "-y",
+    required=True,
+    default=os.environ.get("CAML_YAML", None),
+    show_default=True,
+    help="YAML file documenting the targets and types, the tuned preset is saved to it",
+)
+@click.option(
+    "--targets",
+    "-t",
+    required=False if "--version" in sys.argv else True,
+    default=os.environ.get("CAML_TARGETS", None),
+    show_default=True,
+    help="Query targets in FASTA format",
+)
+@click.option(
+    "--fofn",
+    "-f",
+    help="A file with the path of a validation sample on each line (for many inputs)",
+)
+@click.option(
+    "--mode",
+    "-m",
+    type=click.Choice(CLASSIFIER_MODES, case_sensitive=False),
+    default="targets",
+    show_default=True,
+    help="How the framework is evaluated (e.g. 'regions' for camlhmp-blast-regions frameworks)",
+)
+@click.option(
+    "--word-sizes",
+    help="Comma separated word sizes to try (default: 32,48,64 for blastn, 4,5,6 for tblastn and blastp)",
+)
+@click.option(
+    "--min-pident",
+    type=float,
+    help="Minimum percent identity to count a hit (default: the framework's, or 95)",
+)
+@click.option(
+    "--min-coverage",
+    type=int,
+    help="Minimum percent coverage to count a hit (default: the framework's, or 95)",
+)
+@click.option(
+    "--min-speedup",
+    type=float,
+    default=TUNE_MIN_SPEEDUP,
+    show_default=True,
+    help="How much faster than the baseline the selected settings must be",
+)
+@click.option(
+    "--preset-name",
+    default="tuned",
+    show_default=True,
+    help="The name to save the fastest concordant settings as (in engine.presets)",
+)
+@click.option("--activate", is_flag=True, help="Also use the tuned preset by default (engine.params.preset)")
+@click.option("--dry-run", is_flag=True, help="Only report the candidates, do not update the YAML file")
+@click.option(
+    "--outdir",
+    "-o",
+    type=click.Path(exists=False),
+    default="./",
+    show_default=True,
+    help="Directory to write output",
+)
+@click.option(
+    "--prefix",
+    "-p",
+    type=str,
+    default="camlhmp",
+    show_default=True,
+    help="Prefix to use for output files",
+)
+@click.option("--force", is_flag=True, help="Overwrite existing reports")
+@click.option("--verbose", is_flag=True, help="Increase the verbosity of output")
+@click.option("--silent", is_flag=True, help="Only critical errors will be printed")
+@click.option("--version", is_flag=True, help="Print schema and camlhmp version")
+def camlhmp_blast_tune(
+    inputs,
+    yaml,
+    targets,
+    fofn,
+    mode,
+    word_sizes,
+    min_pident,
+    min_coverage,
+    min_speedup,
+    preset_name,
+    activate,
+    dry_run,
+    prefix,
+    outdir,
+    force,
+    verbose,
+    silent,
+    version,
+):
+    """🐪 camlhmp-blast-tune 🐪 - Find the fastest engine settings that do not change the results of a framework"""
+    # Setup logs
+    logging.basicConfig(
+        format="%(asctime)s:%(name)s:%(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        handlers=[
+            RichHandler(rich_tracebacks=True, console=rich.console.Console(stderr=True))
+        ],
+    )
+    logging.getLogger().setLevel(
+        logging.ERROR if silent else logging.DEBUG if verbose else logging.INFO
+    )
+
+    # Verify input files are available
+    yaml_path = validate_file(yaml)
+
+    # Read the YAML file
+    framework = read_framework(yaml_path)
+
+    # If prompted, print the schema and camlhmp version, then exit
+    if version:
+        print_version(framework)
+
+    # Collect the validation samples, a file of filenames avoids command line limits
+    paths = list(inputs)
+    if fofn:
+        with open(validate_file(fofn), "rt") as fh:
+            paths.extend(line.strip() for line in fh if line.strip())
+    if not paths:
+        raise click.UsageError("No validation samples to benchmark, provide FASTA files or --fofn")
+    samples = get_sample_names([str(validate_file(path)) for path in paths])
+    targets_path = validate_file(targets)
+
+    # Candidate engine parameters
+    if word_sizes:
+        try:
+            word_sizes = [int(val) for val in word_sizes.split(",") if val.strip()]
+        except ValueError:
+            raise click.UsageError(f"--word-sizes must be comma separated integers, found: {word_sizes}")
+    try:
+        candidates = get_tune_candidates(
+            framework["engine"]["type"], framework["engine"]["tool"], mode=mode, word_sizes=word_sizes
+        )
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    # Create the output directory
+    logging.debug(f"Creating output directory: {outdir}")
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+
+    # Output files
+    tune_tsv = f"{outdir}/{prefix}.tune.tsv".replace("//", "/")
+    file_exists_error(tune_tsv, force)
+
+    # Describe the command line arguments
+    console = rich.console.Console(stderr=True)
+    print(
+        "[italic]Running [deep_sky_blue1]camlhmp-blast-tune[/deep_sky_blue1] with following parameters:[/italic]",
+        file=sys.stderr,
+    )
+    print(f"[italic]    --inputs {len(samples)} samples[/italic]", file=sys.stderr)
+    print(f"[italic]    --yaml {yaml}[/italic]", file=sys.stderr)
+    print(f"[italic]    --targets {targets}[/italic]", file=sys.stderr)
+    print(f"[italic]    --mode {mode}[/italic]", file=sys.stderr)
+    print(f"[italic]    --word-sizes {word_sizes}[/italic]", file=sys.stderr)
+    print(f"[italic]    --min-pident {min_pident}[/italic]", file=sys.stderr)
+    print(f"[italic]    --min-coverage {min_coverage}[/italic]", file=sys.stderr)
+    print(f"[italic]    --min-speedup {min_speedup}[/italic]", file=sys.stderr)
+    print(f"[italic]    --preset-name {preset_name}[/italic]", file=sys.stderr)
+    print(f"[italic]    --activate {activate}[/italic]", file=sys.stderr)
+    print(f"[italic]    --dry-run {dry_run}[/italic]", file=sys.stderr)
+    print(f"[italic]    --outdir {outdir}[/italic]", file=sys.stderr)
+    print(f"[italic]    --prefix {prefix}[/italic]\n", file=sys.stderr)
+
+    print(
+        f"[italic]Typing {len(samples)} samples with the baseline and {len(candidates)} candidates...[/italic]",
+        file=sys.stderr,
+    )
+    start_time = time.perf_counter()
+    rows = tune_engine_params(
+        framework,
+        targets_path,
+        samples,
+        mode=mode,
+        candidates=candidates,
+        min_pident=min_pident,
+        min_coverage=min_coverage,
+        min_speedup=min_speedup,
+    )
+    print(f"[italic]    Total time: {time.perf_counter() - start_time:.2f}s[/italic]", file=sys.stderr)
+
+    # Finalize the results
+    print("[italic]Final Results...[/italic]", file=sys.stderr)
+    type_table = Table(title=f"{framework['metadata']['name']}")
+    type_table.add_column("candidate", style="white")
+    type_table.add_column("params", style="white")
+    type_table.add_column("time", style="cyan")
+    type_table.add_column("speedup", style="cyan")
+    type_table.add_column("discordant", style="cyan")
+    type_table.add_column("selected", style="cyan")
+    for row in rows:
+        type_table.add_row(
+            row["candidate"],
+            row["params"],
+            f"{row['time']:.2f}",
+            f"{row['speedup']:.2f}",
+            str(row["discordant"]),
+            str(row["selected"]),
+        )
+    console.print(type_table)
+
+    for row in rows:
+        if row["discordant"]:
+            logging.warning(f"{row['candidate']} changes the results of: {row['discordance']}")
+
+    # Write the results
+    print("[italic]Writing outputs...[/italic]", file=sys.stderr)
+    print(
+        f"[italic]Benchmark of each candidate written to [deep_sky_blue1]{tune_tsv}[/deep_sky_blue1][/italic]",
+        file=sys.stderr,
+    )
+    write_tsv([{col: row[col] for col in TUNE_COLS} for row in rows], tune_tsv)
+
+    tuned = get_tuned_params(rows)
+    if not tuned:
+        logging.warning(f"No candidate was concordant with and {min_speedup}x faster than the baseline, no preset saved")
+    elif dry_run:
+        print(
+            f"[italic]Fastest concordant settings ({tuned['params']}, {tuned['speedup']:.2f}x), "
+            f"not saved (--dry-run)[/italic]",
+            file=sys.stderr,
+        )
+    else:
+        write_preset(yaml_path, preset_name, tuned["engine_params"], activate=activate)
+        print(
+            f"[italic]Fastest concordant settings ({tuned['params']}, {tuned['speedup']:.2f}x) saved as preset "
+            f"[deep_sky_blue1]{preset_name}[/deep_sky_blue1] in [deep_sky_blue1]{yaml}[/deep_sky_blue1][/italic]",
+            file=sys.stderr,
+        )
+
+
+def main():
+    if len(sys.argv) == 1:
+        camlhmp_blast_tune.main(["--help"])
+    else:
+        camlhmp_blast_tune()
+
+
+if __name__ == "__main__":
+    main()
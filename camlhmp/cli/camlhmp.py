@@ -10,10 +10,15 @@ import camlhmp
 # List of available commands
 COMMANDS = {
     "camlhmp-blast-alleles": "Classify assemblies using BLAST against alleles of a set of genes",
+    "camlhmp-blast-concordance": "Check if engine parameters change the types called for reference samples",
     "camlhmp-blast-regions": "Classify assemblies using BLAST against larger genomic regions",
+    "camlhmp-blast-sweep": "Evaluate a framework across a grid of thresholds from a single search",
     "camlhmp-blast-targets": "Classify assemblies using BLAST against individual genes or proteins",
     "camlhmp-blast-thresholds": "Determine the specificity thresholds for a set of reference sequences",
+    "camlhmp-blast-tune": "Find the fastest engine settings that do not change the results of a framework",
     "camlhmp-extract": "Extract typing targets from a set of reference sequences",
+    "camlhmp-merge": "Merge the outputs of many samples into a single TSV",
+    "camlhmp-query": "Query the runs recorded in a camlhmp database",
 }
 
 # Set up Rich
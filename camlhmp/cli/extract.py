@@ -6,12 +6,11 @@ import rich
 import rich.console
 import rich.traceback
 import rich_click as click
-from Bio.Seq import Seq
-from rich import print
 from rich.logging import RichHandler
 
 import camlhmp
-from camlhmp.utils import parse_seq, parse_table, validate_file
+from camlhmp.extract import extract_targets, stream_targets, write_targets
+from camlhmp.utils import parse_table, validate_file
 
 DB_PATH = str(Path(__file__).parent.absolute()).replace("bin", "data")
 
@@ -32,6 +31,8 @@ click.rich_click.OPTION_GROUPS = {
             "name": "Additional Options",
             "options": [
                 "--outdir",
+                "--cpus",
+                "--stream",
                 "--verbose",
                 "--silent",
                 "--version",
@@ -56,12 +57,26 @@ click.rich_click.OPTION_GROUPS = {
     help="The path to save the extracted targets",
     default="./camlhmp-extract",
 )
+@click.option(
+    "--cpus",
+    "-c",
+    default=1,
+    show_default=True,
+    help="Number of reference files to process in parallel",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    help="Process references one at a time (sorted by file), writing targets as they are extracted",
+)
 @click.option("--verbose", is_flag=True, help="Increase the verbosity of output")
 @click.option("--silent", is_flag=True, help="Only critical errors will be printed")
 def camlhmp(
     path,
     targets,
     outdir,
+    cpus,
+    stream,
     verbose,
     silent,
 ):
@@ -84,58 +99,20 @@ def camlhmp(
 
     # Parse the targets TSV
     targets = parse_table(targets_path)
-    print(targets)
-
-    # Verify each of the input files exist
-    references = {}
-    for target in targets:
-        if target["file"] not in references:
-            references[target["file"]] = {
-                "file": validate_file(f"{reference_path}/{target['file']}"),
-                "format": target["format"],
-            }
-            logging.debug(f"Found file: {references[target['file']]['file']}")
+    logging.debug(f"Found {len(targets)} targets to extract")
 
-    # Parse each of the input files
-    seq_objects = {}
-    for ref, vals in references.items():
-        if vals["format"] in ["fasta", "genbank"]:
-            logging.debug(f"Parsing {ref} as {vals['format']}")
-            seq_objects[ref] = parse_seq(vals["file"], vals["format"])
-        else:
-            raise ValueError(f"Unknown format: {vals['format']}")
+    if stream:
+        # Only hold a single reference in memory, writing each target as it is extracted
+        if cpus > 1:
+            logging.warning("--stream processes references one at a time, ignoring --cpus")
+        stream_targets(targets, reference_path, outdir)
+        return
 
-    # Extract the sequences
-    sequences = {}
-    for target in targets:
-        if target["target"] not in sequences:
-            sequences[target["target"]] = []
-        logging.debug(
-            f"Extracting {target['target']} from {target['file']} ({target['start']}:{target['stop']})"
-        )
-        sequence = Seq(
-            seq_objects[target["file"]].seq[
-                int(target["start"]) - 1 : int(target["stop"])
-            ]
-        )
-        if target["strand"] == "-":
-            sequence = sequence.reverse_complement()
-        sequences[target["target"]].append(
-            {
-                "accession": target["accession"],
-                "type": target["type"],
-                "seq": str(sequence),
-            }
-        )
+    # Extract the sequences, only reading the needed slices of each reference
+    sequences = extract_targets(targets, reference_path, cpus=cpus)
 
     # Write the sequences to file (giving each target its own file)
-    for target, seqs in sequences.items():
-        # create outdir if it doesn't exist
-        Path(outdir).mkdir(parents=True, exist_ok=True)
-        logging.debug(f"Writing {target} to {outdir}/{target}.fasta")
-        with open(f"{outdir}/{target}.fasta", "w") as fh:
-            for seq in seqs:
-                fh.write(f">{target} {seq['accession']}|{seq['type']}\n{seq['seq']}\n")
+    write_targets(sequences, outdir)
 
 
 def main():
@@ -0,0 +1,132 @@
+import logging
+import sys
+import time
+from pathlib import Path
+
+import rich
+import rich.console
+import rich.traceback
+import rich_click as click
+from rich import print
+from rich.logging import RichHandler
+
+import camlhmp
+from camlhmp.summary import BUFFER_SIZE, merge_summaries
+from camlhmp.utils import file_exists_error, validate_file
+
+# Set up Rich
+stderr = rich.console.Console(stderr=True)
+rich.traceback.install(console=stderr, width=200, word_wrap=True, extra_lines=1)
+click.rich_click.USE_RICH_MARKUP = True
+click.rich_click.OPTION_GROUPS = {
+    "camlhmp-merge": [
+        {
+            "name": "Required Options",
+            "options": [
+                "--output",
+            ],
+        },
+        {
+            "name": "Input Options",
+            "options": [
+                "--fofn",
+            ],
+        },
+        {
+            "name": "Additional Options",
+            "options": [
+                "--append",
+                "--buffer-size",
+                "--force",
+                "--verbose",
+                "--silent",
+                "--version",
+                "--help",
+            ],
+        },
+    ]
+}
+
+
+@click.command()
+@click.version_option(camlhmp.__version__, "--version", "-V")
+@click.argument("inputs", nargs=-1)
+@click.option(
+    "--output",
+    "-o",
+    required=True,
+    help="The merged TSV to write (compressed if ending in .gz or .zst)",
+)
+@click.option(
+    "--fofn",
+    "-f",
+    help="A file with the path of a TSV to merge on each line (for many inputs)",
+)
+@click.option("--append", is_flag=True, help="Append to an existing merged TSV")
+@click.option(
+    "--buffer-size",
+    default=BUFFER_SIZE,
+    show_default=True,
+    help="Number of rows to hold before writing them",
+)
+@click.option("--force", is_flag=True, help="Overwrite an existing merged TSV")
+@click.option("--verbose", is_flag=True, help="Increase the verbosity of output")
+@click.option("--silent", is_flag=True, help="Only critical errors will be printed")
+def camlhmp_merge(
+    inputs,
+    output,
+    fofn,
+    append,
+    buffer_size,
+    force,
+    verbose,
+    silent,
+):
+    """🐪 camlhmp-merge 🐪 - Merge the outputs of many samples into a single TSV"""
+    # Setup logs
+    logging.basicConfig(
+        format="%(asctime)s:%(name)s:%(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        handlers=[
+            RichHandler(rich_tracebacks=True, console=rich.console.Console(stderr=True))
+        ],
+    )
+    logging.getLogger().setLevel(
+        logging.ERROR if silent else logging.DEBUG if verbose else logging.INFO
+    )
+
+    # Collect the inputs, a file of filenames avoids command line limits
+    tsvs = list(inputs)
+    if fofn:
+        with open(validate_file(fofn), "rt") as fh:
+            tsvs.extend(line.strip() for line in fh if line.strip())
+    if not tsvs:
+        raise click.UsageError("No inputs to merge, provide TSVs or --fofn")
+
+    # Make sure the output doesn't already exist
+    if not append:
+        file_exists_error(output, force)
+        Path(output).unlink(missing_ok=True)
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+
+    print(
+        f"[italic]Merging {len(tsvs)} files into [deep_sky_blue1]{output}[/deep_sky_blue1]...[/italic]",
+        file=sys.stderr,
+    )
+    start_time = time.perf_counter()
+    total = merge_summaries(tsvs, output, buffer_size=buffer_size)
+    print(
+        f"[italic]    Merged {total} rows in {time.perf_counter() - start_time:.2f}s[/italic]",
+        file=sys.stderr,
+    )
+
+
+def main():
+    if len(sys.argv) == 1:
+        camlhmp_merge.main(["--help"])
+    else:
+        camlhmp_merge()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import logging
+import sys
+
+import rich
+import rich.console
+import rich.traceback
+import rich_click as click
+from rich import print
+from rich.logging import RichHandler
+from rich.table import Table
+
+import camlhmp
+from camlhmp.bitmap import get_samples, query_bitmap, read_bitmap_index
+from camlhmp.store import open_store, query_runs
+from camlhmp.utils import validate_file, write_tsv
+
+# Set up Rich
+stderr = rich.console.Console(stderr=True)
+rich.traceback.install(console=stderr, width=200, word_wrap=True, extra_lines=1)
+click.rich_click.USE_RICH_MARKUP = True
+click.rich_click.OPTION_GROUPS = {
+    "camlhmp-query": [
+        {
+            "name": "Input Options",
+            "options": [
+                "--db",
+                "--bitmap",
+            ],
+        },
+        {
+            "name": "Query Options",
+            "options": [
+                "--has",
+                "--lacks",
+                "--type",
+                "--not-type",
+                "--schema",
+                "--all-runs",
+                "--sql",
+                "--count",
+            ],
+        },
+        {
+            "name": "Additional Options",
+            "options": [
+                "--output",
+                "--verbose",
+                "--silent",
+                "--version",
+                "--help",
+            ],
+        },
+    ]
+}
+
+
+@click.command()
+@click.version_option(camlhmp.__version__, "--version", "-V")
+@click.option("--db", "-d", help="The SQLite database runs were recorded in (--db)")
+@click.option("--bitmap", "-b", help="The bitmap index samples were added to (--bitmap)")
+@click.option("--has", multiple=True, help="Only samples where this target was found (repeatable)")
+@click.option("--lacks", multiple=True, help="Only samples where this target was not found (repeatable)")
+@click.option("--type", "-t", "types", multiple=True, help="Only samples called as this type (repeatable)")
+@click.option("--not-type", multiple=True, help="Only samples not called as this type (repeatable)")
+@click.option("--schema", "-s", help="Only runs of this schema ID (--db only)")
+@click.option("--all-runs", is_flag=True, help="Include every run of a sample, not only the latest (--db only)")
+@click.option("--sql", help="Run this SQL query instead (tables: runs, types, targets) (--db only)")
+@click.option("--count", is_flag=True, help="Only print the number of matches")
+@click.option("--output", "-o", type=click.Path(exists=False), help="Write the matches to this TSV")
+@click.option("--verbose", is_flag=True, help="Increase the verbosity of output")
+@click.option("--silent", is_flag=True, help="Only critical errors will be printed")
+def camlhmp_query(
+    db,
+    bitmap,
+    has,
+    lacks,
+    types,
+    not_type,
+    schema,
+    all_runs,
+    sql,
+    count,
+    output,
+    verbose,
+    silent,
+):
+    """🐪 camlhmp-query 🐪 - Query the runs recorded in a camlhmp database or bitmap index"""
+    # Setup logs
+    logging.basicConfig(
+        format="%(asctime)s:%(name)s:%(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        handlers=[
+            RichHandler(rich_tracebacks=True, console=rich.console.Console(stderr=True))
+        ],
+    )
+    logging.getLogger().setLevel(
+        logging.ERROR if silent else logging.DEBUG if verbose else logging.INFO
+    )
+
+    if bool(db) == bool(bitmap):
+        raise click.UsageError("Provide either --db or --bitmap")
+
+    if bitmap:
+        # Set queries only need a few bitwise operations
+        index = read_bitmap_index(validate_file(bitmap))
+        bits = query_bitmap(index, has=list(has), lacks=list(lacks), types=list(types), not_types=list(not_type))
+        if count:
+            print(bits.bit_count())
+            return
+        matches = [{"sample": sample} for sample in get_samples(index, bits)]
+    else:
+        conn = open_store(validate_file(db), readonly=True)
+        try:
+            if sql:
+                matches = [dict(row) for row in conn.execute(sql)]
+            else:
+                matches = query_runs(
+                    conn,
+                    has=list(has),
+                    lacks=list(lacks),
+                    types=list(types),
+                    not_types=list(not_type),
+                    schema=schema,
+                    latest=not all_runs,
+                )
+        finally:
+            conn.close()
+        if count:
+            print(len(matches))
+            return
+
+    print(f"[italic]Found {len(matches)} matching rows[/italic]", file=sys.stderr)
+    if not matches:
+        return
+
+    if output:
+        write_tsv(matches, output)
+        print(f"[italic]Matches written to [deep_sky_blue1]{output}[/deep_sky_blue1][/italic]", file=sys.stderr)
+    else:
+        console = rich.console.Console()
+        table = Table()
+        for column in matches[0]:
+            table.add_column(column, style="white" if column == "sample" else "cyan")
+        for row in matches:
+            table.add_row(*["" if val is None else str(val) for val in row.values()])
+        console.print(table)
+
+
+def main():
+    if len(sys.argv) == 1:
+        camlhmp_query.main(["--help"])
+    else:
+        camlhmp_query()
+
+
+if __name__ == "__main__":
+    main()
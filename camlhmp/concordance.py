@@ -0,0 +1,214 @@
+"""
+A set of functions for checking if engine parameters (e.g. a speed preset) change the type
+called for a set of reference samples.
+
+Each sample is typed twice, once with only the framework's thresholds (the baseline) and
+once with the preset or parameters, and the types, targets (or alleles) are compared.
+"""
+import logging
+import time
+from pathlib import Path
+from typing import Union
+
+from camlhmp.classifier import Classifier
+from camlhmp.engines import THRESHOLD_PARAMS
+from camlhmp.framework import read_framework
+from camlhmp.utils import validate_file
+
+CONCORDANCE_COLS = [
+    "sample",
+    "baseline_type",
+    "preset_type",
+    "concordant",
+    "discordance",
+    "baseline_time",
+    "preset_time",
+    "preset_params",
+]
+
+
+def get_baseline_framework(framework: dict) -> dict:
+    """
+    Get a copy of a framework without any engine parameters, only its thresholds.
+
+    Args:
+        framework (dict): The parsed framework
+
+    Returns:
+        dict: the framework, with only `min_pident` and `min_coverage` in `engine.params`
+
+    Examples:
+        >>> from camlhmp.concordance import get_baseline_framework
+        >>> baseline = get_baseline_framework(framework)
+    """
+    params = framework["engine"].get("params")
+    params = params if isinstance(params, dict) else {}
+    engine = {**framework["engine"], "params": {key: val for key, val in params.items() if key in THRESHOLD_PARAMS}}
+    return {**framework, "engine": engine}
+
+
+def get_call(mode: str, result: dict, targets: list) -> str:
+    """
+    Get the call made for a sample, to compare between runs.
+
+    Args:
+        mode (str): How the framework was evaluated ('targets', 'regions' or 'alleles')
+        result (dict): The final result of the sample (e.g. from `Classifier.classify`)
+        targets (list): The targets of the framework
+
+    Returns:
+        str: the type, or the allele of each target for 'alleles'
+
+    Examples:
+        >>> from camlhmp.concordance import get_call
+        >>> call = get_call("targets", results["result"], framework["targets"])
+    """
+    if mode == "alleles":
+        return ",".join(f"{target}:{result[f'{target}_id']}" for target in targets)
+    return result["type"]
+
+
+def get_discordance(mode: str, baseline: dict, result: dict, targets: list) -> list:
+    """
+    Find what differs between the results of a sample from two runs.
+
+    Args:
+        mode (str): How the framework was evaluated ('targets', 'regions' or 'alleles')
+        baseline (dict): The final result of the sample from the baseline run
+        result (dict): The final result of the sample from the other run
+        targets (list): The targets of the framework
+
+    Returns:
+        list: what differs ('type', 'targets' or 'alleles'), empty if the results agree
+
+    Examples:
+        >>> from camlhmp.concordance import get_discordance
+        >>> get_discordance("targets", baseline["result"], results["result"], framework["targets"])
+        []
+    """
+    if mode == "alleles":
+        return ["alleles"] if get_call(mode, baseline, targets) != get_call(mode, result, targets) else []
+
+    discordance = []
+    if baseline["type"] != result["type"]:
+        discordance.append("type")
+    if baseline["targets"] != result["targets"]:
+        discordance.append("targets")
+    return discordance
+
+
+def classify_samples(classifier: Classifier, samples: dict) -> dict:
+    """
+    Type each sample, recording how long it took.
+
+    Args:
+        classifier (Classifier): The classifier to type the samples with
+        samples (dict): The file of each sample {name: path}
+
+    Returns:
+        dict: the final result and seconds spent on each sample {name: [result, seconds]}
+
+    Examples:
+        >>> from camlhmp.concordance import classify_samples
+        >>> results = classify_samples(Classifier("sccmec.yaml", "sccmec.fasta"), samples)
+    """
+    results = {}
+    for sample, path in samples.items():
+        start = time.perf_counter()
+        result = classifier.classify(path, prefix=sample)["result"]
+        results[sample] = [result, time.perf_counter() - start]
+    return results
+
+
+def get_sample_names(inputs: list) -> dict:
+    """
+    Name samples by their file name, without any extensions.
+
+    Args:
+        inputs (list): The sample files
+
+    Returns:
+        dict: the file of each sample {name: path}
+
+    Raises:
+        ValueError: if two files would have the same name
+
+    Examples:
+        >>> from camlhmp.concordance import get_sample_names
+        >>> get_sample_names(["data/sample01.fna.gz"])
+        {'sample01': 'data/sample01.fna.gz'}
+    """
+    samples = {}
+    for path in inputs:
+        name = Path(path).name.split(".")[0]
+        if name in samples:
+            raise ValueError(f"Samples must have unique names, {path} and {samples[name]} are both {name}")
+        samples[name] = path
+    return samples
+
+
+def check_concordance(
+    framework: Union[str, dict],
+    targets: str,
+    samples: dict,
+    mode: str = "targets",
+    preset: str = None,
+    params: dict = None,
+    min_pident: float = None,
+    min_coverage: int = None,
+) -> list:
+    """
+    Check if a preset (or engine parameters) changes the results of a set of samples.
+
+    Args:
+        framework (str|dict): The framework YAML file, or an already parsed framework
+        targets (str): The targets in FASTA format
+        samples (dict): The file of each sample {name: path}
+        mode (str, optional): How the framework is evaluated ('targets', 'regions' or
+            'alleles'). Defaults to "targets".
+        preset (str, optional): A named set of engine parameters. Defaults to None.
+        params (dict, optional): Parameters to pass to the engine. Defaults to None.
+        min_pident (float, optional): The minimum percent identity to count a hit.
+            Defaults to the framework's params, or 95.
+        min_coverage (int, optional): The minimum percent coverage to count a hit.
+            Defaults to the framework's params, or 95.
+
+    Returns:
+        list: a dict for each sample with the columns in `CONCORDANCE_COLS`
+
+    Raises:
+        ValueError: if the preset or a parameter is not supported by the engine
+
+    Examples:
+        >>> from camlhmp.concordance import check_concordance
+        >>> rows = check_concordance("sccmec.yaml", "sccmec.fasta", samples, preset="fast")
+        >>> all(row["concordant"] for row in rows)
+    """
+    framework = read_framework(validate_file(framework)) if not isinstance(framework, dict) else framework
+    thresholds = {"min_pident": min_pident, "min_coverage": min_coverage}
+    baseline = Classifier(get_baseline_framework(framework), targets, mode=mode, **thresholds)
+    candidate = Classifier(framework, targets, mode=mode, preset=preset, params=params, **thresholds)
+
+    baseline_results = classify_samples(baseline, samples)
+    preset_results = classify_samples(candidate, samples)
+
+    rows = []
+    for sample in samples:
+        baseline_result, baseline_time = baseline_results[sample]
+        preset_result, preset_time = preset_results[sample]
+        discordance = get_discordance(mode, baseline_result, preset_result, framework["targets"])
+        if discordance:
+            logging.debug(f"The {', '.join(discordance)} of {sample} changed")
+        rows.append(
+            {
+                "sample": sample,
+                "baseline_type": get_call(mode, baseline_result, framework["targets"]),
+                "preset_type": get_call(mode, preset_result, framework["targets"]),
+                "concordant": not discordance,
+                "discordance": ",".join(discordance),
+                "baseline_time": round(baseline_time, 3),
+                "preset_time": round(preset_time, 3),
+                "preset_params": preset_result["params"],
+            }
+        )
+    return rows
@@ -0,0 +1,314 @@
+"""
+A registry of the search engines available to camlhmp.
+
+Engines are discovered through the `camlhmp.engines` entry point group, so third-party
+packages can provide a new `engine.type` for frameworks without changes to camlhmp. An
+entry point should reference a subclass of `camlhmp.engines.Engine` that implements its
+abstract methods, for example:
+
+    [tool.poetry.plugins."camlhmp.engines"]
+    myengine = "my_package.engine:MyEngine"
+"""
+import logging
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from importlib import import_module
+from importlib.metadata import entry_points
+
+ENTRY_POINT_GROUP = "camlhmp.engines"
+
+# Engines shipped with camlhmp, used if the package metadata is unavailable
+BUILTIN_ENGINES = {
+    "blast": "camlhmp.engines.blast:BlastEngine",
+    "kmer": "camlhmp.engines.kmer:KmerEngine",
+}
+
+# Params of a framework's engine that are thresholds, not settings of the engine
+THRESHOLD_PARAMS = ["min_pident", "min_coverage"]
+
+
+class Engine(ABC):
+    """
+    The interface every camlhmp engine must implement.
+
+    Engines must implement `stream_hits` and `search`, an engine missing either cannot be
+    loaded by `get_engine`.
+
+    Attributes:
+        name (str): The name used for `engine.type` in a framework
+        tools (list): The tools (e.g. `blastn`) supported for `engine.tool`
+        presets (dict): Named sets of parameters (e.g. `fast`) for `validate_params`
+    """
+
+    name = None
+    tools = []
+    presets = {}
+
+    def validate_tool(self, tool: str) -> str:
+        """
+        Validate the tool is supported by the engine.
+
+        Args:
+            tool (str): the tool to validate
+
+        Returns:
+            str: the validated tool
+
+        Raises:
+            ValueError: if the tool is not supported
+        """
+        if self.tools and tool not in self.tools:
+            raise ValueError(f"Unsupported tool ('{tool}'), engine {self.name} only supports: {self.tools}")
+        return tool
+
+    def validate_params(self, tool: str, params: dict) -> dict:
+        """
+        Validate the parameters to pass through to the engine.
+
+        Engines without any parameters can rely on the default, which rejects them all.
+
+        Args:
+            tool (str): the tool the parameters are for
+            params (dict): the parameters (values may be strings from the command line)
+
+        Returns:
+            dict: the validated parameters, converted to their types
+
+        Raises:
+            ValueError: if a parameter is not supported
+        """
+        if params:
+            raise ValueError(f"Engine {self.name} does not support any parameters, found: {', '.join(params)}")
+        return {}
+
+    def get_preset(self, name: str) -> dict:
+        """
+        Get the parameters of a named preset.
+
+        Args:
+            name (str): the name of the preset
+
+        Returns:
+            dict: the parameters of the preset
+
+        Raises:
+            ValueError: if the engine does not provide the preset
+        """
+        if name not in self.presets:
+            raise ValueError(f"Unknown preset ('{name}'), engine {self.name} provides: {list(self.presets)}")
+        return dict(self.presets[name])
+
+    def prepare_index(self, subject: str, cache_dir: str = None, max_entries: int = 100):
+        """
+        Prepare an index of the subject to be reused across searches.
+
+        Engines without an index can rely on the default, which yields no index.
+
+        Args:
+            subject (str): The subject (input) to index
+            cache_dir (str, optional): A directory to cache indexes in. Defaults to None.
+            max_entries (int, optional): The maximum number of cached indexes. Defaults to 100.
+
+        Returns:
+            ContextManager: yields the index and seconds spent building it
+        """
+        return nullcontext([None, 0])
+
+    @abstractmethod
+    def stream_hits(
+        self,
+        tool: str,
+        subject: str,
+        query: str,
+        min_pident: float,
+        min_coverage: int,
+        index: str = None,
+        params: dict = None,
+    ):
+        """
+        Search the query against the subject, yielding each hit as it is found.
+
+        Args:
+            tool (str): The tool to use
+            subject (str): The subject (input)
+            query (str): The query file (targets)
+            min_pident (float): The minimum percent identity to count a hit
+            min_coverage (int): The minimum percent coverage to count a hit
+            index (str, optional): An index from `prepare_index`. Defaults to None.
+            params (dict, optional): Engine specific settings (e.g. the blastn `tasks`), engines
+                ignore settings they do not support. Defaults to None.
+
+        Yields:
+            dict: a hit with the columns of `camlhmp.engines.blast.BLASTN_COLS`
+        """
+
+    @abstractmethod
+    def search(
+        self,
+        tool: str,
+        subject: str,
+        query: str,
+        min_pident: float,
+        min_coverage: int,
+        index: str = None,
+        params: dict = None,
+    ) -> list:
+        """
+        Search the query against the subject.
+
+        Engines that only stream their hits can return `super().search(...)`, which
+        collects the hits of `stream_hits`.
+
+        Args:
+            tool (str): The tool to use
+            subject (str): The subject (input)
+            query (str): The query file (targets)
+            min_pident (float): The minimum percent identity to count a hit
+            min_coverage (int): The minimum percent coverage to count a hit
+            index (str, optional): An index from `prepare_index`. Defaults to None.
+            params (dict, optional): Engine specific settings (e.g. the blastn `tasks`), engines
+                ignore settings they do not support. Defaults to None.
+
+        Returns:
+            list: The target hits, the parsed results, and stderr (same as `run_blast`)
+        """
+        from camlhmp.engines.blast import BLASTN_COLS
+
+        results = []
+        target_hits = []
+        for hit in self.stream_hits(tool, subject, query, min_pident, min_coverage, index=index, params=params):
+            results.append(hit)
+            target_hits.append(hit["qseqid"])
+
+        if not results:
+            # Create an empty dict if no results are found
+            results.append(dict(zip(BLASTN_COLS, ["NO_HITS"] * len(BLASTN_COLS))))
+
+        return [target_hits, results, ""]
+
+
+def available_engines() -> dict:
+    """
+    Get the engines available to camlhmp.
+
+    Returns:
+        dict: the engine names and their 'module:attribute' references
+
+    Examples:
+        >>> from camlhmp.engines import available_engines
+        >>> engines = available_engines()
+    """
+    engines = dict(BUILTIN_ENGINES)
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        engines[entry_point.name] = entry_point.value
+    return engines
+
+
+def get_engine(name: str) -> Engine:
+    """
+    Load an engine by its name.
+
+    Args:
+        name (str): the name of the engine (e.g. `framework["engine"]["type"]`)
+
+    Returns:
+        Engine: an instance of the engine
+
+    Raises:
+        ValueError: if the engine is not available, or does not implement `Engine`
+
+    Examples:
+        >>> from camlhmp.engines import get_engine
+        >>> engine = get_engine(framework["engine"]["type"])
+    """
+    engines = available_engines()
+    if name not in engines:
+        raise ValueError(f"Unsupported engine ('{name}'), available engines: {list(engines)}")
+
+    module, attribute = engines[name].split(":")
+    engine_class = getattr(import_module(module), attribute)
+    if not isinstance(engine_class, type) or not issubclass(engine_class, Engine):
+        raise ValueError(f"Engine {name} ({engines[name]}) is not a subclass of camlhmp.engines.Engine")
+    try:
+        engine = engine_class()
+    except TypeError as e:
+        # An abstract method is not implemented
+        raise ValueError(f"Engine {name} ({engines[name]}) is incomplete: {e}") from e
+    logging.debug(f"Loaded engine {name} from {engines[name]}")
+    return engine
+
+
+def parse_engine_params(values: list) -> dict:
+    """
+    Parse engine parameters given on the command line.
+
+    Args:
+        values (list): the parameters, each as 'KEY=VALUE'
+
+    Returns:
+        dict: the parameters, values are left as strings for `Engine.validate_params`
+
+    Raises:
+        ValueError: if a parameter is not formatted as 'KEY=VALUE'
+
+    Examples:
+        >>> from camlhmp.engines import parse_engine_params
+        >>> parse_engine_params(["max_hsps=1", "dust=no"])
+        {'max_hsps': '1', 'dust': 'no'}
+    """
+    params = {}
+    for value in values or []:
+        key, sep, val = value.partition("=")
+        if not sep or not key.strip():
+            raise ValueError(f"Engine parameters must be formatted as KEY=VALUE, found: {value}")
+        params[key.strip()] = val.strip()
+    return params
+
+
+def get_engine_params(engine: Engine, tool: str, framework: dict, preset: str = None, params: dict = None) -> dict:
+    """
+    Get the parameters to pass through to an engine.
+
+    Parameters are combined in order of precedence: the preset, then those declared in the
+    framework's `engine.params`, then `params` (e.g. from the command line). A preset given
+    here replaces one declared by the framework (`engine.params.preset`). Presets declared by
+    the framework (`engine.presets`, e.g. from `camlhmp-blast-tune`) take precedence over
+    the engine's own presets of the same name.
+
+    Args:
+        engine (Engine): the engine the parameters are for
+        tool (str): the tool the parameters are for
+        framework (dict): the parsed framework
+        preset (str, optional): a named preset of the engine. Defaults to None.
+        params (dict, optional): parameters that take precedence over the framework's.
+            Defaults to None.
+
+    Returns:
+        dict: the validated parameters
+
+    Raises:
+        ValueError: if the preset or a parameter is not supported by the engine
+
+    Examples:
+        >>> from camlhmp.engines import get_engine_params
+        >>> engine_params = get_engine_params(engine, "blastn", framework, preset="fast")
+    """
+    declared = framework["engine"].get("params")
+    declared = {
+        key: val for key, val in (declared if isinstance(declared, dict) else {}).items()
+        if key not in THRESHOLD_PARAMS
+    }
+    declared_preset = declared.pop("preset", None)
+    preset = preset or declared_preset
+
+    presets = framework["engine"].get("presets")
+    presets = presets if isinstance(presets, dict) else {}
+    if preset in presets:
+        engine_params = dict(presets[preset] or {})
+    else:
+        engine_params = engine.get_preset(preset) if preset else {}
+    engine_params.update(declared)
+    engine_params.update(params or {})
+    engine_params = engine.validate_params(tool, engine_params)
+    logging.debug(f"Engine parameters (preset={preset}): {engine_params}")
+    return engine_params
@@ -1,5 +1,20 @@
 # Functions for running and parsing BLAST results
-from camlhmp.utils import execute
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Union
+
+from camlhmp.engines import Engine
+from camlhmp.utils import (CommandError, get_tmpdir, is_compressed,
+                           open_seqfile, parse_seq_lengths, pipe_input,
+                           read_fasta, run_command)
 
 BLASTN_COLS = [
     "qseqid",
@@ -20,35 +35,341 @@ BLASTN_COLS = [
     "bitscore",
 ]
 
+# The blastn tasks targets can be searched with, and the word size used for each
+BLASTN_TASKS = {
+    "blastn-short": 7,
+    "blastn": 11,
+    "dc-megablast": 11,
+    "megablast": 28,
+}
+BLASTN_TASK_CHOICES = ["auto"] + list(BLASTN_TASKS)
+
+# Parameters passed through to BLAST+, the type of their value and the tools supporting them
+BLAST_PARAMS = {
+    "task": [str, ["blastn"]],
+    "word_size": [int, ["blastn", "tblastn", "blastp"]],
+    "max_target_seqs": [int, ["blastn", "tblastn", "blastp"]],
+    "max_hsps": [int, ["blastn", "tblastn", "blastp"]],
+    "ungapped": [bool, ["blastn", "tblastn", "blastp"]],
+    "dust": [str, ["blastn"]],
+    "num_threads": [int, ["blastn", "tblastn", "blastp"]],
+}
+
+# Parameters that limit the hits reported, coverage of a region is summed across all its hits
+HIT_LIMIT_PARAMS = ["max_target_seqs", "max_hsps"]
+
+BLAST_PRESETS = {
+    # Only the best hit of each target, enough when only its presence matters
+    "fast": {"max_target_seqs": 1, "max_hsps": 1},
+    # Shorter words for every target, and low complexity regions are not masked
+    "sensitive": {"task": "blastn", "dust": "no"},
+}
+
+# Targets shorter than this have too few 28-mers for megablast to seed a hit
+SHORT_TARGET_LENGTH = 50
+
+# Below this identity exact 28-mers become rare, so divergent targets are seeded with
+# discontiguous words instead
+DIVERGENT_PIDENT = 90
 
-def run_blast(engine: str, subject: str, query: str, min_pident: float, min_coverage: int) -> list:
+
+def select_blastn_task(length: int, min_pident: float) -> str:
     """
-    Query sequences against a input subject using a specified BLAST+ algorithm.
+    Select the blastn task suited to a target.
+
+    Args:
+        length (int): The length of the target
+        min_pident (float): The minimum percent identity a hit must reach
+
+    Returns:
+        str: the blastn task (a key of `BLASTN_TASKS`)
+
+    Examples:
+        >>> from camlhmp.engines.blast import select_blastn_task
+        >>> select_blastn_task(24, 95)
+        'blastn-short'
+    """
+    if length < SHORT_TARGET_LENGTH:
+        return "blastn-short"
+    elif min_pident < DIVERGENT_PIDENT:
+        return "dc-megablast"
+    return "megablast"
+
+
+def get_blastn_tasks(query: str, min_pident: float, task: str = "auto") -> dict:
+    """
+    Get the blastn task each target should be searched with.
+
+    Args:
+        query (str): The query file (targets)
+        min_pident (float): The minimum percent identity a hit must reach
+        task (str, optional): A task for every target, or 'auto' to select one by the
+            length of each target and `min_pident`. Defaults to "auto".
+
+    Returns:
+        dict: the task of each target {target: task}
+
+    Raises:
+        ValueError: if the task is not supported
+
+    Examples:
+        >>> from camlhmp.engines.blast import get_blastn_tasks
+        >>> tasks = get_blastn_tasks(targets_path, min_pident)
+    """
+    if task not in BLASTN_TASK_CHOICES:
+        raise ValueError(f"Unsupported blastn task ('{task}'), expected one of: {', '.join(BLASTN_TASK_CHOICES)}")
+
+    lengths = parse_seq_lengths(query, "fasta")
+    if task != "auto":
+        return {target: task for target in lengths}
+    return {target: select_blastn_task(length, min_pident) for target, length in lengths.items()}
+
+
+def format_blastn_tasks(tasks: dict) -> str:
+    """
+    Describe the blastn tasks of a search, to be recorded in the params of a run.
+
+    Args:
+        tasks (dict): The task of each target (e.g. from `get_blastn_tasks`)
+
+    Returns:
+        str: the tasks used, separated by commas
+
+    Examples:
+        >>> from camlhmp.engines.blast import format_blastn_tasks
+        >>> params = f"min-coverage=95;min-pident=95;blast-task={format_blastn_tasks(tasks)}"
+    """
+    return ",".join(sorted(set(tasks.values())))
+
+
+def validate_blast_params(tool: str, params: dict) -> dict:
+    """
+    Validate the parameters to pass through to BLAST+.
+
+    Args:
+        tool (str): The BLAST+ tool the parameters are for
+        params (dict): The parameters (values may be strings from the command line)
+
+    Returns:
+        dict: the validated parameters, converted to their types
+
+    Raises:
+        ValueError: if a parameter, or its value, is not supported by the tool
+
+    Examples:
+        >>> from camlhmp.engines.blast import validate_blast_params
+        >>> validate_blast_params("blastn", {"max_hsps": "1", "ungapped": "true"})
+        {'max_hsps': 1, 'ungapped': True}
+    """
+    validated = {}
+    for key, val in params.items():
+        if key not in BLAST_PARAMS:
+            raise ValueError(f"Unsupported BLAST+ parameter ('{key}'), expected one of: {', '.join(BLAST_PARAMS)}")
+        val_type, tools = BLAST_PARAMS[key]
+        if tool not in tools:
+            raise ValueError(f"BLAST+ parameter '{key}' is not supported by {tool}")
+
+        if val_type is bool and isinstance(val, str):
+            if val.lower() not in ["true", "false", "yes", "no", "1", "0"]:
+                raise ValueError(f"BLAST+ parameter '{key}' must be true or false, found: {val}")
+            val = val.lower() in ["true", "yes", "1"]
+        elif val_type is int:
+            try:
+                val = int(val)
+            except (TypeError, ValueError):
+                raise ValueError(f"BLAST+ parameter '{key}' must be an integer, found: {val}")
+            if val < 1:
+                raise ValueError(f"BLAST+ parameter '{key}' must be at least 1, found: {val}")
+        else:
+            val = val_type(val)
+
+        if key == "task" and val not in BLASTN_TASKS:
+            raise ValueError(f"Unsupported blastn task ('{val}'), expected one of: {', '.join(BLASTN_TASKS)}")
+        elif key == "dust" and val not in ["yes", "no"]:
+            raise ValueError(f"BLAST+ parameter 'dust' must be yes or no, found: {val}")
+        validated[key] = val
+    return validated
+
+
+def split_query_by_task(query: str, tasks: dict = None) -> list:
+    """
+    Split the targets of a search into a group for each blastn task.
+
+    Targets without a task are kept together and searched with the BLAST+ defaults.
+
+    Args:
+        query (str|bytes): The query (targets) file, or sequences in FASTA format
+        tasks (dict, optional): The task of each target (e.g. from `get_blastn_tasks`).
+            Defaults to None.
+
+    Returns:
+        list: the task (or None) and the query of each group, in-memory groups are bytes in
+            FASTA format
+
+    Examples:
+        >>> from camlhmp.engines.blast import split_query_by_task
+        >>> for task, group in split_query_by_task(targets_path, tasks):
+        ...     cmd = get_blast_cmd("blastn", input_path, group, min_pident, min_coverage, task=task)
+    """
+    distinct = set(tasks.values()) if tasks else set()
+    if len(distinct) <= 1:
+        # A single search, no need to split the targets
+        return [[distinct.pop() if len(distinct) == 1 else None, query]]
+
+    groups = {}
+    for name, seq in read_fasta(query):
+        groups.setdefault(tasks.get(name), []).append(f">{name}\n{seq}\n")
+    logging.debug(f"Searching targets in {len(groups)} groups: {', '.join(str(task) for task in groups)}")
+    return [[task, "".join(records).encode()] for task, records in groups.items()]
+
+
+def get_blast_cmd(
+    engine: str,
+    subject: str,
+    query: str,
+    min_pident: float,
+    min_coverage: int,
+    db: str = None,
+    task: str = None,
+    options: dict = None,
+) -> str:
+    """
+    Build the command to query sequences against a subject with BLAST+.
 
     Args:
         engine (str): The BLAST engine to use
-        subject (str): The subject database (input)
+        subject (str): The subject (input), `-` to read it from STDIN
         query (str): The query file (targets)
         min_pident (float): The minimum percent identity to count a hit
         min_coverage (int): The minimum percent coverage to count a hit
+        db (str, optional): A BLAST database of the subject to search instead. Defaults to None.
+        task (str, optional): The blastn task (and its word size) to search with. Defaults to None.
+        options (dict, optional): Other parameters to pass to BLAST+ (e.g. from
+            `validate_blast_params`), a `word_size` replaces the one of the task. Defaults to None.
+
+    Returns:
+        str: The BLAST+ command to execute
+
+    Examples:
+        >>> from camlhmp.engines.blast import get_blast_cmd
+        >>> cmd = get_blast_cmd("blastn", input_path, targets_path, min_pident, min_coverage)
+    """
+    outfmt = " ".join(BLASTN_COLS)
+    qcov_hsp_perc = f"-qcov_hsp_perc {min_coverage}" if min_coverage else ""
+    # Protein searches (tblastn and blastp) do not support -perc_identity
+    perc_identity = f"-perc_identity {min_pident}" if min_pident and engine == "blastn" else ""
+    options = dict(options or {})
+    if task and engine == "blastn":
+        # Tasks only apply to blastn
+        options = {"task": task, "word_size": BLASTN_TASKS[task], **options}
+    # Flags (e.g. -ungapped) are only added when true
+    extra_opts = " ".join(
+        f"-{key}" if val is True else f"-{key} {val}" for key, val in options.items() if val is not False
+    )
+    if db:
+        # Search the prebuilt database, no need to re-read the subject
+        return f"{engine} -query {query} -db {db} -outfmt '6 {outfmt}' {qcov_hsp_perc} {perc_identity} {extra_opts}"
+    return (
+        f"{engine} -query {query} -subject {subject} -outfmt '6 {outfmt}' {qcov_hsp_perc} {perc_identity} {extra_opts}"
+    )
+
+
+@contextmanager
+def blast_inputs(subject: Union[str, bytes, None], query: Union[str, bytes, None]):
+    """
+    Provide the subject and query of a search to BLAST+ without temporary files.
+
+    In-memory sequences (bytes in FASTA format) and compressed subjects are streamed through
+    pipes: the subject as STDIN, the query as `/dev/fd/{fd}`. Uncompressed files are read by
+    BLAST+ directly.
+
+    Args:
+        subject (str|bytes|None): The subject file or sequences (None if searching a database)
+        query (str|bytes|None): The query file or sequences (None if there is no query)
+
+    Yields:
+        list: the subject and query arguments, the STDIN descriptor (or None) and the
+            descriptors to pass to BLAST+
+
+    Examples:
+        >>> from camlhmp.engines.blast import blast_inputs
+        >>> with blast_inputs(b">ref\nACGT\n", targets_path) as (subject_arg, query_arg, stdin, pass_fds):
+        ...     cmd = get_blast_cmd("blastn", subject_arg, query_arg, min_pident, min_coverage)
+    """
+    with ExitStack() as stack:
+        stdin = None
+        pass_fds = []
+        if isinstance(subject, bytes):
+            stdin = stack.enter_context(pipe_input(subject))
+            subject = "-"
+        elif subject is not None and is_compressed(subject):
+            stdin = stack.enter_context(pipe_input(open_seqfile(subject)))
+            subject = "-"
+
+        if isinstance(query, bytes):
+            query_fd = stack.enter_context(pipe_input(query))
+            pass_fds.append(query_fd)
+            query = f"/dev/fd/{query_fd}"
+        yield [subject, query, stdin, pass_fds]
+
+
+def run_blast(
+    engine: str,
+    subject: str,
+    query: str,
+    min_pident: float,
+    min_coverage: int,
+    db: str = None,
+    timeout: float = None,
+    tasks: dict = None,
+    options: dict = None,
+) -> list:
+    """
+    Query sequences against a input subject using a specified BLAST+ algorithm.
+
+    When targets have different blastn tasks, each group of targets is searched
+    separately and the hits are combined.
+
+    Args:
+        engine (str): The BLAST engine to use
+        subject (str|bytes): The subject (input) file, or sequences in FASTA format
+        query (str|bytes): The query (targets) file, or sequences in FASTA format
+        min_pident (float): The minimum percent identity to count a hit
+        min_coverage (int): The minimum percent coverage to count a hit
+        db (str, optional): A BLAST database of the subject to search instead. Defaults to None.
+        timeout (float, optional): Seconds before BLAST+ is stopped. Defaults to None.
+        tasks (dict, optional): The blastn task of each target (e.g. from `get_blastn_tasks`).
+            Defaults to None.
+        options (dict, optional): Other parameters to pass to BLAST+ (e.g. from
+            `validate_blast_params`). Defaults to None.
 
     Returns:
         list: The parsed BLAST results, raw blast results, and stderr
 
+    Raises:
+        CommandError: if BLAST+ fails or times out
+
     Examples:
         >>> from camlhmp.engines.blast import run_blast
         >>> hits, blast_stdout, blast_stderr = run_blast(
                 framework["engine"]["tool"], input_path, targets_path, min_pident, min_coverage
             )
     """
-    outfmt = " ".join(BLASTN_COLS)
-    cat_type = "zcat" if str(subject).endswith(".gz") else "cat"
-    qcov_hsp_perc = f"-qcov_hsp_perc {min_coverage}" if min_coverage else ""
-    perc_identity = f"-perc_identity {min_pident}" if min_pident and engine != "tblastn" else ""
-    stdout, stderr = execute(
-        f"{cat_type} {subject} | {engine} -query {query} -subject - -outfmt '6 {outfmt}' {qcov_hsp_perc} {perc_identity}",
-        capture=True,
-    )
+    stdout = []
+    stderr = []
+    for task, group in split_query_by_task(query, tasks):
+        with blast_inputs(None if db else subject, group) as (subject_arg, query_arg, stdin, pass_fds):
+            result = run_command(
+                get_blast_cmd(
+                    engine, subject_arg, query_arg, min_pident, min_coverage, db=db, task=task, options=options
+                ),
+                timeout=timeout,
+                stdin=stdin,
+                pass_fds=pass_fds,
+            )
+        stdout.append(result["stdout"])
+        stderr.append(result["stderr"])
+    stdout, stderr = "\n".join(stdout), "".join(stderr)
 
     # Convert BLAST results to a list of dicts
     results = []
@@ -67,6 +388,207 @@ def run_blast(engine: str, subject: str, query: str, min_pident: float, min_cove
     return [target_hits, results, stderr]
 
 
+def make_blastdb(subject: str, outdir: str, title: str = "subject", timeout: float = None) -> str:
+    """
+    Build a nucleotide BLAST database from the input subject.
+
+    Args:
+        subject (str): The subject (input) to build a database from
+        outdir (str): The directory to write the database to
+        title (str, optional): The title of the database. Defaults to "subject".
+        timeout (float, optional): Seconds before makeblastdb is stopped. Defaults to None.
+
+    Returns:
+        str: The path to the database, to be used with `-db`
+
+    Raises:
+        CommandError: if makeblastdb fails or times out
+
+    Examples:
+        >>> from camlhmp.engines.blast import make_blastdb
+        >>> db = make_blastdb(input_path, "./blastdb")
+    """
+    db = f"{outdir}/{title}"
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    with blast_inputs(subject, None) as (subject_arg, _, stdin, _):
+        run_command(
+            f"makeblastdb -in {subject_arg} -dbtype nucl -title {title} -out {db}",
+            timeout=timeout,
+            stdin=stdin,
+        )
+    return db
+
+
+def get_subject_key(subject: str) -> str:
+    """
+    Generate a key for the subject based on its contents.
+
+    Args:
+        subject (str): The subject (input) to generate a key for
+
+    Returns:
+        str: A SHA256 hexdigest of the subject
+
+    Examples:
+        >>> from camlhmp.engines.blast import get_subject_key
+        >>> key = get_subject_key(input_path)
+    """
+    sha256 = hashlib.sha256()
+    with open(subject, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_blastdb_lock(entry: Path) -> Path:
+    """
+    Get the lock file of a cached database.
+
+    Args:
+        entry (Path): The cached database
+
+    Returns:
+        Path: the lock file, hidden so it is never taken for a database
+    """
+    return entry.parent / f".{entry.name}.lock"
+
+
+@contextmanager
+def lock_blastdb_entry(entry: Path):
+    """
+    Hold a shared lock on a cached database, so it is not evicted while it is in use.
+
+    Evicting a database removes its lock file, so the lock is only kept if the lock file
+    is still the one that was locked.
+
+    Args:
+        entry (Path): The cached database
+
+    Examples:
+        >>> from camlhmp.engines.blast import lock_blastdb_entry
+        >>> with lock_blastdb_entry(Path("./blastdb-cache") / key):
+                hits, blast_stdout, blast_stderr = run_blast(...)
+    """
+    lock = get_blastdb_lock(entry)
+    while True:
+        fh = open(lock, "a")
+        fcntl.flock(fh, fcntl.LOCK_SH)
+        try:
+            if os.stat(lock).st_ino == os.fstat(fh.fileno()).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        fh.close()
+
+    try:
+        yield
+    finally:
+        fcntl.flock(fh, fcntl.LOCK_UN)
+        fh.close()
+
+
+def evict_blastdb_cache(cache_dir: str, max_entries: int) -> list:
+    """
+    Remove the least recently used databases from the cache.
+
+    Databases locked by another run (see `lock_blastdb_entry`) are skipped.
+
+    Args:
+        cache_dir (str): The directory containing cached databases
+        max_entries (int): The maximum number of databases to keep
+
+    Returns:
+        list: The databases that were removed
+
+    Examples:
+        >>> from camlhmp.engines.blast import evict_blastdb_cache
+        >>> evicted = evict_blastdb_cache("./blastdb-cache", 100)
+    """
+    entries = sorted(
+        [p for p in Path(cache_dir).iterdir() if p.is_dir() and not p.name.startswith(".")],
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    evicted = []
+    for entry in entries[max_entries:]:
+        lock = get_blastdb_lock(entry)
+        with open(lock, "a") as fh:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logging.debug(f"Not evicting {entry}, it is in use")
+                continue
+            logging.debug(f"Evicting {entry} from the BLAST database cache")
+            shutil.rmtree(entry, ignore_errors=True)
+            lock.unlink(missing_ok=True)
+            fcntl.flock(fh, fcntl.LOCK_UN)
+        evicted.append(str(entry))
+    return evicted
+
+
+@contextmanager
+def subject_blastdb(subject: str, cache_dir: str = None, max_entries: int = 100):
+    """
+    Provide a BLAST database of the subject, building it only if needed.
+
+    When `cache_dir` is set, databases are stored by the SHA256 of the subject
+    so that multiple frameworks run against the same sample reuse it. Otherwise
+    a temporary database is built and removed on exit.
+
+    Args:
+        subject (str): The subject (input) to build a database from
+        cache_dir (str, optional): A directory to cache databases in. Defaults to None.
+        max_entries (int, optional): The maximum number of cached databases. Defaults to 100.
+
+    Yields:
+        list: The path to the database and seconds spent building it (0 if cached)
+
+    Examples:
+        >>> from camlhmp.engines.blast import subject_blastdb
+        >>> with subject_blastdb(input_path, cache_dir="./blastdb-cache") as (db, build_time):
+                hits, blast_stdout, blast_stderr = run_blast(
+                    "blastn", input_path, targets_path, min_pident, min_coverage, db=db
+                )
+    """
+    if not cache_dir:
+        with tempfile.TemporaryDirectory(prefix="camlhmp-blastdb-", dir=get_tmpdir()) as tmpdir:
+            start = time.perf_counter()
+            db = make_blastdb(subject, tmpdir)
+            yield [db, time.perf_counter() - start]
+        return
+
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    entry = Path(cache_dir) / get_subject_key(subject)
+    build_time = 0
+    # The entry is locked before it is checked, so it cannot be evicted until the search is done
+    with lock_blastdb_entry(entry):
+        if entry.exists():
+            logging.debug(f"Using cached BLAST database: {entry}")
+        else:
+            # Build in a staging directory, then move into place so concurrent runs never
+            # see a partial database
+            start = time.perf_counter()
+            staging = tempfile.mkdtemp(prefix=".staging-", dir=cache_dir)
+            try:
+                make_blastdb(subject, staging)
+            except BaseException:
+                # Eviction skips hidden directories, do not leave a failed build behind
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # Another process finished first, use theirs
+                shutil.rmtree(staging, ignore_errors=True)
+            build_time = time.perf_counter() - start
+            logging.debug(f"Built BLAST database {entry} in {build_time:.2f}s")
+
+        # Mark the entry as recently used, then evict any stale entries
+        os.utime(entry)
+        evict_blastdb_cache(cache_dir, max_entries)
+        yield [f"{entry}/subject", build_time]
+
+
 def run_blastn(subject: str, query: str, min_pident: float, min_coverage: int) -> list:
     """
     An alias for `run_blast` which uses `blastn`
@@ -109,3 +631,108 @@ def run_tblastn(subject: str, query: str, min_pident: float, min_coverage: int)
             )
     """
     return run_blast("tblastn", subject, query, min_pident, min_coverage)
+
+
+def stream_blast(
+    engine: str,
+    subject: str,
+    query: str,
+    min_pident: float,
+    min_coverage: int,
+    db: str = None,
+    tasks: dict = None,
+    options: dict = None,
+):
+    """
+    Query sequences against a subject with BLAST+, yielding hits as they are written.
+
+    Args:
+        engine (str): The BLAST engine to use
+        subject (str|bytes): The subject (input) file, or sequences in FASTA format
+        query (str|bytes): The query (targets) file, or sequences in FASTA format
+        min_pident (float): The minimum percent identity to count a hit
+        min_coverage (int): The minimum percent coverage to count a hit
+        db (str, optional): A BLAST database of the subject to search instead. Defaults to None.
+        tasks (dict, optional): The blastn task of each target (e.g. from `get_blastn_tasks`).
+            Defaults to None.
+        options (dict, optional): Other parameters to pass to BLAST+ (e.g. from
+            `validate_blast_params`). Defaults to None.
+
+    Yields:
+        dict: a BLAST hit with the columns of `BLASTN_COLS`
+
+    Raises:
+        CommandError: if BLAST+ fails
+
+    Examples:
+        >>> from camlhmp.engines.blast import stream_blast
+        >>> for hit in stream_blast("blastn", input_path, targets_path, min_pident, min_coverage):
+                print(hit["qseqid"])
+    """
+    for task, group in split_query_by_task(query, tasks):
+        with blast_inputs(None if db else subject, group) as (subject_arg, query_arg, stdin, pass_fds):
+            cmd = get_blast_cmd(
+                engine, subject_arg, query_arg, min_pident, min_coverage, db=db, task=task, options=options
+            )
+            logging.debug(f"Streaming hits from: {cmd}")
+            with subprocess.Popen(
+                ["bash", "-o", "pipefail", "-c", cmd],
+                stdin=subprocess.DEVNULL if stdin is None else stdin,
+                stdout=subprocess.PIPE,
+                text=True,
+                pass_fds=pass_fds,
+            ) as process:
+                for line in process.stdout:
+                    line = line.rstrip("\n")
+                    if line:
+                        yield dict(zip(BLASTN_COLS, line.split("\t")))
+        if process.returncode:
+            raise CommandError(process.returncode, cmd)
+
+
+class BlastEngine(Engine):
+    """
+    Search targets against an input using BLAST+.
+    """
+
+    name = "blast"
+    tools = ["blastn", "tblastn", "blastp"]
+    presets = BLAST_PRESETS
+
+    def validate_params(self, tool: str, params: dict) -> dict:
+        """Validate the parameters passed through to BLAST+, see `validate_blast_params`"""
+        return validate_blast_params(tool, params)
+
+    def prepare_index(self, subject: str, cache_dir: str = None, max_entries: int = 100):
+        """Build (or reuse) a BLAST database of the subject, see `subject_blastdb`"""
+        return subject_blastdb(subject, cache_dir=cache_dir, max_entries=max_entries)
+
+    def stream_hits(
+        self,
+        tool: str,
+        subject: str,
+        query: str,
+        min_pident: float,
+        min_coverage: int,
+        index: str = None,
+        params: dict = None,
+    ):
+        """Yield BLAST+ hits as they are written, see `stream_blast` (params: `tasks` and BLAST+ options)"""
+        params = dict(params or {})
+        tasks = params.pop("tasks", None)
+        yield from stream_blast(tool, subject, query, min_pident, min_coverage, db=index, tasks=tasks, options=params)
+
+    def search(
+        self,
+        tool: str,
+        subject: str,
+        query: str,
+        min_pident: float,
+        min_coverage: int,
+        index: str = None,
+        params: dict = None,
+    ) -> list:
+        """Run BLAST+ and collect all hits, see `run_blast` (params: `tasks` and BLAST+ options)"""
+        params = dict(params or {})
+        tasks = params.pop("tasks", None)
+        return run_blast(tool, subject, query, min_pident, min_coverage, db=index, tasks=tasks, options=params)
@@ -0,0 +1,565 @@
+# A native k-mer (minimizer) search engine that does not require BLAST+
+import logging
+import math
+
+import numpy as np
+
+from camlhmp.engines import Engine
+from camlhmp.engines.blast import BLASTN_COLS
+from camlhmp.utils import read_fasta
+
+# Seeding parameters (odd k-mers avoid reverse complement palindromes)
+KMER_SIZE = 15
+WINDOW_SIZE = 10
+
+# k-mers hashed (and windows searched for minimizers) at a time, so the arrays fit in cache
+CHUNK_SIZE = 1 << 16
+
+# Chaining and alignment parameters
+BAND = 16
+MAX_GAP = 250
+XDROP = 20
+
+# Scoring matches the blastn (megablast) defaults: reward 1, penalty -2, linear gaps of 2.5
+MATCH = 1
+MISMATCH = -2
+GAP = -2.5
+LAMBDA = 1.28
+KAPPA = 0.46
+
+INVALID_HASH = np.iinfo(np.uint64).max
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+ENCODE = np.full(256, 4, dtype=np.uint8)
+for i, base in enumerate("ACGT"):
+    ENCODE[ord(base)] = i
+    ENCODE[ord(base.lower())] = i
+COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCANtgcan")
+
+
+def reverse_complement(seq: str) -> str:
+    """
+    Reverse complement a nucleotide sequence.
+
+    Args:
+        seq (str): The sequence to reverse complement
+
+    Returns:
+        str: The reverse complement of the sequence
+    """
+    return seq.translate(COMPLEMENT)[::-1]
+
+
+def _pack_kmers(bases: np.ndarray, k: int, total: int) -> np.ndarray:
+    """Pack the k-mer starting at each of the first `total` positions into 2 bits per base"""
+    # Pack 2, 4, 8... -mers by doubling, then join the sizes that add up to k
+    packed = {1: bases}
+    size = 1
+    while size * 2 <= k:
+        shorter = packed[size]
+        count = len(shorter) - size
+        packed[size * 2] = (shorter[:count] << np.uint64(2 * size)) | shorter[size : size + count]
+        size *= 2
+
+    kmers = np.zeros(total, dtype=np.uint64)
+    offset = 0
+    for size in sorted(packed, reverse=True):
+        if k - offset >= size:
+            kmers <<= np.uint64(2 * size)
+            kmers |= packed[size][offset : offset + total]
+            offset += size
+    return kmers
+
+
+def kmer_hashes(seq: str, k: int = KMER_SIZE) -> list:
+    """
+    Hash each canonical k-mer in a sequence.
+
+    The sequence is hashed `CHUNK_SIZE` k-mers at a time.
+
+    Args:
+        seq (str): The sequence to hash
+        k (int, optional): The k-mer size (must be odd and <= 31). Defaults to KMER_SIZE.
+
+    Returns:
+        list: the hash of each k-mer (INVALID_HASH if it contains a non-ACGT base) and
+            whether the forward strand is the canonical k-mer
+    """
+    codes = ENCODE[np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)]
+    total = len(codes) - k + 1
+    if total <= 0:
+        return [np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=bool)]
+
+    # Any k-mer containing a non-ACGT base is invalid
+    invalid = np.concatenate([[0], np.cumsum(codes == 4)])
+    invalid = (invalid[k:] - invalid[:-k]) > 0
+
+    hashes = np.empty(total, dtype=np.uint64)
+    canonical = np.empty(total, dtype=bool)
+    for start in range(0, total, CHUNK_SIZE):
+        stop = min(total, start + CHUNK_SIZE)
+        bases = (codes[start : stop + k - 1] & 3).astype(np.uint64)
+        forward = _pack_kmers(bases, k, stop - start)
+        # The reverse complement of each k-mer, packed along the other strand
+        reverse = _pack_kmers((np.uint64(3) - bases)[::-1], k, stop - start)[::-1]
+        np.minimum(forward, reverse, out=hashes[start:stop])
+        canonical[start:stop] = forward <= reverse
+
+    # A multiplicative hash is a bijection, so equal hashes are equal k-mers
+    hashes *= HASH_MULTIPLIER
+    hashes[invalid] = INVALID_HASH
+    return [hashes, canonical]
+
+
+def _sliding_min(values: np.ndarray, w: int) -> np.ndarray:
+    """The smallest of each `w` consecutive values"""
+    # Minimums of 2, 4, 8... values by doubling, then join the sizes that add up to w
+    smallest = {1: values}
+    size = 1
+    while size * 2 <= w:
+        shorter = smallest[size]
+        smallest[size * 2] = np.minimum(shorter[:-size], shorter[size:])
+        size *= 2
+
+    total = len(values) - w + 1
+    window_min = None
+    offset = 0
+    for size in sorted(smallest, reverse=True):
+        if w - offset >= size:
+            part = smallest[size][offset : offset + total]
+            window_min = part.copy() if window_min is None else np.minimum(window_min, part, out=window_min)
+            offset += size
+    return window_min
+
+
+def get_minimizers(hashes: np.ndarray, w: int = WINDOW_SIZE) -> np.ndarray:
+    """
+    Find the positions of the (w, k)-minimizers of a sequence.
+
+    Windows are searched `CHUNK_SIZE` at a time, ties are broken by the leftmost k-mer.
+
+    Args:
+        hashes (np.ndarray): The k-mer hashes from `kmer_hashes`
+        w (int, optional): The number of consecutive k-mers in a window. Defaults to WINDOW_SIZE.
+
+    Returns:
+        np.ndarray: The sorted positions of the minimizers
+    """
+    if not len(hashes):
+        return np.zeros(0, dtype=np.int64)
+    elif len(hashes) < w:
+        positions = np.array([np.argmin(hashes)])
+    else:
+        total = len(hashes) - w + 1
+        positions = np.empty(total, dtype=np.int64)
+        for start in range(0, total, CHUNK_SIZE):
+            stop = min(total, start + CHUNK_SIZE)
+            windows = hashes[start : stop + w - 1]
+            window_min = _sliding_min(windows, w)
+            # Walk back from the end of each window, so the leftmost minimum is kept
+            offsets = np.full(stop - start, w - 1, dtype=np.int64)
+            for offset in range(w - 2, -1, -1):
+                offsets[windows[offset : offset + stop - start] == window_min] = offset
+            positions[start:stop] = offsets + np.arange(start, stop)
+        # Positions are non-decreasing, so only consecutive duplicates need removing
+        positions = positions[np.concatenate([[True], positions[1:] != positions[:-1]])]
+    return positions[hashes[positions] != INVALID_HASH]
+
+
+def build_target_index(query: str) -> dict:
+    """
+    Build a minimizer index of the target sequences.
+
+    Args:
+        query (str): The query file (targets) in FASTA format
+
+    Returns:
+        dict: the target IDs, sequences, the minimizer index {hash: [(target, pos, forward)]},
+            and a sorted array of the indexed hashes
+
+    Examples:
+        >>> from camlhmp.engines.kmer import build_target_index
+        >>> index = build_target_index(targets_path)
+    """
+    ids = []
+    seqs = []
+    minimizers = {}
+    for name, seq in read_fasta(query, uppercase=True):
+        target = len(ids)
+        ids.append(name)
+        seqs.append(seq)
+        hashes, forward = kmer_hashes(seq)
+        for pos in get_minimizers(hashes):
+            minimizers.setdefault(int(hashes[pos]), []).append((target, int(pos), bool(forward[pos])))
+    logging.debug(f"Indexed {len(minimizers)} minimizers from {len(ids)} targets")
+
+    return {
+        "ids": ids,
+        "seqs": seqs,
+        "minimizers": minimizers,
+        "hashes": np.array(sorted(minimizers), dtype=np.uint64),
+    }
+
+
+def chain_anchors(anchors: list) -> list:
+    """
+    Greedily chain colinear anchors into candidate alignments.
+
+    Args:
+        anchors (list): exact k-mer matches as (target position, subject position)
+
+    Returns:
+        list: the chains, each a list of anchors
+    """
+    chains = []
+    active = []
+    for tpos, spos in sorted(anchors, key=lambda x: (x[1], x[0])):
+        best = None
+        best_diff = None
+        still_active = []
+        for chain in active:
+            last_tpos, last_spos = chain[-1]
+            if spos - last_spos > MAX_GAP:
+                # Nothing downstream can extend this chain
+                chains.append(chain)
+                continue
+            still_active.append(chain)
+            tdist = tpos - last_tpos
+            sdist = spos - last_spos
+            if tdist <= 0 or sdist <= 0 or tdist > MAX_GAP:
+                continue
+            diff = abs(tdist - sdist)
+            if diff <= BAND and (best_diff is None or diff < best_diff):
+                best = chain
+                best_diff = diff
+        active = still_active
+        if best is not None:
+            best.append((tpos, spos))
+        else:
+            active.append([(tpos, spos)])
+    return chains + active
+
+
+def banded_align(target: str, subject: str, extend: bool = False) -> list:
+    """
+    Align two sequences with a banded dynamic programming alignment.
+
+    Each row is filled in three passes (target gaps, then matches, then subject gaps along
+    the row). Bands are at most a few dozen cells wide, too narrow for NumPy calls to be
+    faster than plain loops.
+
+    Args:
+        target (str): The target (query) sequence
+        subject (str): The subject sequence
+        extend (bool, optional): Only align the best scoring prefix (X-drop extension),
+            otherwise align both sequences end to end. Defaults to False.
+
+    Returns:
+        list: the alignment operations ('M' match, 'X' mismatch, 'D' target gap, 'I' subject
+            gap), and the number of target and subject bases aligned
+    """
+    n = len(target)
+    m = len(subject)
+    if not extend:
+        if not n:
+            return ["I" * m, 0, m]
+        elif not m:
+            return ["D" * n, n, 0]
+    elif not n or not m:
+        return ["", 0, 0]
+
+    band = BAND if extend else BAND + abs(n - m)
+    rows = []
+    best = [0, 0, 0]
+    prev = None
+    prev_lo = prev_hi = 0
+    for i in range(n + 1):
+        center = i if extend else round(i * m / n)
+        lo = max(0, center - band)
+        hi = min(m, center + band)
+        if lo > hi:
+            break
+        width = hi - lo + 1
+        scores = [-math.inf] * width
+        trace = [0] * width
+        if i:
+            base = target[i - 1]
+            # Target gaps, from the cell above
+            for j in range(max(lo, prev_lo), min(hi, prev_hi) + 1):
+                scores[j - lo] = prev[j - prev_lo] + GAP
+                trace[j - lo] = 2
+            # Matches and mismatches, from the cell above and to the left (preferred on ties)
+            for j in range(max(lo, prev_lo + 1, 1), min(hi, prev_hi + 1) + 1):
+                value = prev[j - 1 - prev_lo] + (MATCH if base == subject[j - 1] else MISMATCH)
+                if value >= scores[j - lo]:
+                    scores[j - lo] = value
+                    trace[j - lo] = 1
+        else:
+            scores[0] = 0
+
+        # Subject gaps, from the cell to the left
+        left = scores[0]
+        for x in range(1, width):
+            left += GAP
+            if left > scores[x]:
+                scores[x] = left
+                trace[x] = 3
+            else:
+                left = scores[x]
+        rows.append([lo, trace])
+
+        if extend:
+            row_best = max(scores)
+            if row_best > best[0]:
+                best = [row_best, i, lo + scores.index(row_best)]
+            elif row_best < best[0] - XDROP:
+                break
+        prev = scores
+        prev_lo, prev_hi = lo, hi
+
+    i, j = (best[1], best[2]) if extend else (n, m)
+    end_i, end_j = i, j
+    ops = []
+    while i > 0 or j > 0:
+        lo, trace = rows[i]
+        move = trace[j - lo]
+        if move == 1:
+            ops.append("M" if target[i - 1] == subject[j - 1] else "X")
+            i -= 1
+            j -= 1
+        elif move == 2:
+            ops.append("D")
+            i -= 1
+        elif move == 3:
+            ops.append("I")
+            j -= 1
+        else:
+            break
+    return ["".join(reversed(ops)), end_i, end_j]
+
+
+def align_chain(chain: list, target: str, subject: str, k: int = KMER_SIZE) -> dict:
+    """
+    Turn a chain of anchors into a gapped alignment, extending out from both ends.
+
+    Args:
+        chain (list): the anchors (target position, subject position) in the chain
+        target (str): the target sequence
+        subject (str): the subject sequence (same strand as the target)
+        k (int, optional): The k-mer size of the anchors. Defaults to KMER_SIZE.
+
+    Returns:
+        dict: the alignment operations and its 0-based start/end on the target and subject
+    """
+    # Merge anchors into exact matching blocks [tstart, sstart, length]
+    blocks = []
+    for tpos, spos in chain:
+        if blocks:
+            last = blocks[-1]
+            if tpos - spos == last[0] - last[1] and tpos <= last[0] + last[2]:
+                last[2] = max(last[2], tpos + k - last[0])
+                continue
+            # Trim any overlap with the previous block
+            overlap = max(last[0] + last[2] - tpos, last[1] + last[2] - spos, 0)
+            if overlap >= k:
+                continue
+            blocks.append([tpos + overlap, spos + overlap, k - overlap])
+        else:
+            blocks.append([tpos, spos, k])
+
+    # Fill the gaps between blocks
+    ops = ["M" * blocks[0][2]]
+    for last, block in zip(blocks, blocks[1:]):
+        gap_ops, _, _ = banded_align(
+            target[last[0] + last[2] : block[0]], subject[last[1] + last[2] : block[1]]
+        )
+        ops.append(gap_ops)
+        ops.append("M" * block[2])
+
+    # Extend left (reversed) and right of the blocks
+    tstart, sstart = blocks[0][0], blocks[0][1]
+    left_ops, left_t, left_s = banded_align(
+        target[:tstart][::-1], subject[max(0, sstart - tstart - BAND) : sstart][::-1], extend=True
+    )
+    tend, send = blocks[-1][0] + blocks[-1][2], blocks[-1][1] + blocks[-1][2]
+    right_ops, right_t, right_s = banded_align(
+        target[tend:], subject[send : send + len(target) - tend + BAND], extend=True
+    )
+
+    return {
+        "ops": left_ops[::-1] + "".join(ops) + right_ops,
+        "tstart": tstart - left_t,
+        "tend": tend + right_t,
+        "sstart": sstart - left_s,
+        "send": send + right_s,
+    }
+
+
+def _alignment_to_hit(qseqid: str, qlen: int, sseqid: str, slen: int, strand: str, alignment: dict) -> dict:
+    """Summarize an alignment with the columns of BLASTN_COLS (qcovs is set later)"""
+    ops = alignment["ops"]
+    nident = ops.count("M")
+    mismatch = ops.count("X")
+    gaps = ops.count("D") + ops.count("I")
+    gapopen = sum(
+        1 for i, op in enumerate(ops) if op in "DI" and (i == 0 or ops[i - 1] != op)
+    )
+    score = nident * MATCH + mismatch * MISMATCH + gaps * GAP
+    bitscore = (LAMBDA * score - math.log(KAPPA)) / math.log(2)
+    evalue = KAPPA * qlen * slen * math.exp(-LAMBDA * score)
+    if strand == "+":
+        sstart, send = alignment["sstart"] + 1, alignment["send"]
+    else:
+        # Alignment was against the reverse complement, report forward coordinates
+        sstart, send = slen - alignment["sstart"], slen - alignment["send"] + 1
+
+    return {
+        "qseqid": qseqid,
+        "sseqid": sseqid,
+        "pident": f"{100 * nident / len(ops):.3f}",
+        "qcovs": "0",
+        "qlen": str(qlen),
+        "slen": str(slen),
+        "length": str(len(ops)),
+        "nident": str(nident),
+        "mismatch": str(mismatch),
+        "gapopen": str(gapopen),
+        "qstart": str(alignment["tstart"] + 1),
+        "qend": str(alignment["tend"]),
+        "sstart": str(sstart),
+        "send": str(send),
+        "evalue": "0.0" if evalue < 1e-180 else f"{evalue:.2e}",
+        "bitscore": f"{bitscore:.0f}" if bitscore >= 100 else f"{bitscore:.1f}",
+        "score": score,
+    }
+
+
+def _remove_redundant(hits: list) -> list:
+    """Keep the best scoring of hits that share most of their query and subject range"""
+    kept = []
+    for hit in sorted(hits, key=lambda x: x["score"], reverse=True):
+        qstart, qend = int(hit["qstart"]), int(hit["qend"])
+        sstart, send = sorted([int(hit["sstart"]), int(hit["send"])])
+        redundant = False
+        for other in kept:
+            other_sstart, other_send = sorted([int(other["sstart"]), int(other["send"])])
+            q_overlap = min(qend, int(other["qend"])) - max(qstart, int(other["qstart"])) + 1
+            s_overlap = min(send, other_send) - max(sstart, other_sstart) + 1
+            if q_overlap > 0.5 * (qend - qstart + 1) and s_overlap > 0.5 * (send - sstart + 1):
+                redundant = True
+                break
+        if not redundant:
+            kept.append(hit)
+    return kept
+
+
+def search_kmers(subject: str, target_index: dict, min_pident: float, min_coverage: int):
+    """
+    Search indexed targets against each sequence of the subject.
+
+    Args:
+        subject (str): The subject (input) in FASTA format, optionally gzipped
+        target_index (dict): The target index from `build_target_index`
+        min_pident (float): The minimum percent identity to count a hit
+        min_coverage (int): The minimum percent coverage (per HSP) to count a hit
+
+    Yields:
+        dict: a hit with the columns of `BLASTN_COLS`
+
+    Examples:
+        >>> from camlhmp.engines.kmer import build_target_index, search_kmers
+        >>> for hit in search_kmers(input_path, build_target_index(targets_path), 95, 95):
+                print(hit["qseqid"])
+    """
+    ids = target_index["ids"]
+    seqs = target_index["seqs"]
+    for sseqid, seq in read_fasta(subject, uppercase=True):
+        slen = len(seq)
+        hashes, forward = kmer_hashes(seq)
+        positions = get_minimizers(hashes)
+        positions = positions[np.isin(hashes[positions], target_index["hashes"])]
+
+        # Collect anchors for each target and strand, minus strand anchors use
+        # coordinates on the reverse complement of the subject
+        anchors = {}
+        for pos in positions:
+            for target, tpos, tforward in target_index["minimizers"][int(hashes[pos])]:
+                if tforward == bool(forward[pos]):
+                    anchors.setdefault((target, "+"), []).append((tpos, int(pos)))
+                else:
+                    anchors.setdefault((target, "-"), []).append((tpos, slen - int(pos) - KMER_SIZE))
+
+        strands = {"+": seq}
+        hits = {}
+        for (target, strand), target_anchors in sorted(anchors.items()):
+            if strand not in strands:
+                strands[strand] = reverse_complement(seq)
+            qlen = len(seqs[target])
+            for chain in chain_anchors(target_anchors):
+                # Single anchors are only trusted for short targets
+                if len(chain) < 2 and qlen > 2 * KMER_SIZE + WINDOW_SIZE:
+                    continue
+                alignment = align_chain(chain, seqs[target], strands[strand])
+                hit = _alignment_to_hit(ids[target], qlen, sseqid, slen, strand, alignment)
+                hsp_coverage = 100 * (alignment["tend"] - alignment["tstart"]) / qlen
+                if float(hit["pident"]) >= min_pident and hsp_coverage >= min_coverage:
+                    hits.setdefault(target, []).append(hit)
+
+        for target, target_hits in hits.items():
+            target_hits = _remove_redundant(target_hits)
+
+            # qcovs is the query coverage of all HSPs against this subject
+            covered = set()
+            for hit in target_hits:
+                covered.update(range(int(hit["qstart"]), int(hit["qend"]) + 1))
+            qcovs = str(round(100 * len(covered) / len(seqs[target])))
+            for hit in sorted(target_hits, key=lambda x: x["score"], reverse=True):
+                hit["qcovs"] = qcovs
+                yield {col: hit[col] for col in BLASTN_COLS}
+
+
+class KmerEngine(Engine):
+    """
+    Search targets against an input using minimizer seeds and banded alignment.
+
+    This engine requires no external binaries and is intended for nucleotide targets with
+    near-identical hits. Its output uses the same columns as BLAST+ (`BLASTN_COLS`).
+    """
+
+    name = "kmer"
+    tools = ["blastn"]
+
+    def __init__(self):
+        self.target_indexes = {}
+
+    def get_target_index(self, query: str) -> dict:
+        """Build (or reuse) the minimizer index of the targets, see `build_target_index`"""
+        query = str(query)
+        if query not in self.target_indexes:
+            self.target_indexes[query] = build_target_index(query)
+        return self.target_indexes[query]
+
+    def stream_hits(
+        self,
+        tool: str,
+        subject: str,
+        query: str,
+        min_pident: float,
+        min_coverage: int,
+        index: str = None,
+        params: dict = None,
+    ):
+        """Yield hits for each sequence in the subject, see `search_kmers` (params are not used)"""
+        yield from search_kmers(subject, self.get_target_index(query), min_pident, min_coverage)
+
+    def search(
+        self,
+        tool: str,
+        subject: str,
+        query: str,
+        min_pident: float,
+        min_coverage: int,
+        index: str = None,
+        params: dict = None,
+    ) -> list:
+        """Collect all hits of `stream_hits` (params are not used)"""
+        return super().search(tool, subject, query, min_pident, min_coverage, index=index, params=params)
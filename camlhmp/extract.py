@@ -0,0 +1,225 @@
+"""
+A set of functions for extracting typing targets from reference sequences.
+"""
+import logging
+import mmap
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from camlhmp.faidx import fetch_seq, get_fasta_index
+from camlhmp.utils import is_compressed, parse_seq, read_fasta, validate_file
+
+EXTRACT_FORMATS = ["fasta", "genbank"]
+
+# Most target FASTA files kept open at once while streaming, to stay below the open file limit
+MAX_OPEN_FASTAS = 128
+
+
+def group_targets(targets: list, reference_path: str) -> dict:
+    """
+    Group the coordinates of each target by the reference file they are extracted from.
+
+    Args:
+        targets (list): The rows of a targets TSV (file, format, target, start, stop, strand, ...)
+        reference_path (str): The path where the reference files are located
+
+    Returns:
+        dict: for each file, its path, format and the [row, start, stop, strand] to extract
+
+    Raises:
+        FileNotFoundError: if a reference file does not exist
+        ValueError: if a reference file has an unknown format
+
+    Examples:
+        >>> from camlhmp.extract import group_targets
+        >>> references = group_targets(parse_table(targets_path), reference_path)
+    """
+    references = {}
+    for i, target in enumerate(targets):
+        if target["file"] not in references:
+            if target["format"] not in EXTRACT_FORMATS:
+                raise ValueError(f"Unknown format: {target['format']}")
+            references[target["file"]] = {
+                "file": str(validate_file(f"{reference_path}/{target['file']}")),
+                "format": target["format"],
+                "coords": [],
+            }
+            logging.debug(f"Found file: {references[target['file']]['file']}")
+        references[target["file"]]["coords"].append(
+            [i, int(target["start"]), int(target["stop"]), target["strand"]]
+        )
+    return references
+
+
+def extract_from_reference(file: str, format: str, coords: list) -> list:
+    """
+    Extract a set of slices from a single-record reference.
+
+    Uncompressed FASTA files are read through their index, so only the requested slices
+    are loaded. Compressed FASTA files are streamed and GenBank files are parsed.
+
+    Args:
+        file (str): The reference file
+        format (str): The format of the reference ('fasta' or 'genbank')
+        coords (list): The [row, start, stop, strand] of each slice, 1-based and inclusive
+
+    Returns:
+        list: the row and extracted sequence of each slice
+
+    Raises:
+        ValueError: if the reference does not contain exactly one record
+
+    Examples:
+        >>> from camlhmp.extract import extract_from_reference
+        >>> seqs = extract_from_reference("NC_002745.fasta", "fasta", [[0, 100, 2000, "+"]])
+    """
+    # Bio.Seq handles IUPAC ambiguity codes, only import it when extracting
+    from Bio.Seq import reverse_complement
+
+    extracted = []
+    if format == "fasta" and not is_compressed(file):
+        index = get_fasta_index(file)
+        if len(index) != 1:
+            raise ValueError(f"Expected a single record in {file}, found {len(index)}")
+        with open(file, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for row, start, stop, strand in coords:
+                seq = fetch_seq(mm, index[0], start - 1, stop)
+                extracted.append([row, reverse_complement(seq) if strand == "-" else seq])
+        return extracted
+
+    if format == "fasta":
+        records = [seq for _, seq in read_fasta(file)]
+        if len(records) != 1:
+            raise ValueError(f"Expected a single record in {file}, found {len(records)}")
+        seq = records[0]
+    else:
+        seq = str(parse_seq(file, format).seq)
+
+    for row, start, stop, strand in coords:
+        target = seq[start - 1 : stop]
+        extracted.append([row, reverse_complement(target) if strand == "-" else target])
+    return extracted
+
+
+def extract_targets(targets: list, reference_path: str, cpus: int = 1) -> dict:
+    """
+    Extract every target in a targets TSV, processing reference files in parallel.
+
+    Args:
+        targets (list): The rows of a targets TSV
+        reference_path (str): The path where the reference files are located
+        cpus (int, optional): The number of reference files to process at once. Defaults to 1.
+
+    Returns:
+        dict: for each target, the accession, type and sequence of each extracted copy (in
+            the order of the targets TSV)
+
+    Examples:
+        >>> from camlhmp.extract import extract_targets
+        >>> sequences = extract_targets(parse_table(targets_path), reference_path, cpus=4)
+    """
+    references = group_targets(targets, reference_path)
+    jobs = [[vals["file"], vals["format"], vals["coords"]] for vals in references.values()]
+
+    extracted = {}
+    if cpus > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(cpus, len(jobs))) as executor:
+            for results in executor.map(extract_from_reference, *zip(*jobs)):
+                extracted.update(results)
+    else:
+        for job in jobs:
+            logging.debug(f"Extracting {len(job[2])} targets from {job[0]}")
+            extracted.update(extract_from_reference(*job))
+
+    sequences = {}
+    for i, target in enumerate(targets):
+        sequences.setdefault(target["target"], []).append(
+            {
+                "accession": target["accession"],
+                "type": target["type"],
+                "seq": extracted[i],
+            }
+        )
+    return sequences
+
+
+def write_targets(sequences: dict, outdir: str) -> list:
+    """
+    Write the extracted sequences, giving each target its own FASTA file.
+
+    Args:
+        sequences (dict): The extracted sequences from `extract_targets`
+        outdir (str): The directory to write the FASTA files to
+
+    Returns:
+        list: the FASTA files that were written
+
+    Examples:
+        >>> from camlhmp.extract import write_targets
+        >>> fastas = write_targets(sequences, "./camlhmp-extract")
+    """
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    fastas = []
+    for target, seqs in sequences.items():
+        logging.debug(f"Writing {target} to {outdir}/{target}.fasta")
+        with open(f"{outdir}/{target}.fasta", "w") as fh:
+            fh.write("".join(f">{target} {seq['accession']}|{seq['type']}\n{seq['seq']}\n" for seq in seqs))
+        fastas.append(f"{outdir}/{target}.fasta")
+    return fastas
+
+
+def stream_targets(targets: list, reference_path: str, outdir: str, max_open: int = MAX_OPEN_FASTAS) -> list:
+    """
+    Extract every target in a targets TSV, one reference at a time.
+
+    References are processed in order of their file name and each extracted sequence is
+    written as soon as it is available, so only a single reference is held in memory at
+    a time. Within each target's FASTA, sequences are ordered by reference file, then by
+    their order in the targets TSV. The least recently written FASTA files are closed
+    when more than `max_open` are open, and reopened for appending when needed.
+
+    Args:
+        targets (list): The rows of a targets TSV
+        reference_path (str): The path where the reference files are located
+        outdir (str): The directory to write the FASTA files to
+        max_open (int, optional): The most FASTA files to keep open at once. Defaults
+            to `MAX_OPEN_FASTAS`.
+
+    Returns:
+        list: the FASTA files that were written
+
+    Examples:
+        >>> from camlhmp.extract import stream_targets
+        >>> fastas = stream_targets(parse_table(targets_path), reference_path, "./camlhmp-extract")
+    """
+    references = group_targets(targets, reference_path)
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+
+    fastas = []
+    handles = OrderedDict()
+    try:
+        for name in sorted(references):
+            vals = references[name]
+            logging.debug(f"Extracting {len(vals['coords'])} targets from {vals['file']}")
+            for row, seq in extract_from_reference(vals["file"], vals["format"], vals["coords"]):
+                target = targets[row]
+                if target["target"] in handles:
+                    handles.move_to_end(target["target"])
+                else:
+                    if len(handles) >= max_open:
+                        handles.popitem(last=False)[1].close()
+                    if target["target"] in fastas:
+                        mode = "a"
+                    else:
+                        logging.debug(f"Writing {target['target']} to {outdir}/{target['target']}.fasta")
+                        fastas.append(target["target"])
+                        mode = "w"
+                    handles[target["target"]] = open(f"{outdir}/{target['target']}.fasta", mode)
+                handles[target["target"]].write(
+                    f">{target['target']} {target['accession']}|{target['type']}\n{seq}\n"
+                )
+    finally:
+        for fh in handles.values():
+            fh.close()
+    return [f"{outdir}/{target}.fasta" for target in fastas]
@@ -0,0 +1,274 @@
+"""
+A set of functions for indexing FASTA files, in the format of `samtools faidx`.
+
+Indexes are saved in a camlhmp cache rather than next to the FASTA file, so read-only
+directories are supported and tools expecting a `samtools` index never read one that marks
+records with irregular line lengths (`linebases` of 0).
+"""
+import gzip
+import hashlib
+import logging
+import mmap
+import os
+from pathlib import Path
+
+FAI_COLS = ["name", "length", "offset", "linebases", "linewidth"]
+
+# Saved indexes are kept in $CAML_CACHE_DIR, or the user's cache directory
+CACHE_ENV = "CAML_CACHE_DIR"
+
+
+def build_fasta_index(fasta: str) -> list:
+    """
+    Build a faidx-style index of a FASTA file in a single pass.
+
+    Records whose lines (other than the last) differ in length can not be randomly
+    accessed, they are still indexed with their length but `linebases` and `linewidth`
+    are set to 0.
+
+    Args:
+        fasta (str): The FASTA file to index, optionally gzipped
+
+    Returns:
+        list: a dict for each record with the columns in `FAI_COLS`
+
+    Examples:
+        >>> from camlhmp.faidx import build_fasta_index
+        >>> index = build_fasta_index("targets.fasta")
+    """
+    index = []
+    entry = None
+    last_line = False
+    offset = 0
+    with gzip.open(fasta, "rb") if str(fasta).endswith(".gz") else open(fasta, "rb") as fh:
+        for line in fh:
+            line_length = len(line)
+            if line.startswith(b">"):
+                entry = {
+                    "name": line[1:].split(maxsplit=1)[0].decode() if line[1:].strip() else "",
+                    "length": 0,
+                    "offset": offset + line_length,
+                    "linebases": None,
+                    "linewidth": None,
+                }
+                index.append(entry)
+                last_line = False
+            elif entry is not None:
+                bases = len(line.rstrip(b"\r\n"))
+                entry["length"] += bases
+                if entry["linebases"] is None:
+                    entry["linebases"] = bases
+                    entry["linewidth"] = line_length
+                    last_line = bases == 0
+                elif entry["linebases"]:
+                    if bases and (last_line or line_length > entry["linewidth"]):
+                        # Bases after a short line, or a longer line, can not be located
+                        entry["linebases"] = entry["linewidth"] = 0
+                    elif line_length != entry["linewidth"]:
+                        last_line = True
+            offset += line_length
+
+    for entry in index:
+        if entry["linebases"] is None:
+            entry["linebases"] = entry["linewidth"] = 0
+    return index
+
+
+def write_fasta_index(index: list, output: str):
+    """
+    Write a faidx-style index to a file.
+
+    Args:
+        index (list): The index from `build_fasta_index`
+        output (str): The output file (e.g. from `get_index_path`)
+    """
+    with open(output, "wt") as fh:
+        for entry in index:
+            fh.write("\t".join(str(entry[col]) for col in FAI_COLS) + "\n")
+
+
+def read_fasta_index(fai: str) -> list:
+    """
+    Read a faidx-style index from a file.
+
+    Args:
+        fai (str): The index file (e.g. from `get_index_path`)
+
+    Returns:
+        list: a dict for each record with the columns in `FAI_COLS`
+    """
+    index = []
+    with open(fai, "rt") as fh:
+        for line in fh:
+            cols = line.rstrip("\n").split("\t")
+            index.append(dict(zip(FAI_COLS, [cols[0]] + [int(col) for col in cols[1:5]])))
+    return index
+
+
+def get_index_path(fasta: str) -> Path:
+    """
+    Get where the index of a FASTA file is saved.
+
+    Indexes are named by the path, size and modification time of the FASTA file, so an
+    index is never reused for a FASTA file that has changed.
+
+    Args:
+        fasta (str): The FASTA file
+
+    Returns:
+        Path: the index file, in `$CAML_CACHE_DIR/faidx` (default `~/.cache/camlhmp/faidx`)
+
+    Examples:
+        >>> from camlhmp.faidx import get_index_path
+        >>> fai = get_index_path("targets.fasta")
+    """
+    stat = Path(fasta).stat()
+    key = hashlib.sha256(f"{Path(fasta).resolve()}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+    cache_dir = os.environ.get(CACHE_ENV) or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "camlhmp"
+    return Path(cache_dir) / "faidx" / f"{key}.fai"
+
+
+def get_fasta_index(fasta: str) -> list:
+    """
+    Get the index of a FASTA file, building it only if needed.
+
+    The index is saved in the camlhmp cache (see `get_index_path`) and reused until the
+    FASTA file changes. If it can not be saved, it is only kept in memory.
+
+    Args:
+        fasta (str): The FASTA file to index
+
+    Returns:
+        list: a dict for each record with the columns in `FAI_COLS`
+
+    Raises:
+        ValueError: if the FASTA file is compressed
+
+    Examples:
+        >>> from camlhmp.faidx import get_fasta_index
+        >>> index = get_fasta_index("targets.fasta")
+    """
+    if str(fasta).endswith(".gz"):
+        raise ValueError(f"Compressed FASTA files can not be randomly accessed: {fasta}")
+
+    fai = get_index_path(fasta)
+    if fai.exists():
+        logging.debug(f"Using existing FASTA index: {fai}")
+        return read_fasta_index(fai)
+
+    index = build_fasta_index(fasta)
+    try:
+        fai.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so concurrent runs never read a partial index
+        partial = fai.with_name(f".{fai.name}.{os.getpid()}")
+        write_fasta_index(index, partial)
+        os.replace(partial, fai)
+        logging.debug(f"Saved FASTA index to {fai}")
+    except OSError:
+        logging.debug(f"Unable to save FASTA index to {fai}, keeping it in memory")
+    return index
+
+
+def get_seq_lengths(fasta: str) -> dict:
+    """
+    Get the length of each sequence, without parsing the sequences.
+
+    Compressed FASTA files are streamed, otherwise the saved index is used.
+
+    Args:
+        fasta (str): The FASTA file, optionally gzipped
+
+    Returns:
+        dict: the length of each sequence {name: length}
+
+    Examples:
+        >>> from camlhmp.faidx import get_seq_lengths
+        >>> target_lengths = get_seq_lengths("targets.fasta")
+    """
+    index = build_fasta_index(fasta) if str(fasta).endswith(".gz") else get_fasta_index(fasta)
+    return {entry["name"]: entry["length"] for entry in index}
+
+
+def fetch_seq(mm: mmap.mmap, entry: dict, start: int = 0, end: int = None) -> str:
+    """
+    Read a sequence (or part of one) from a memory-mapped FASTA file.
+
+    Records with irregular line lengths can not be located, they are read line by line
+    up to the end of the slice.
+
+    Args:
+        mm (mmap.mmap): The memory-mapped FASTA file
+        entry (dict): The index entry of the sequence
+        start (int, optional): The 0-based start of the slice. Defaults to 0.
+        end (int, optional): The 0-based, exclusive end of the slice. Defaults to the
+            end of the sequence.
+
+    Returns:
+        str: the sequence
+    """
+    end = entry["length"] if end is None else min(end, entry["length"])
+    start = max(0, start)
+    if start >= end:
+        return ""
+
+    if not entry["linebases"]:
+        # Read line by line until the end of the slice has been collected
+        seq = []
+        collected = 0
+        position = entry["offset"]
+        while collected < end:
+            line_end = mm.find(b"\n", position)
+            line_end = len(mm) if line_end == -1 else line_end
+            line = mm[position:line_end].rstrip(b"\r")
+            seq.append(line)
+            collected += len(line)
+            position = line_end + 1
+        return b"".join(seq)[start:end].decode()
+
+    linebases = entry["linebases"]
+    linewidth = entry["linewidth"]
+    byte_start = entry["offset"] + (start // linebases) * linewidth + start % linebases
+    byte_end = entry["offset"] + ((end - 1) // linebases) * linewidth + (end - 1) % linebases + 1
+    return mm[byte_start:byte_end].translate(None, b"\r\n").decode()
+
+
+def fetch_seqs(fasta: str, regions: list = None):
+    """
+    Read sequences from a FASTA file through its index, without parsing the whole file.
+
+    Args:
+        fasta (str): The FASTA file
+        regions (list, optional): The [name, start, end] of each slice to read, with
+            0-based, end-exclusive coordinates (None for the whole sequence). Defaults to
+            every sequence in the file.
+
+    Yields:
+        list: the name and sequence of each region
+
+    Raises:
+        KeyError: if a region's sequence is not in the FASTA file
+
+    Examples:
+        >>> from camlhmp.faidx import fetch_seqs
+        >>> for name, seq in fetch_seqs("genome.fasta", [["contig_1", 100, 2000]]):
+        ...     print(name, len(seq))
+    """
+    index = get_fasta_index(fasta)
+    entries = {}
+    for entry in index:
+        # Match samtools, the first record wins for duplicate names
+        entries.setdefault(entry["name"], entry)
+
+    if not index or Path(fasta).stat().st_size == 0:
+        return
+
+    with open(fasta, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if regions is None:
+            for entry in index:
+                yield [entry["name"], fetch_seq(mm, entry)]
+            return
+
+        for name, start, end in regions:
+            if name not in entries:
+                raise KeyError(f"Sequence {name} not found in {fasta}")
+            yield [name, fetch_seq(mm, entries[name], start or 0, end)]
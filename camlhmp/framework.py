@@ -4,6 +4,7 @@ A set of functions for working with the caml framework.
 import sys
 import logging
 
+import yaml
 from rich import print
 
 import camlhmp
@@ -27,6 +28,56 @@ def read_framework(yamlfile: str) -> dict:
     return parse_yaml(yamlfile)
 
 
+def write_preset(yamlfile: str, name: str, params: dict, activate: bool = False) -> dict:
+    """
+    Save a named set of engine parameters in the framework YAML file (`engine.presets`).
+
+    Only the `engine` section is rewritten, the rest of the file (including its comments)
+    is kept as is. Comments within the `engine` section are not kept.
+
+    Args:
+        yamlfile (str): the framework YAML file to update
+        name (str): the name of the preset, replacing an existing preset of the same name
+        params (dict): the engine parameters of the preset
+        activate (bool, optional): also use the preset by default (`engine.params.preset`).
+            Defaults to False.
+
+    Returns:
+        dict: the updated framework
+
+    Raises:
+        ValueError: if the file does not have a top-level `engine` section
+
+    Examples:
+        >>> from camlhmp.framework import write_preset
+        >>> framework = write_preset("sccmec.yaml", "tuned", {"max_hsps": 1, "word_size": 32})
+    """
+    framework = read_framework(yamlfile)
+    with open(yamlfile, "rt") as fh:
+        lines = fh.readlines()
+
+    # The engine section runs until the next top-level key, comments before it belong to the key
+    start = next((i for i, line in enumerate(lines) if line.rstrip() == "engine:"), None)
+    if start is None or not isinstance(framework.get("engine"), dict):
+        raise ValueError(f"{yamlfile} does not have a top-level 'engine' section")
+    end = next((i for i in range(start + 1, len(lines)) if lines[i][:1] not in ["", " ", "\t", "\n", "#"]), len(lines))
+    while end > start + 1 and (not lines[end - 1].strip() or lines[end - 1].startswith("#")):
+        end -= 1
+
+    engine = framework["engine"]
+    presets = engine.get("presets") if isinstance(engine.get("presets"), dict) else {}
+    engine["presets"] = {**presets, name: params}
+    if activate:
+        engine_params = engine.get("params") if isinstance(engine.get("params"), dict) else {}
+        engine["params"] = {**engine_params, "preset": name}
+
+    section = yaml.safe_dump({"engine": engine}, sort_keys=False, default_flow_style=False)
+    with open(yamlfile, "wt") as fh:
+        fh.writelines(lines[:start] + [section] + lines[end:])
+    logging.debug(f"Saved preset {name} ({params}) to {yamlfile}")
+    return framework
+
+
 def print_camlhmp_version() -> None:
     """
     Print the version of camlhmp, then exit
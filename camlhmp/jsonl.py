@@ -0,0 +1,74 @@
+"""
+A set of functions for streaming results as JSON Lines, one record per sample.
+"""
+import fcntl
+import json
+import logging
+import sys
+
+from camlhmp.parquet import convert_rows
+
+# Records written to this output go to STDOUT
+JSONL_STDOUT = "-"
+
+
+def get_record(mode: str, result: dict, details: list = None, hits: list = None) -> dict:
+    """
+    Build the JSON record of a sample.
+
+    Args:
+        mode (str): How the framework was evaluated ('targets', 'regions' or 'alleles')
+        result (dict): The final result of the sample
+        details (list, optional): The results against each type. Defaults to None.
+        hits (list, optional): The hits of the sample. Defaults to None.
+
+    Returns:
+        dict: the record, with typed values (e.g. lists of targets and numeric hits)
+
+    Examples:
+        >>> from camlhmp.jsonl import get_record
+        >>> record = get_record("targets", final_result, final_details)
+    """
+    record = {
+        "sample": result["sample"],
+        "mode": mode,
+        "schema": result["schema"],
+        "schema_version": result["schema_version"],
+        "result": convert_rows([result], "results")[0],
+    }
+    if details is not None:
+        record["details"] = convert_rows(details, "details")
+    if hits is not None:
+        record["hits"] = convert_rows(hits, "hits")
+    return record
+
+
+def write_record(record: dict, output: str):
+    """
+    Write a record as a single JSON line, to STDOUT (`-`) or appended to a file.
+
+    Records are flushed as soon as they are written, so a downstream process can consume
+    them without waiting on any files. Appends to a file hold a lock, so many samples can
+    share it.
+
+    Args:
+        record (dict): The record of a sample (e.g. from `get_record`)
+        output (str): The JSON Lines file, or `-` for STDOUT
+
+    Examples:
+        >>> from camlhmp.jsonl import write_record
+        >>> write_record(record, "-")
+    """
+    line = json.dumps(record) + "\n"
+    if output == JSONL_STDOUT:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+    else:
+        logging.debug(f"Appending {record['sample']} to {output}")
+        with open(output, "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                fh.write(line)
+                fh.flush()
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
@@ -0,0 +1,190 @@
+"""
+A set of functions for predicting and searching the open reading frames (ORFs) of an input.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from camlhmp.engines.blast import (evict_blastdb_cache, get_subject_key,
+                                   lock_blastdb_entry)
+from camlhmp.engines.kmer import reverse_complement
+from camlhmp.utils import parse_table, read_fasta
+
+# The shortest ORF (in amino acids) worth searching
+MIN_ORF_LENGTH = 20
+
+ORF_COLS = ["orf", "contig", "strand", "start", "end", "length"]
+
+
+def predict_orfs(subject: str, outdir: str, min_length: int = MIN_ORF_LENGTH) -> list:
+    """
+    Translate the input in all six frames and write each stop-to-stop ORF.
+
+    The input is streamed one sequence at a time. ORFs are named `orf_<n>`, with their
+    nucleotide coordinates written to a separate table.
+
+    Args:
+        subject (str): The subject (input) in FASTA format, optionally gzipped
+        outdir (str): The directory to write `orfs.faa` and `orfs.tsv` to
+        min_length (int, optional): The minimum ORF length in amino acids. Defaults to MIN_ORF_LENGTH.
+
+    Returns:
+        list: the path to the protein FASTA and the path to the ORF table
+
+    Examples:
+        >>> from camlhmp.orfs import predict_orfs
+        >>> orfs_faa, orfs_tsv = predict_orfs(input_path, "./orfs")
+    """
+    # Bio.Seq loads every codon table, only import it when ORFs are needed
+    from Bio.Seq import translate
+
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    orfs_faa = f"{outdir}/orfs.faa"
+    orfs_tsv = f"{outdir}/orfs.tsv"
+    total = 0
+    with open(orfs_faa, "wt") as faa_fh, open(orfs_tsv, "wt") as tsv_fh:
+        tsv_fh.write("\t".join(ORF_COLS) + "\n")
+        for contig, seq in read_fasta(subject, uppercase=True):
+            length = len(seq)
+            for strand, strand_seq in [["+", seq], ["-", reverse_complement(seq)]]:
+                for frame in range(3):
+                    coding = strand_seq[frame : frame + (length - frame) // 3 * 3]
+                    offset = 0
+                    for protein in translate(coding).split("*"):
+                        if len(protein) >= min_length:
+                            total += 1
+                            # 1-based coordinates on the strand that was translated
+                            start = frame + 3 * offset + 1
+                            end = frame + 3 * (offset + len(protein))
+                            if strand == "-":
+                                start, end = length - end + 1, length - start + 1
+                            faa_fh.write(f">orf_{total}\n{protein}\n")
+                            tsv_fh.write(f"orf_{total}\t{contig}\t{strand}\t{start}\t{end}\t{length}\n")
+                        offset += len(protein) + 1
+    logging.debug(f"Predicted {total} ORFs from {subject}")
+    return [orfs_faa, orfs_tsv]
+
+
+@contextmanager
+def subject_orfs(
+    subject: str, outdir: str, cache_dir: str = None, max_entries: int = 100, min_length: int = MIN_ORF_LENGTH
+):
+    """
+    Provide the ORFs of the subject, predicting them only if needed.
+
+    When `cache_dir` is set, ORFs are stored by the SHA256 of the subject so that multiple
+    protein frameworks run against the same sample reuse them, and the entry is locked
+    until the context exits so it is not evicted while in use. Otherwise they are written
+    to `outdir`.
+
+    Args:
+        subject (str): The subject (input) in FASTA format, optionally gzipped
+        outdir (str): The directory to write ORFs to when not caching
+        cache_dir (str, optional): A directory to cache ORFs in. Defaults to None.
+        max_entries (int, optional): The maximum number of cached entries. Defaults to 100.
+        min_length (int, optional): The minimum ORF length in amino acids. Defaults to MIN_ORF_LENGTH.
+
+    Yields:
+        list: the path to the protein FASTA, the path to the ORF table, and the seconds
+            spent predicting ORFs (0 if cached)
+
+    Examples:
+        >>> from camlhmp.orfs import subject_orfs
+        >>> with subject_orfs(input_path, tmpdir, "./cache") as (orfs_faa, orfs_tsv, orf_time):
+                hits, blast_stdout, blast_stderr = run_blast("blastp", orfs_faa, targets_path, ...)
+    """
+    start = time.perf_counter()
+    if not cache_dir:
+        orfs_faa, orfs_tsv = predict_orfs(subject, outdir, min_length)
+        yield [orfs_faa, orfs_tsv, time.perf_counter() - start]
+        return
+
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    entry = Path(cache_dir) / f"{get_subject_key(subject)}-orfs{min_length}"
+    build_time = 0
+    # The entry is locked before it is checked, so it cannot be evicted until the search is done
+    with lock_blastdb_entry(entry):
+        if entry.exists():
+            logging.debug(f"Using cached ORFs: {entry}")
+        else:
+            # Predict in a staging directory, then move into place so concurrent runs never
+            # see partial ORFs
+            staging = tempfile.mkdtemp(prefix=".staging-", dir=cache_dir)
+            try:
+                predict_orfs(subject, staging, min_length)
+            except BaseException:
+                # Eviction skips hidden directories, do not leave a failed prediction behind
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # Another process finished first, use theirs
+                shutil.rmtree(staging, ignore_errors=True)
+            build_time = time.perf_counter() - start
+
+        os.utime(entry)
+        evict_blastdb_cache(cache_dir, max_entries)
+        yield [f"{entry}/orfs.faa", f"{entry}/orfs.tsv", build_time]
+
+
+def restore_orf_coordinates(results: list, orfs_tsv: str) -> list:
+    """
+    Map protein hits against ORFs back to the nucleotide coordinates of the input.
+
+    Hits are reported as `tblastn` would: the subject is the original contig, `sstart` and
+    `send` are nucleotide positions (reversed on the minus strand) and `qcovs` is the
+    coverage of all hits against the contig. Like `tblastn`, hits are not filtered by
+    percent identity, which protein searches do not support. `min_pident` is applied
+    afterwards in the same way for both (e.g. by `get_blast_allele_hits`).
+
+    Args:
+        results (list): The hits (with `BLASTN_COLS` columns) against the ORFs
+        orfs_tsv (str): The ORF table from `predict_orfs`
+
+    Returns:
+        list: The hits in the coordinates of the input
+
+    Examples:
+        >>> from camlhmp.orfs import restore_orf_coordinates
+        >>> blast_stdout = restore_orf_coordinates(blast_stdout, orfs_tsv)
+    """
+    hit_orfs = set(result["sseqid"] for result in results)
+    orfs = {}
+    for orf in parse_table(orfs_tsv):
+        if orf["orf"] in hit_orfs:
+            orfs[orf["orf"]] = orf
+
+    final_results = []
+    covered = {}
+    for result in results:
+        if result["sseqid"] not in orfs:
+            # NO_HITS
+            final_results.append(result)
+            continue
+
+        orf = orfs[result["sseqid"]]
+        if orf["strand"] == "+":
+            sstart = int(orf["start"]) + 3 * (int(result["sstart"]) - 1)
+            send = int(orf["start"]) + 3 * int(result["send"]) - 1
+        else:
+            sstart = int(orf["end"]) - 3 * (int(result["sstart"]) - 1)
+            send = int(orf["end"]) - 3 * int(result["send"]) + 1
+        result["sseqid"] = orf["contig"]
+        result["slen"] = orf["length"]
+        result["sstart"] = str(sstart)
+        result["send"] = str(send)
+        covered.setdefault((result["qseqid"], result["sseqid"]), set()).update(
+            range(int(result["qstart"]), int(result["qend"]) + 1)
+        )
+        final_results.append(result)
+
+    for result in final_results:
+        key = (result["qseqid"], result["sseqid"])
+        if key in covered:
+            result["qcovs"] = str(round(100 * len(covered[key]) / int(result["qlen"])))
+    return final_results
@@ -0,0 +1,218 @@
+"""
+A set of functions for writing results as Parquet datasets, requires the optional `pyarrow`.
+"""
+import logging
+from typing import TYPE_CHECKING
+
+from camlhmp.engines.blast import BLASTN_COLS
+
+if TYPE_CHECKING:
+    import pyarrow
+
+PARQUET_TABLES = ["results", "details", "hits"]
+
+# Datasets are partitioned so cohort queries only read the schema they need
+PARTITION_COLS = ["schema", "schema_version"]
+
+# Comma-joined columns of the result and details tables, and the type of their values
+LIST_COLS = {
+    "targets": "string",
+    "missing": "string",
+    "coverage": "float64",
+    "hits": "int64",
+}
+
+HIT_INT_COLS = ["qlen", "slen", "length", "nident", "mismatch", "gapopen", "qstart", "qend", "sstart", "send"]
+HIT_FLOAT_COLS = ["pident", "qcovs", "evalue", "bitscore"]
+
+# Numeric columns of each target in an alleles result ({target}_{col})
+ALLELE_FLOAT_COLS = ["pident", "qcovs", "bitscore"]
+
+
+def import_pyarrow() -> list:
+    """
+    Import `pyarrow`, which is only needed for Parquet outputs.
+
+    Returns:
+        list: the `pyarrow` and `pyarrow.parquet` modules
+
+    Raises:
+        ImportError: if `pyarrow` is not installed
+
+    Examples:
+        >>> from camlhmp.parquet import import_pyarrow
+        >>> pa, pq = import_pyarrow()
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "Parquet output requires pyarrow, please install it (e.g. `pip install camlhmp[parquet]`)"
+        ) from e
+    return [pa, pq]
+
+
+def get_column_type(table: str, column: str) -> str:
+    """
+    Get the type of a column in one of the Parquet tables.
+
+    Args:
+        table (str): The table the column belongs to ('results', 'details' or 'hits')
+        column (str): The column name
+
+    Returns:
+        str: the type of the column ('string', 'bool', 'int64', 'float64' or 'list<{type}>')
+
+    Examples:
+        >>> from camlhmp.parquet import get_column_type
+        >>> get_column_type("details", "coverage")
+        'list<float64>'
+    """
+    if table == "hits":
+        if column in HIT_INT_COLS:
+            return "int64"
+        elif column in HIT_FLOAT_COLS:
+            return "float64"
+        return "string"
+
+    if column in LIST_COLS:
+        return f"list<{LIST_COLS[column]}>"
+    elif column == "status":
+        return "bool"
+    elif column.rsplit("_", 1)[-1] in ALLELE_FLOAT_COLS and column not in PARTITION_COLS:
+        return "float64"
+    return "string"
+
+
+def _convert_value(value, column_type: str):
+    """Convert a TSV value to its Parquet type"""
+    if column_type.startswith("list<"):
+        values = [] if value in (None, "") else str(value).split(",")
+        return [_convert_value(v, column_type[5:-1]) for v in values]
+    elif value in (None, ""):
+        return None
+    elif column_type == "bool":
+        return value if isinstance(value, bool) else str(value) == "True"
+    elif column_type == "int64":
+        return int(float(value))
+    elif column_type == "float64":
+        return float(value)
+    return str(value)
+
+
+def convert_rows(rows: list, table: str) -> list:
+    """
+    Convert the TSV values of a result, details or hit table to their types.
+
+    Comma-joined columns become lists, and numeric and status columns become numbers and
+    booleans. Placeholder rows of tables without hits are dropped. This does not require
+    `pyarrow`.
+
+    Args:
+        rows (list): The rows (dicts) of the table
+        table (str): The table the rows belong to ('results', 'details' or 'hits')
+
+    Returns:
+        list: the rows with typed values
+
+    Examples:
+        >>> from camlhmp.parquet import convert_rows
+        >>> convert_rows([{"type": "I", "targets": "ccrA1,mecA"}], "details")
+        [{'type': 'I', 'targets': ['ccrA1', 'mecA']}]
+    """
+    return [
+        {column: _convert_value(value, get_column_type(table, column)) for column, value in row.items()}
+        for row in rows
+        if next(iter(row.values()), None) != "NO_HITS"
+    ]
+
+
+def to_arrow(rows: list, table: str, columns: list = None) -> "pyarrow.Table":
+    """
+    Convert rows of a result, details or hit table to a typed Arrow table.
+
+    Args:
+        rows (list): The rows (dicts) of the table
+        table (str): The table the rows belong to ('results', 'details' or 'hits')
+        columns (list, optional): The columns of the table. Defaults to the keys of the
+            first row (or `BLASTN_COLS` for hits).
+
+    Returns:
+        pyarrow.Table: the typed table
+
+    Raises:
+        ValueError: if the table is unknown
+
+    Examples:
+        >>> from camlhmp.parquet import to_arrow
+        >>> arrow_table = to_arrow(final_details, "details")
+    """
+    if table not in PARQUET_TABLES:
+        raise ValueError(f"Unknown table ('{table}'), expected one of: {PARQUET_TABLES}")
+    pa, _ = import_pyarrow()
+
+    # Tables without hits only have a placeholder row
+    rows = [row for row in rows if next(iter(row.values()), None) != "NO_HITS"]
+    if columns is None:
+        columns = list(rows[0].keys()) if rows else list(BLASTN_COLS)
+
+    fields = []
+    arrays = []
+    for column in columns:
+        column_type = get_column_type(table, column)
+        if column_type.startswith("list<"):
+            arrow_type = pa.list_(pa.type_for_alias(column_type[5:-1]))
+        else:
+            arrow_type = pa.type_for_alias(column_type)
+        fields.append(pa.field(column, arrow_type))
+        arrays.append(pa.array([_convert_value(row.get(column), column_type) for row in rows], type=arrow_type))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def write_parquet(
+    rows: list, outdir: str, table: str, prefix: str, schema: str, schema_version: str
+) -> str:
+    """
+    Write a table to a Parquet dataset, partitioned by schema and schema version.
+
+    Each sample writes its own file (`{outdir}/{table}/schema=.../schema_version=.../{prefix}-0.parquet`),
+    so many samples can share a dataset and be queried together.
+
+    Args:
+        rows (list): The rows (dicts) of the table
+        outdir (str): The directory of the Parquet datasets
+        table (str): The table the rows belong to ('results', 'details' or 'hits')
+        prefix (str): The sample name, used to name the file
+        schema (str): The schema ID of the framework
+        schema_version (str): The version of the framework
+
+    Returns:
+        str: the dataset directory the table was written to
+
+    Examples:
+        >>> from camlhmp.parquet import write_parquet
+        >>> write_parquet(final_details, "parquet", "details", prefix, "sccmec", "1.0.0")
+    """
+    _, pq = import_pyarrow()
+    if table == "hits":
+        # Hits have no sample or schema columns of their own
+        rows = [
+            {"sample": prefix, "schema": schema, "schema_version": schema_version, **row}
+            for row in rows
+            if next(iter(row.values()), None) != "NO_HITS"
+        ]
+        arrow_table = to_arrow(rows, table, ["sample"] + PARTITION_COLS + BLASTN_COLS)
+    else:
+        arrow_table = to_arrow(rows, table)
+
+    dataset = f"{outdir}/{table}"
+    logging.debug(f"Writing {arrow_table.num_rows} rows of {table} to {dataset}")
+    pq.write_to_dataset(
+        arrow_table,
+        root_path=dataset,
+        partition_cols=PARTITION_COLS,
+        basename_template=f"{prefix}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return dataset
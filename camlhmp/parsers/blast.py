@@ -1,7 +1,42 @@
 # Functions for parsing BLAST results
+import csv
+import io
 import logging
 
 import camlhmp
+from camlhmp.engines.blast import BLASTN_COLS, format_blastn_tasks
+from camlhmp.utils import open_seqfile
+
+# Which hits are written to the hits TSV
+HITS_OUTPUTS = ["all", "passed", "typed"]
+
+
+def get_params(min_pident: float, min_coverage: int, tasks: dict = None, options: dict = None) -> str:
+    """
+    Describe the settings of a run, for the `params` column of the outputs.
+
+    Args:
+        min_pident (float): The minimum percent identity to count a hit
+        min_coverage (int): The minimum percent coverage to count a hit
+        tasks (dict, optional): The blastn task of each target searched (e.g. from
+            `get_blastn_tasks`). Defaults to None.
+        options (dict, optional): The parameters passed through to the engine (e.g. from
+            `get_engine_params`). Defaults to None.
+
+    Returns:
+        str: the settings, separated by semicolons
+
+    Examples:
+        >>> from camlhmp.parsers.blast import get_params
+        >>> get_params(95, 95, {"mecA": "megablast"})
+        'min-coverage=95;min-pident=95;blast-task=megablast'
+    """
+    params = f"min-coverage={min_coverage};min-pident={min_pident}"
+    if tasks:
+        params += f";blast-task={format_blastn_tasks(tasks)}"
+    for key, val in sorted((options or {}).items()):
+        params += f";{key.replace('_', '-')}={val}"
+    return params
 
 
 def get_blast_allele_hits(
@@ -196,7 +231,101 @@ def get_blast_target_hits(targets: list, results: dict) -> dict:
     return target_hits
 
 
-def finalize_regions(prefix: str, hits: dict, framework: dict, min_pident: float, min_coverage: int) -> list:
+def read_blast_hits(
+    blast_tsv: str, min_pident: float = 0, min_coverage: int = 0, tool: str = "blastn"
+) -> list:
+    """
+    Read the hits written by a previous run, so they can be re-typed without searching.
+
+    The file is streamed and each hit is filtered again the same way BLAST+ would have
+    (`-perc_identity` for blastn, `-qcov_hsp_perc` for all tools). Thresholds can only be
+    made stricter than those of the original run, hits it excluded cannot be recovered.
+
+    Args:
+        blast_tsv (str): A hits TSV (e.g. `{prefix}.blastn.tsv`) written by camlhmp, optionally compressed
+        min_pident (float, optional): The minimum percent identity to count a hit. Defaults to 0.
+        min_coverage (int, optional): The minimum percent coverage to count a hit. Defaults to 0.
+        tool (str, optional): The tool that produced the hits. Defaults to "blastn".
+
+    Returns:
+        list: The target hits and the parsed results (same as `run_blast`)
+
+    Raises:
+        ValueError: if the file is missing any of the expected columns
+
+    Examples:
+        >>> from camlhmp.parsers.blast import read_blast_hits
+        >>> hits, blast_stdout = read_blast_hits("camlhmp.blastn.tsv", min_pident, min_coverage)
+    """
+    results = []
+    target_hits = []
+    with io.TextIOWrapper(open_seqfile(blast_tsv), newline="") as fh:
+        reader = csv.DictReader(fh, delimiter="\t")
+        missing = [col for col in BLASTN_COLS if col not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{blast_tsv} is missing expected columns: {', '.join(missing)}")
+
+        for row in reader:
+            if min_pident and tool == "blastn" and float(row["pident"]) < min_pident:
+                continue
+            hsp_coverage = 100 * (int(row["qend"]) - int(row["qstart"]) + 1) / int(row["qlen"])
+            if min_coverage and hsp_coverage < min_coverage:
+                continue
+            results.append(row)
+            target_hits.append(row["qseqid"])
+
+    if not results:
+        # Create an empty dict if no results are found
+        results.append(dict(zip(BLASTN_COLS, ["NO_HITS"] * len(BLASTN_COLS))))
+
+    logging.debug(f"Read {len(target_hits)} hits from {blast_tsv}")
+    return [target_hits, results]
+
+
+def filter_hits(
+    results: list, qseqids: list = None, min_pident: float = 0, min_coverage: int = 0
+) -> list:
+    """
+    Filter the BLAST results, to limit which hits are written.
+
+    Args:
+        results (list): The BLAST results
+        qseqids (list, optional): Only keep hits of these query IDs. Defaults to all.
+        min_pident (float, optional): The minimum percent identity to keep a hit. Defaults to 0.
+        min_coverage (int, optional): The minimum percent coverage (qcovs) to keep a hit. Defaults to 0.
+
+    Returns:
+        list: The hits that were kept, or a NO_HITS row if none were
+
+    Examples:
+        >>> from camlhmp.parsers.blast import filter_hits
+        >>> typed_hits = filter_hits(blast_stdout, ["ccrA1", "ccrB1", "mecA"])
+    """
+    qseqids = None if qseqids is None else set(qseqids)
+    kept = []
+    for result in results:
+        if result["qseqid"] == "NO_HITS":
+            continue
+        elif qseqids is not None and result["qseqid"] not in qseqids:
+            continue
+        elif float(result["pident"]) < min_pident or float(result["qcovs"]) < min_coverage:
+            continue
+        kept.append(result)
+
+    if not kept:
+        kept.append(dict(zip(BLASTN_COLS, ["NO_HITS"] * len(BLASTN_COLS))))
+    return kept
+
+
+def finalize_regions(
+    prefix: str,
+    hits: dict,
+    framework: dict,
+    min_pident: float,
+    min_coverage: int,
+    tasks: dict = None,
+    options: dict = None,
+) -> list:
     """
     Finalize the results from region-based analysis.
 
@@ -206,6 +335,8 @@ def finalize_regions(prefix: str, hits: dict, framework: dict, min_pident: float
         framework (dict): The framework schema that was used
         min_pident (float): The minimum percent identity to count a hit
         min_coverage (int): The minimum percent coverage to count a hit
+        tasks (dict, optional): The blastn task of each target searched. Defaults to None.
+        options (dict, optional): The parameters passed through to the engine. Defaults to None.
 
     Returns:
         list: The finalized results
@@ -237,7 +368,7 @@ def finalize_regions(prefix: str, hits: dict, framework: dict, min_pident: float
                 "schema": framework["metadata"]["id"],
                 "schema_version": framework["metadata"]["version"],
                 "camlhmp_version": camlhmp.__version__,
-                "params": f"min-coverage={min_coverage};min-pident={min_pident}",
+                "params": get_params(min_pident, min_coverage, tasks, options),
                 "comment": ";".join(vals["comment"]),
             }
         )
@@ -268,14 +399,23 @@ def finalize_regions(prefix: str, hits: dict, framework: dict, min_pident: float
         "schema": framework["metadata"]["id"],
         "schema_version": framework["metadata"]["version"],
         "camlhmp_version": camlhmp.__version__,
-        "params": f"min-coverage={min_coverage};min-pident={min_pident}",
+        "params": get_params(min_pident, min_coverage, tasks, options),
         "comment": comment,
     }
 
     return final_result, final_details
 
 
-def finalize_targets(prefix: str, results: dict,  hits: dict, framework: dict, min_pident: float, min_coverage: int) -> list:
+def finalize_targets(
+    prefix: str,
+    results: dict,
+    hits: dict,
+    framework: dict,
+    min_pident: float,
+    min_coverage: int,
+    tasks: dict = None,
+    options: dict = None,
+) -> list:
     """
     Finalize the target hits.
 
@@ -286,6 +426,8 @@ def finalize_targets(prefix: str, results: dict,  hits: dict, framework: dict, m
         framework (dict): The framework schema that was used
         min_pident (float): The minimum percent identity to count a hit
         min_coverage (int): The minimum percent coverage to count a hit
+        tasks (dict, optional): The blastn task of each target searched. Defaults to None.
+        options (dict, optional): The parameters passed through to the engine. Defaults to None.
 
     Returns:
         list: The finalized target hits
@@ -313,7 +455,7 @@ def finalize_targets(prefix: str, results: dict,  hits: dict, framework: dict, m
                 "schema": framework["metadata"]["id"],
                 "schema_version": framework["metadata"]["version"],
                 "camlhmp_version": camlhmp.__version__,
-                "params": f"min-coverage={min_coverage};min-pident={min_pident}",
+                "params": get_params(min_pident, min_coverage, tasks, options),
                 "comment": vals["comment"],
             }
         )
@@ -338,8 +480,54 @@ def finalize_targets(prefix: str, results: dict,  hits: dict, framework: dict, m
         "schema": framework["metadata"]["id"],
         "schema_version": framework["metadata"]["version"],
         "camlhmp_version": camlhmp.__version__,
-        "params": f"min-coverage={min_coverage};min-pident={min_pident}",
+        "params": get_params(min_pident, min_coverage, tasks, options),
         "comment": final_comment,
     }
 
     return final_result, final_details
+
+
+def finalize_alleles(
+    prefix: str,
+    results: dict,
+    framework: dict,
+    min_pident: float,
+    min_coverage: int,
+    tasks: dict = None,
+    options: dict = None,
+) -> dict:
+    """
+    Finalize the allele hits.
+
+    Args:
+        prefix (str): The sample prefix
+        results (dict): The allele hits of each target (e.g. from `get_blast_allele_hits`)
+        framework (dict): The framework schema that was used
+        min_pident (float): The minimum percent identity to count a hit
+        min_coverage (int): The minimum percent coverage to count a hit
+        tasks (dict, optional): The blastn task of each target searched. Defaults to None.
+        options (dict, optional): The parameters passed through to the engine. Defaults to None.
+
+    Returns:
+        dict: The finalized result, with the allele, pident, qcovs, bitscore and comment of
+            each target
+
+    Examples:
+        >>> from camlhmp.parsers.blast import finalize_alleles
+        >>> final_row = finalize_alleles(prefix, target_results, framework, min_pident, min_coverage)
+    """
+    final_row = {
+        "sample": prefix,
+        "schema": framework["metadata"]["id"],
+        "schema_version": framework["metadata"]["version"],
+        "camlhmp_version": camlhmp.__version__,
+        "params": get_params(min_pident, min_coverage, tasks, options),
+    }
+    for target in results:
+        final_row[f"{target}_id"] = results[target]["id"]
+        final_row[f"{target}_pident"] = str(results[target]["pident"])
+        final_row[f"{target}_qcovs"] = str(results[target]["qcovs"])
+        final_row[f"{target}_bitscore"] = str(results[target]["bitscore"])
+        final_row[f"{target}_comment"] = results[target]["comment"]
+
+    return final_row
@@ -0,0 +1,321 @@
+"""
+A set of functions for reducing the work handed to an engine before a search.
+"""
+import logging
+import math
+
+import numpy as np
+
+from camlhmp.engines.kmer import KMER_SIZE, kmer_hashes
+from camlhmp.utils import read_fasta
+
+# Subject sequences are hashed in chunks to bound memory usage
+CHUNK_SIZE = 1_000_000
+
+PREFILTER_MODES = ["off", "safe", "fast"]
+
+# Seeds for the subject prefilter, must not exceed the megablast word size (28)
+SEED_SIZE = 21
+
+
+def stream_subject_kmers(subject: str, k: int = KMER_SIZE):
+    """
+    Stream the canonical k-mer hashes of the subject in memory-bounded chunks.
+
+    Args:
+        subject (str): The subject (input) in FASTA format, optionally gzipped
+        k (int, optional): The k-mer size. Defaults to KMER_SIZE.
+
+    Yields:
+        np.ndarray: the k-mer hashes of a chunk of the subject
+    """
+    for _, seq in read_fasta(subject, uppercase=True):
+        # Overlap chunks by k - 1 so no k-mer is lost at a boundary
+        for start in range(0, max(len(seq) - k + 1, 1), CHUNK_SIZE):
+            hashes, _ = kmer_hashes(seq[start : start + CHUNK_SIZE + k - 1], k)
+            yield hashes
+
+
+def get_target_containment(subject: str, query: str, k: int = KMER_SIZE) -> list:
+    """
+    Determine how many k-mers of each target are contained in the subject.
+
+    Only the k-mers of the targets are kept in memory, the subject is streamed.
+
+    Args:
+        subject (str): The subject (input) in FASTA format, optionally gzipped
+        query (str): The query file (targets) in FASTA format
+        k (int, optional): The k-mer size. Defaults to KMER_SIZE.
+
+    Returns:
+        list: for each target, the header, sequence, number of valid k-mers and the
+            number of those k-mers found in the subject
+
+    Examples:
+        >>> from camlhmp.prefilter import get_target_containment
+        >>> containment = get_target_containment(input_path, targets_path)
+    """
+    targets = []
+    for header, seq in read_fasta(query, uppercase=True, headers=True):
+        hashes, _ = kmer_hashes(seq, k)
+        targets.append([header, seq, hashes[hashes != np.iinfo(np.uint64).max]])
+
+    universe = np.unique(np.concatenate([t[2] for t in targets])) if targets else np.zeros(0, dtype=np.uint64)
+    found = np.zeros(len(universe), dtype=bool)
+    for hashes in stream_subject_kmers(subject, k):
+        found |= np.isin(universe, hashes)
+    present = universe[found]
+
+    containment = []
+    for header, seq, hashes in targets:
+        containment.append([header, seq, len(hashes), int(np.isin(hashes, present).sum())])
+    return containment
+
+
+def get_min_shared_kmers(length: int, min_pident: float, min_coverage: int, k: int = KMER_SIZE) -> int:
+    """
+    Determine the fewest k-mers a target must share with the subject to possibly pass.
+
+    A hit must align at least `min_coverage` percent of the target, and in that span at
+    most `(100 - min_pident) / min_pident` edits are possible per aligned target base. Each
+    edit can break at most `k` of the target's k-mers, so fewer shared k-mers than returned
+    here guarantees no hit can meet both thresholds.
+
+    Args:
+        length (int): The length of the target
+        min_pident (float): The minimum percent identity to count a hit
+        min_coverage (int): The minimum percent coverage to count a hit
+        k (int, optional): The k-mer size. Defaults to KMER_SIZE.
+
+    Returns:
+        int: the minimum number of shared k-mers (0 if nothing can be ruled out)
+
+    Examples:
+        >>> from camlhmp.prefilter import get_min_shared_kmers
+        >>> get_min_shared_kmers(2007, 95, 95)
+    """
+    if not min_pident or not min_coverage:
+        return 0
+    span = math.ceil(length * min_coverage / 100)
+    edits_per_base = (100 - min_pident) / min_pident
+    return max(0, math.floor(span - k * edits_per_base * span - k + 1))
+
+
+def prefilter_targets(
+    subject: str,
+    query: str,
+    output: str,
+    min_pident: float,
+    min_coverage: int,
+    mode: str = "safe",
+    k: int = KMER_SIZE,
+) -> list:
+    """
+    Write only the targets that could plausibly have a hit in the subject.
+
+    In `safe` mode a target is only dropped if it cannot reach `min_pident` and
+    `min_coverage` (see `get_min_shared_kmers`), so no true hit is ever lost. The `fast`
+    mode also drops targets sharing fewer than half of the k-mers expected from a hit at
+    the thresholds, which is more aggressive but may drop borderline hits.
+
+    Args:
+        subject (str): The subject (input) in FASTA format, optionally gzipped
+        query (str): The query file (targets) in FASTA format
+        output (str): The FASTA file to write plausible targets to
+        min_pident (float): The minimum percent identity to count a hit
+        min_coverage (int): The minimum percent coverage to count a hit
+        mode (str, optional): Either 'safe' or 'fast'. Defaults to "safe".
+        k (int, optional): The k-mer size. Defaults to KMER_SIZE.
+
+    Returns:
+        list: the kept and dropped target IDs
+
+    Raises:
+        ValueError: if the mode is not supported
+
+    Examples:
+        >>> from camlhmp.prefilter import prefilter_targets
+        >>> kept, dropped = prefilter_targets(
+                input_path, targets_path, "targets.fasta", min_pident, min_coverage
+            )
+    """
+    if mode not in ["safe", "fast"]:
+        raise ValueError(f"Unsupported prefilter mode ('{mode}'), expected one of: safe, fast")
+
+    kept = []
+    dropped = []
+    with open(output, "wt") as fh:
+        for header, seq, total, shared in get_target_containment(subject, query, k):
+            target = header.split()[0]
+            # k-mers with ambiguous bases can never be shared, allow for them
+            required = get_min_shared_kmers(len(seq), min_pident, min_coverage, k) - (
+                max(len(seq) - k + 1, 0) - total
+            )
+            if mode == "fast":
+                expected = total * (min_coverage / 100) * (min_pident / 100) ** k
+                required = max(required, math.floor(0.5 * expected), 1)
+
+            if shared >= required:
+                kept.append(target)
+                fh.write(f">{header}\n{seq}\n")
+            else:
+                dropped.append(target)
+            logging.debug(f"Prefilter {target}: {shared}/{total} k-mers shared, {required} required")
+
+    return [kept, dropped]
+
+
+def get_seed_positions(seq: str, universe: np.ndarray, k: int = KMER_SIZE) -> np.ndarray:
+    """
+    Find the positions in a sequence that share a k-mer with the targets.
+
+    Args:
+        seq (str): The sequence to scan
+        universe (np.ndarray): A sorted array of the target k-mer hashes
+        k (int, optional): The k-mer size. Defaults to KMER_SIZE.
+
+    Returns:
+        np.ndarray: the sorted 0-based start positions of shared k-mers
+    """
+    positions = []
+    for start in range(0, max(len(seq) - k + 1, 1), CHUNK_SIZE):
+        hashes, _ = kmer_hashes(seq[start : start + CHUNK_SIZE + k - 1], k)
+        positions.append(np.flatnonzero(np.isin(hashes, universe)) + start)
+    return np.concatenate(positions) if positions else np.zeros(0, dtype=np.int64)
+
+
+def get_subject_prefilter_conflicts(tasks: dict = None, params: dict = None, engine: str = "blast") -> list:
+    """
+    Find the search settings the subject prefilter could lose hits with.
+
+    The prefilter only keeps regions sharing a `SEED_SIZE` seed with a target, so every
+    hit the engine can find must start from a word at least that long. This holds for
+    megablast (words of 28), but not for other tasks, a smaller `word_size` or other
+    engines (e.g. the kmer engine seeds hits with `KMER_SIZE` k-mers).
+
+    Args:
+        tasks (dict, optional): The blastn task of each target (from `get_blastn_tasks`).
+            Defaults to None.
+        params (dict, optional): The engine parameters (e.g. from `get_engine_params`).
+            Defaults to None.
+        engine (str, optional): The name of the engine. Defaults to "blast".
+
+    Returns:
+        list: the engine, tasks and parameters that conflict with the prefilter, empty if
+            none do
+
+    Examples:
+        >>> from camlhmp.prefilter import get_subject_prefilter_conflicts
+        >>> get_subject_prefilter_conflicts({"mecA": "megablast"}, {"word_size": 16})
+        ['word_size=16']
+        >>> get_subject_prefilter_conflicts(None, {}, engine="kmer")
+        ['engine=kmer']
+    """
+    if engine != "blast":
+        return [f"engine={engine}"]
+    conflicts = sorted(set(tasks.values()) - {"megablast"}) if tasks else []
+    word_size = (params or {}).get("word_size")
+    if word_size is not None and int(word_size) < SEED_SIZE:
+        conflicts.append(f"word_size={word_size}")
+    return conflicts
+
+
+def prefilter_subject(
+    subject: str, query: str, output: str, flank: int = None, k: int = SEED_SIZE
+) -> list:
+    """
+    Write only the regions of the subject that share seeds with any target.
+
+    Candidate regions are padded by `flank` bases on both sides and merged if they are
+    close. Every megablast hit requires an exact word match of at least 28 bases, so with a
+    flank at least as long as the largest target no blastn (megablast) hit is lost. Each
+    region is written with a placeholder name, use `restore_subject_coordinates` to map
+    hits back to the original contigs.
+
+    Args:
+        subject (str): The subject (input) in FASTA format, optionally gzipped
+        query (str): The query file (targets) in FASTA format
+        output (str): The FASTA file to write candidate regions to
+        flank (int, optional): Bases to include around seeds. Defaults to 110% of the
+            largest target plus 100 bp.
+        k (int, optional): The seed size. Defaults to SEED_SIZE.
+
+    Returns:
+        list: the windows {name: {contig, offset, length}}, the bases kept and the total
+            bases in the subject
+
+    Examples:
+        >>> from camlhmp.prefilter import prefilter_subject
+        >>> windows, kept_bp, total_bp = prefilter_subject(input_path, targets_path, "subject.fasta")
+    """
+    universe = []
+    max_length = 0
+    for _, seq in read_fasta(query, uppercase=True):
+        hashes, _ = kmer_hashes(seq, k)
+        universe.append(hashes[hashes != np.iinfo(np.uint64).max])
+        max_length = max(max_length, len(seq))
+    universe = np.unique(np.concatenate(universe)) if universe else np.zeros(0, dtype=np.uint64)
+    flank = flank if flank is not None else int(max_length * 1.1) + 100
+
+    windows = {}
+    kept_bp = 0
+    total_bp = 0
+    with open(output, "wt") as fh:
+        for contig, seq in read_fasta(subject, uppercase=True):
+            total_bp += len(seq)
+            positions = get_seed_positions(seq, universe, k)
+            if not len(positions):
+                continue
+
+            # Merge seeds whose flanked regions would overlap
+            breaks = np.flatnonzero(np.diff(positions) > 2 * flank)
+            starts = positions[np.concatenate([[0], breaks + 1])]
+            ends = positions[np.concatenate([breaks, [len(positions) - 1]])] + k
+            for start, end in zip(starts, ends):
+                start = max(0, int(start) - flank)
+                end = min(len(seq), int(end) + flank)
+                name = f"camlhmp_window_{len(windows) + 1}"
+                windows[name] = {"contig": contig, "offset": start, "length": len(seq)}
+                kept_bp += end - start
+                fh.write(f">{name}\n{seq[start:end]}\n")
+
+    logging.debug(f"Subject prefilter kept {kept_bp} of {total_bp} bp in {len(windows)} windows")
+    return [windows, kept_bp, total_bp]
+
+
+def restore_subject_coordinates(results: list, windows: dict) -> list:
+    """
+    Map hits against prefiltered windows back to the original contigs.
+
+    The subject ID, length and coordinates are restored, and `qcovs` is recalculated
+    across all hits of a target against each original contig.
+
+    Args:
+        results (list): The hits (with `BLASTN_COLS` columns) against the windows
+        windows (dict): The windows from `prefilter_subject`
+
+    Returns:
+        list: The hits in the coordinates of the original subject
+
+    Examples:
+        >>> from camlhmp.prefilter import restore_subject_coordinates
+        >>> blast_stdout = restore_subject_coordinates(blast_stdout, windows)
+    """
+    covered = {}
+    for result in results:
+        if result["sseqid"] not in windows:
+            continue
+        window = windows[result["sseqid"]]
+        result["sseqid"] = window["contig"]
+        result["slen"] = str(window["length"])
+        result["sstart"] = str(int(result["sstart"]) + window["offset"])
+        result["send"] = str(int(result["send"]) + window["offset"])
+        covered.setdefault((result["qseqid"], result["sseqid"]), set()).update(
+            range(int(result["qstart"]), int(result["qend"]) + 1)
+        )
+
+    for result in results:
+        key = (result["qseqid"], result["sseqid"])
+        if key in covered:
+            result["qcovs"] = str(round(100 * len(covered[key]) / int(result["qlen"])))
+    return results
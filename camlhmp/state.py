@@ -0,0 +1,163 @@
+"""
+A set of functions for recording what a run searched, so later runs can skip the search.
+"""
+import json
+import logging
+from pathlib import Path
+from typing import Union
+
+import camlhmp
+from camlhmp.engines.blast import get_subject_key
+
+# Everything in a run state that determines the hits, type definitions are not included
+STATE_KEYS = ["input", "targets", "engine", "tool", "params"]
+
+
+def get_run_state(
+    input_path: str,
+    targets_path: str,
+    framework: dict,
+    hits_tsv: str = None,
+    hits_output: str = "all",
+    hits_compression: str = "none",
+    **params,
+) -> dict:
+    """
+    Describe everything that determines the hits of a run.
+
+    The input and the framework's target set are recorded by the SHA256 of their
+    contents, so a new framework version that only changes `types`, `aliases` or
+    `excludes` produces the same state. The hits table written by the run, and which
+    of its hits it holds, are also recorded so a later run knows if it can be reused.
+
+    Args:
+        input_path (str): The input (subject) that was searched
+        targets_path (str): The targets (query) that were searched
+        framework (dict): The framework that was used
+        hits_tsv (str, optional): The hits table the run writes. Defaults to None.
+        hits_output (str, optional): The hits written to the table ('all', 'passed' or
+            'typed'). Defaults to "all".
+        hits_compression (str, optional): The compression of the hits table. Defaults
+            to "none".
+        **params: Any other settings that change the hits (e.g. min_pident, min_coverage)
+
+    Returns:
+        dict: the state of the run
+
+    Examples:
+        >>> from camlhmp.state import get_run_state
+        >>> state = get_run_state(
+        ...     input_path, targets_path, framework, hits_tsv="camlhmp.blastn.tsv.gz", min_pident=95
+        ... )
+    """
+    return {
+        "input": get_subject_key(input_path),
+        "targets": get_subject_key(targets_path),
+        "engine": framework["engine"]["type"],
+        "tool": framework["engine"]["tool"],
+        "params": params,
+        "hits": {
+            "file": Path(hits_tsv).name if hits_tsv else None,
+            "output": hits_output,
+            "compression": hits_compression,
+        },
+        "schema": framework["metadata"]["id"],
+        "schema_version": framework["metadata"]["version"],
+        "camlhmp_version": camlhmp.__version__,
+    }
+
+
+def write_run_state(state: dict, output: str):
+    """
+    Write the state of a run to a JSON file.
+
+    Args:
+        state (dict): The state from `get_run_state`
+        output (str): The output file
+
+    Examples:
+        >>> from camlhmp.state import write_run_state
+        >>> write_run_state(state, "camlhmp.state.json")
+    """
+    logging.debug(f"Writing run state to {output}")
+    with open(output, "wt") as fh:
+        json.dump(state, fh, indent=4)
+        fh.write("\n")
+
+
+def is_state_current(state_json: str, state: dict) -> bool:
+    """
+    Determine if a previous run searched the same input and targets with the same settings.
+
+    Args:
+        state_json (str): The state written by the previous run
+        state (dict): The state of the current run
+
+    Returns:
+        bool: True if the hits of the previous run can be reused
+
+    Examples:
+        >>> from camlhmp.state import is_state_current
+        >>> if is_state_current("camlhmp.state.json", state):
+        ...     print("Nothing has changed")
+    """
+    previous = _read_run_state(state_json)
+    if previous is None:
+        return False
+
+    changed = [key for key in STATE_KEYS if previous.get(key) != state[key]]
+    if changed:
+        logging.debug(f"Previous run state differs by: {', '.join(changed)}")
+        return False
+    return True
+
+
+def get_reusable_hits(state_json: str, state: dict) -> Union[str, None]:
+    """
+    Get the hits table of a previous run, if it can be reused by the current run.
+
+    Hits can only be reused if the state is current and the previous run wrote all of
+    its hits. The table is read from where the previous run wrote it, so a run with a
+    different `--hits-compression` can still reuse it.
+
+    Args:
+        state_json (str): The state written by the previous run
+        state (dict): The state of the current run
+
+    Returns:
+        str: the path to the hits table of the previous run, or None if it cannot be reused
+
+    Examples:
+        >>> from camlhmp.state import get_reusable_hits
+        >>> hits_tsv = get_reusable_hits("camlhmp.state.json", state)
+        >>> if hits_tsv:
+        ...     hits, blast_stdout = read_blast_hits(hits_tsv)
+    """
+    if not is_state_current(state_json, state):
+        return None
+
+    # States written before the hits were recorded cannot be trusted to hold all hits
+    hits = _read_run_state(state_json).get("hits") or {}
+    if hits.get("output") != "all" or not hits.get("file"):
+        logging.debug(f"Previous run only wrote {hits.get('output', 'some')} hits, they cannot be reused")
+        return None
+
+    hits_tsv = Path(state_json).parent / hits["file"]
+    if not hits_tsv.exists():
+        logging.debug(f"Previous hits are missing: {hits_tsv}")
+        return None
+    return str(hits_tsv)
+
+
+def _read_run_state(state_json: str) -> Union[dict, None]:
+    """Read a previous run state, or None if there is no readable state"""
+    if not Path(state_json).exists():
+        logging.debug(f"No previous run state found at {state_json}")
+        return None
+
+    with open(state_json, "rt") as fh:
+        try:
+            return json.load(fh)
+        except json.JSONDecodeError:
+            logging.debug(f"Unable to read previous run state from {state_json}")
+            return None
@@ -0,0 +1,254 @@
+"""
+A set of functions for recording runs in a SQLite database, to query results across samples.
+"""
+import logging
+import sqlite3
+import time
+from pathlib import Path
+
+STORE_MODES = ["targets", "regions", "alleles"]
+
+# Seconds to wait on a database another sample is writing to
+BUSY_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    sample TEXT NOT NULL,
+    schema TEXT NOT NULL,
+    schema_version TEXT NOT NULL,
+    camlhmp_version TEXT,
+    mode TEXT NOT NULL,
+    params TEXT,
+    type TEXT,
+    comment TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS types (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    type TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    targets TEXT,
+    missing TEXT,
+    comment TEXT
+);
+CREATE TABLE IF NOT EXISTS targets (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    target TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    coverage REAL,
+    pident REAL,
+    allele TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_sample ON runs(sample);
+CREATE INDEX IF NOT EXISTS runs_schema ON runs(schema, schema_version);
+CREATE INDEX IF NOT EXISTS runs_type ON runs(type);
+CREATE INDEX IF NOT EXISTS types_type ON types(type, status, run_id);
+CREATE INDEX IF NOT EXISTS targets_target ON targets(target, status, run_id);
+CREATE INDEX IF NOT EXISTS types_run ON types(run_id);
+CREATE INDEX IF NOT EXISTS targets_run ON targets(run_id);
+"""
+
+RUN_COLS = ["sample", "schema", "schema_version", "camlhmp_version", "mode", "params", "type", "comment"]
+TYPE_COLS = ["type", "status", "targets", "missing", "comment"]
+TARGET_COLS = ["target", "status", "coverage", "pident", "allele"]
+
+
+def open_store(db: str, readonly: bool = False) -> sqlite3.Connection:
+    """
+    Open a results database, creating its tables and indexes if needed.
+
+    The database uses write-ahead logging, so many samples can record their runs while
+    others query it. A read-only connection leaves the database as it is, so queries never
+    change its journal mode or tables.
+
+    Args:
+        db (str): The SQLite database
+        readonly (bool, optional): Only open the database for queries. Defaults to False.
+
+    Returns:
+        sqlite3.Connection: the connection to the database
+
+    Examples:
+        >>> from camlhmp.store import open_store
+        >>> conn = open_store("camlhmp.sqlite")
+    """
+    if readonly:
+        conn = sqlite3.connect(f"{Path(db).resolve().as_uri()}?mode=ro", timeout=BUSY_TIMEOUT, uri=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    conn = sqlite3.connect(db, timeout=BUSY_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def get_target_rows(mode: str, target_results: dict, min_coverage: int = 0) -> list:
+    """
+    Convert the per-target results of a run into rows of the `targets` table.
+
+    Args:
+        mode (str): How the framework was evaluated ('targets', 'regions' or 'alleles')
+        target_results (dict): The per-target results (e.g. from `get_blast_target_hits`)
+        min_coverage (int, optional): The minimum coverage of a region. Defaults to 0.
+
+    Returns:
+        list: a dict for each target with the columns in `TARGET_COLS`
+
+    Raises:
+        ValueError: if the mode is unknown
+
+    Examples:
+        >>> from camlhmp.store import get_target_rows
+        >>> target_rows = get_target_rows("targets", target_results)
+    """
+    rows = []
+    for target, vals in target_results.items():
+        if mode == "targets":
+            rows.append({"target": target, "status": bool(vals), "coverage": None, "pident": None, "allele": None})
+        elif mode == "regions":
+            rows.append(
+                {
+                    "target": target,
+                    "status": vals["coverage"] >= min_coverage,
+                    "coverage": vals["coverage"],
+                    "pident": None,
+                    "allele": None,
+                }
+            )
+        elif mode == "alleles":
+            rows.append(
+                {
+                    "target": target,
+                    "status": vals["id"] != "-",
+                    "coverage": float(vals["qcovs"]),
+                    "pident": float(vals["pident"]),
+                    "allele": vals["id"],
+                }
+            )
+        else:
+            raise ValueError(f"Unknown mode ('{mode}'), expected one of: {STORE_MODES}")
+    return rows
+
+
+def add_run(conn: sqlite3.Connection, run: dict, type_rows: list, target_rows: list) -> int:
+    """
+    Record a run, and its per-type and per-target results, in a single transaction.
+
+    Args:
+        conn (sqlite3.Connection): The connection from `open_store`
+        run (dict): The run, with the columns in `RUN_COLS` (e.g. the final result plus 'mode')
+        type_rows (list): The results against each type (e.g. the details rows)
+        target_rows (list): The results of each target (e.g. from `get_target_rows`)
+
+    Returns:
+        int: the ID of the run
+
+    Examples:
+        >>> from camlhmp.store import add_run
+        >>> run_id = add_run(conn, {**final_result, "mode": "targets"}, final_details, target_rows)
+    """
+    with conn:
+        cursor = conn.execute(
+            f"INSERT INTO runs ({', '.join(RUN_COLS)}, created) VALUES ({', '.join('?' * len(RUN_COLS))}, ?)",
+            [run.get(col) for col in RUN_COLS] + [time.time()],
+        )
+        run_id = cursor.lastrowid
+        conn.executemany(
+            f"INSERT INTO types (run_id, {', '.join(TYPE_COLS)}) VALUES (?, {', '.join('?' * len(TYPE_COLS))})",
+            [[run_id] + [row.get(col) for col in TYPE_COLS] for row in type_rows],
+        )
+        conn.executemany(
+            f"INSERT INTO targets (run_id, {', '.join(TARGET_COLS)}) VALUES (?, {', '.join('?' * len(TARGET_COLS))})",
+            [[run_id] + [row.get(col) for col in TARGET_COLS] for row in target_rows],
+        )
+    logging.debug(f"Recorded run {run_id} ({run['sample']}) with {len(target_rows)} targets")
+    return run_id
+
+
+def store_run(db: str, run: dict, type_rows: list, target_rows: list) -> int:
+    """
+    Open a results database and record a run in it.
+
+    Args:
+        db (str): The SQLite database
+        run (dict): The run, with the columns in `RUN_COLS`
+        type_rows (list): The results against each type
+        target_rows (list): The results of each target
+
+    Returns:
+        int: the ID of the run
+
+    Examples:
+        >>> from camlhmp.store import store_run
+        >>> store_run("camlhmp.sqlite", {**final_result, "mode": "targets"}, final_details, target_rows)
+    """
+    conn = open_store(db)
+    try:
+        return add_run(conn, run, type_rows, target_rows)
+    finally:
+        conn.close()
+
+
+def query_runs(
+    conn: sqlite3.Connection,
+    has: list = None,
+    lacks: list = None,
+    types: list = None,
+    not_types: list = None,
+    schema: str = None,
+    latest: bool = True,
+) -> list:
+    """
+    Find the runs matching a set of conditions.
+
+    Args:
+        conn (sqlite3.Connection): The connection from `open_store`
+        has (list, optional): Targets that must have been found. Defaults to None.
+        lacks (list, optional): Targets that must not have been found. Defaults to None.
+        types (list, optional): Only runs matching any of these types. Defaults to None.
+        not_types (list, optional): Only runs matching none of these types. Defaults to None.
+        schema (str, optional): Only runs of this schema ID. Defaults to None.
+        latest (bool, optional): Only the latest run of each sample and schema. Defaults to True.
+
+    Returns:
+        list: a dict for each matching run
+
+    Examples:
+        >>> from camlhmp.store import query_runs
+        >>> runs = query_runs(conn, has=["ccrA2"], lacks=["mecA"])
+    """
+    conditions = []
+    values = []
+    for target in has or []:
+        conditions.append("EXISTS (SELECT 1 FROM targets t WHERE t.run_id = r.id AND t.target = ? AND t.status = 1)")
+        values.append(target)
+    for target in lacks or []:
+        conditions.append("NOT EXISTS (SELECT 1 FROM targets t WHERE t.run_id = r.id AND t.target = ? AND t.status = 1)")
+        values.append(target)
+    if types:
+        conditions.append(
+            f"(r.type IN ({', '.join('?' * len(types))}) OR EXISTS (SELECT 1 FROM types y WHERE y.run_id = r.id "
+            f"AND y.status = 1 AND y.type IN ({', '.join('?' * len(types))})))"
+        )
+        values.extend(types + types)
+    for type in not_types or []:
+        conditions.append(
+            "r.type != ? AND NOT EXISTS (SELECT 1 FROM types y WHERE y.run_id = r.id AND y.type = ? AND y.status = 1)"
+        )
+        values.extend([type, type])
+    if schema:
+        conditions.append("r.schema = ?")
+        values.append(schema)
+    if latest:
+        conditions.append(
+            "r.id = (SELECT MAX(l.id) FROM runs l WHERE l.sample = r.sample AND l.schema = r.schema)"
+        )
+
+    sql = f"SELECT r.* FROM runs r {'WHERE ' + ' AND '.join(conditions) if conditions else ''} ORDER BY r.sample, r.id"
+    logging.debug(f"Query: {sql} {values}")
+    return [dict(row) for row in conn.execute(sql, values)]
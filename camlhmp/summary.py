@@ -0,0 +1,222 @@
+"""
+A set of functions for aggregating the results of many samples into a single TSV.
+"""
+import csv
+import fcntl
+import io
+import logging
+import os
+from pathlib import Path
+
+from camlhmp.utils import compress_bytes, get_output_compression, open_seqfile
+
+SUMMARY_MODES = ["targets", "regions", "alleles"]
+
+# Rows written to a summary before they are flushed to disk
+BUFFER_SIZE = 10000
+
+RESULT_COLS = {
+    "targets": [
+        "sample",
+        "type",
+        "targets",
+        "schema",
+        "schema_version",
+        "camlhmp_version",
+        "params",
+        "comment",
+    ],
+    "regions": [
+        "sample",
+        "type",
+        "targets",
+        "coverage",
+        "hits",
+        "schema",
+        "schema_version",
+        "camlhmp_version",
+        "params",
+        "comment",
+    ],
+    "alleles": [
+        "sample",
+        "schema",
+        "schema_version",
+        "camlhmp_version",
+        "params",
+    ],
+}
+
+DETAILS_COLS = {
+    "targets": [
+        "sample",
+        "type",
+        "status",
+        "targets",
+        "missing",
+        "schema",
+        "schema_version",
+        "camlhmp_version",
+        "params",
+        "comment",
+    ],
+    "regions": [
+        "sample",
+        "type",
+        "status",
+        "targets",
+        "missing",
+        "coverage",
+        "hits",
+        "schema",
+        "schema_version",
+        "camlhmp_version",
+        "params",
+        "comment",
+    ],
+}
+
+ALLELE_COLS = ["id", "pident", "qcovs", "bitscore", "comment"]
+
+
+def get_summary_columns(framework: dict, mode: str, details: bool = False) -> list:
+    """
+    Get the columns of a summary, based on the framework rather than any one sample.
+
+    Args:
+        framework (dict): The parsed YAML framework
+        mode (str): How the framework is evaluated ('targets', 'regions' or 'alleles')
+        details (bool, optional): Get the columns of the per-type details. Defaults to False.
+
+    Returns:
+        list: the columns of the summary
+
+    Raises:
+        ValueError: if the mode is unknown, or has no details
+
+    Examples:
+        >>> from camlhmp.summary import get_summary_columns
+        >>> columns = get_summary_columns(framework, "targets")
+    """
+    if mode not in SUMMARY_MODES:
+        raise ValueError(f"Unknown mode ('{mode}'), expected one of: {SUMMARY_MODES}")
+
+    if details:
+        if mode not in DETAILS_COLS:
+            raise ValueError(f"Details are not available for {mode}")
+        return list(DETAILS_COLS[mode])
+
+    columns = list(RESULT_COLS[mode])
+    if mode == "alleles":
+        for target in framework["targets"]:
+            columns.extend(f"{target}_{col}" for col in ALLELE_COLS)
+    return columns
+
+
+def _read_header(tsv: str) -> list:
+    """Read the header of an existing (optionally compressed) summary"""
+    with io.TextIOWrapper(open_seqfile(tsv), newline="") as text:
+        return next(csv.reader(text, delimiter="\t"), [])
+
+
+def append_summary(rows: list, output: str, columns: list):
+    """
+    Append rows to a summary TSV, writing the header only if the file is new.
+
+    The file is locked while rows are appended, so multiple samples can safely append to
+    the same summary at the same time. Summaries ending in `.gz` or `.zst` are compressed,
+    each call appends a new gzip member or zstd frame.
+
+    Args:
+        rows (list): The rows (dicts) to append, if empty only the header is written
+        output (str): The summary TSV
+        columns (list): The columns of the summary (e.g. from `get_summary_columns`)
+
+    Raises:
+        ValueError: if the summary already exists with different columns, a row has a
+            column not in the summary, or the summary has an unsupported compression
+
+    Examples:
+        >>> from camlhmp.summary import append_summary
+        >>> append_summary([final_result], "all-samples.tsv.gz", columns)
+    """
+    compression = get_output_compression(output)
+    with open(output, "ab") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            text = io.StringIO()
+            writer = csv.DictWriter(text, delimiter="\t", fieldnames=columns, restval="")
+            # The position is taken when the file is opened, check the size now it is locked
+            if os.fstat(fh.fileno()).st_size == 0:
+                writer.writeheader()
+            else:
+                header = _read_header(output)
+                if header != columns:
+                    raise ValueError(f"Columns of {output} do not match, expected: {columns}")
+            writer.writerows(rows)
+
+            data = text.getvalue().encode()
+            if data:
+                fh.write(compress_bytes(data, compression))
+                fh.flush()
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+    logging.debug(f"Appended {len(rows)} rows to {output}")
+
+
+def merge_summaries(inputs: list, output: str, buffer_size: int = BUFFER_SIZE) -> int:
+    """
+    Merge existing TSVs (e.g. each sample's `{prefix}.tsv`) into a single summary.
+
+    Inputs are streamed in a single pass and rows are written in batches. The header is
+    taken from the first input (or the existing summary when appending) and every other
+    input must share it.
+
+    Args:
+        inputs (list): The TSVs to merge, optionally compressed
+        output (str): The summary TSV (compressed if ending in `.gz` or `.zst`)
+        buffer_size (int, optional): Rows to hold before appending them to the summary.
+            Defaults to 10000.
+
+    Returns:
+        int: the number of rows merged
+
+    Raises:
+        ValueError: if an input has columns that differ from the summary, or the summary
+            has an unsupported compression
+
+    Examples:
+        >>> from camlhmp.summary import merge_summaries
+        >>> total = merge_summaries(Path("results").glob("*/*.tsv"), "all-samples.tsv.gz")
+    """
+    # Fail before reading any inputs
+    get_output_compression(output)
+    columns = None
+    if Path(output).exists() and Path(output).stat().st_size:
+        columns = _read_header(output)
+
+    total = 0
+    buffer = []
+    for tsv in inputs:
+        with io.TextIOWrapper(open_seqfile(tsv), newline="") as fh:
+            reader = csv.DictReader(fh, delimiter="\t")
+            if reader.fieldnames is None:
+                logging.debug(f"Skipping empty file: {tsv}")
+                continue
+            if columns is None:
+                columns = list(reader.fieldnames)
+            elif reader.fieldnames != columns:
+                raise ValueError(f"Columns of {tsv} do not match, expected: {columns}")
+
+            for row in reader:
+                buffer.append(row)
+                if len(buffer) >= buffer_size:
+                    append_summary(buffer, output, columns)
+                    total += len(buffer)
+                    buffer = []
+
+    if columns is not None:
+        # Also writes the header when every input was header only (e.g. no hits)
+        append_summary(buffer, output, columns)
+        total += len(buffer)
+    return total
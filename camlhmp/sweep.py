@@ -0,0 +1,232 @@
+"""
+A set of functions for evaluating a framework across a grid of thresholds.
+"""
+import logging
+
+import numpy as np
+
+import camlhmp
+from camlhmp.engines.blast import get_blastn_tasks
+from camlhmp.framework import check_regions, check_types, get_types
+from camlhmp.parsers.blast import (finalize_regions, finalize_targets,
+                                   get_blast_allele_hits,
+                                   get_blast_region_hits,
+                                   get_blast_target_hits)
+
+SWEEP_MODES = ["targets", "regions", "alleles"]
+
+
+def parse_grid(values: str) -> list:
+    """
+    Parse a grid of thresholds.
+
+    Args:
+        values (str): Comma separated values (e.g. '90,95,99') or a 'start:stop:step' range
+            (inclusive of stop)
+
+    Returns:
+        list: the sorted, unique thresholds
+
+    Raises:
+        ValueError: if the grid could not be parsed
+
+    Examples:
+        >>> from camlhmp.sweep import parse_grid
+        >>> parse_grid("90:100:5")
+        [90, 95, 100]
+    """
+    try:
+        if ":" in values:
+            start, stop, step = [float(val) for val in values.split(":")]
+            grid = np.arange(start, stop + step / 2, step).round(6).tolist()
+        else:
+            grid = [float(val) for val in values.split(",") if val.strip()]
+    except ValueError:
+        raise ValueError(f"Unable to parse threshold grid ('{values}'), expected '90,95,99' or '90:100:1'")
+
+    if not grid:
+        raise ValueError(f"Threshold grid ('{values}') is empty")
+    return sorted(set(int(val) if float(val).is_integer() else val for val in grid))
+
+
+def get_task_groups(query: str, pidents: list, task: str = "auto") -> list:
+    """
+    Group a grid of identities by the blastn tasks they would be searched with.
+
+    Tasks are selected by the identity of each grid point (e.g. dc-megablast below 90%),
+    so each group can be searched once, at its lowest identity, and swept at every
+    identity in the group.
+
+    Args:
+        query (str): The query file (targets)
+        pidents (list): The minimum percent identities of the grid
+        task (str, optional): A task for every target, or 'auto' to select one by the
+            length of each target and identity. Defaults to "auto".
+
+    Returns:
+        list: the tasks {target: task} and the sorted identities of each group, from the
+            lowest identity
+
+    Examples:
+        >>> from camlhmp.sweep import get_task_groups
+        >>> get_task_groups(targets_path, [85, 90, 95])
+        [[{'mecA': 'dc-megablast'}, [85]], [{'mecA': 'megablast'}, [90, 95]]]
+    """
+    groups = []
+    for min_pident in sorted(pidents):
+        tasks = get_blastn_tasks(query, min_pident, task=task)
+        if groups and groups[-1][0] == tasks:
+            groups[-1][1].append(min_pident)
+        else:
+            groups.append([tasks, [min_pident]])
+    return groups
+
+
+def get_hit_masks(results: list, pidents: list, coverages: list, tool: str = "blastn") -> dict:
+    """
+    Build a hit mask for each combination of thresholds, filtering as BLAST+ would have.
+
+    Args:
+        results (list): The hits (with `BLASTN_COLS` columns) from the loosest search
+        pidents (list): The minimum percent identities
+        coverages (list): The minimum percent coverages (per HSP)
+        tool (str, optional): The tool that produced the hits. Defaults to "blastn".
+
+    Returns:
+        dict: a boolean mask of the passing hits for each (min_pident, min_coverage)
+
+    Examples:
+        >>> from camlhmp.sweep import get_hit_masks
+        >>> masks = get_hit_masks(blast_stdout, [90, 95], [80, 90])
+    """
+    # NO_HITS rows are given values that never pass
+    is_hit = np.array([result["qseqid"] != "NO_HITS" for result in results], dtype=bool)
+    pident = np.array([float(r["pident"]) if hit else -1 for r, hit in zip(results, is_hit)])
+    qstart = np.array([int(r["qstart"]) if hit else 1 for r, hit in zip(results, is_hit)])
+    qend = np.array([int(r["qend"]) if hit else 0 for r, hit in zip(results, is_hit)])
+    qlen = np.array([int(r["qlen"]) if hit else 1 for r, hit in zip(results, is_hit)])
+    coverage = 100 * (qend - qstart + 1) / qlen
+
+    masks = {}
+    for min_pident in pidents:
+        # Only blastn applies -perc_identity during the search
+        pident_mask = is_hit & (pident >= min_pident) if tool == "blastn" else is_hit
+        for min_coverage in coverages:
+            masks[(min_pident, min_coverage)] = pident_mask & (coverage >= min_coverage)
+    return masks
+
+
+def sweep_thresholds(
+    prefix: str,
+    framework: dict,
+    results: list,
+    pidents: list,
+    coverages: list,
+    mode: str = "targets",
+    target_lengths: dict = None,
+) -> list:
+    """
+    Evaluate a framework at every combination of thresholds using hits from one search.
+
+    The search should have been run at the loosest thresholds of the grid (or with no
+    thresholds for regions). Each grid point masks the hits as the search would have at
+    those thresholds, then the framework is evaluated as usual. Samples whose type call
+    differs across the grid are flagged with `type_changed`.
+
+    Args:
+        prefix (str): The sample prefix
+        framework (dict): The framework schema to evaluate
+        results (list): The hits (with `BLASTN_COLS` columns) from the loosest search
+        pidents (list): The minimum percent identities to evaluate
+        coverages (list): The minimum percent coverages to evaluate
+        mode (str, optional): One of 'targets', 'regions' or 'alleles'. Defaults to "targets".
+        target_lengths (dict, optional): The length of each target, required for regions.
+            Defaults to None.
+
+    Returns:
+        list: a result for each combination of thresholds (long format)
+
+    Raises:
+        ValueError: if the mode is not supported or target lengths are missing for regions
+
+    Examples:
+        >>> from camlhmp.sweep import sweep_thresholds
+        >>> sweep = sweep_thresholds(prefix, framework, blast_stdout, [90, 95], [80, 90])
+    """
+    if mode not in SWEEP_MODES:
+        raise ValueError(f"Unsupported sweep mode ('{mode}'), expected one of: {', '.join(SWEEP_MODES)}")
+    elif mode == "regions" and target_lengths is None:
+        raise ValueError("Target lengths are required to sweep a regions framework")
+
+    types = get_types(framework) if mode != "alleles" else None
+    if mode == "regions":
+        # Regions are searched without thresholds, coverage is across all hits
+        masks = get_hit_masks(results, pidents, [0])
+    else:
+        masks = get_hit_masks(results, pidents, coverages, framework["engine"]["tool"])
+
+    sweep = []
+    for min_pident in pidents:
+        for min_coverage in coverages:
+            mask = masks[(min_pident, 0 if mode == "regions" else min_coverage)]
+            passed = [result for result, keep in zip(results, mask) if keep]
+
+            if mode == "targets":
+                target_results = get_blast_target_hits(framework["targets"], [hit["qseqid"] for hit in passed])
+                final_result, _ = finalize_targets(
+                    prefix, target_results, check_types(types, target_results), framework, min_pident, min_coverage
+                )
+            elif mode == "regions":
+                target_results = get_blast_region_hits(target_lengths, passed, min_pident, min_coverage)
+                final_result, _ = finalize_regions(
+                    prefix, check_regions(types, target_results, min_coverage), framework, min_pident, min_coverage
+                )
+            else:
+                allele_hits = get_blast_allele_hits(framework["targets"], passed, min_pident, min_coverage)
+                final_result = {
+                    "type": ";".join(f"{target}:{vals['id']}" for target, vals in allele_hits.items()),
+                    "targets": ",".join(target for target, vals in allele_hits.items() if vals["id"] != "-"),
+                    "comment": ";".join(
+                        f"{target}:{vals['comment']}" for target, vals in allele_hits.items() if vals["comment"]
+                    ),
+                }
+
+            sweep.append(
+                {
+                    "sample": prefix,
+                    "min_pident": min_pident,
+                    "min_coverage": min_coverage,
+                    "type": final_result["type"],
+                    "targets": final_result["targets"],
+                    "schema": framework["metadata"]["id"],
+                    "schema_version": framework["metadata"]["version"],
+                    "camlhmp_version": camlhmp.__version__,
+                    "type_changed": False,
+                    "comment": final_result["comment"],
+                }
+            )
+
+    return flag_type_changes(prefix, sweep)
+
+
+def flag_type_changes(prefix: str, sweep: list) -> list:
+    """
+    Flag every result of a sweep if the type called differs across the grid.
+
+    Args:
+        prefix (str): The sample prefix
+        sweep (list): The results of each combination of thresholds (from `sweep_thresholds`)
+
+    Returns:
+        list: the results, with `type_changed` set
+
+    Examples:
+        >>> from camlhmp.sweep import flag_type_changes
+        >>> sweep = flag_type_changes(prefix, low_identity + high_identity)
+    """
+    calls = set(row["type"] for row in sweep)
+    if len(calls) > 1:
+        logging.debug(f"Type calls for {prefix} changed across the grid: {calls}")
+    for row in sweep:
+        row["type_changed"] = len(calls) > 1
+    return sweep
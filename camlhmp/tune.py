@@ -0,0 +1,233 @@
+"""
+A set of functions for finding the fastest engine parameters that do not change the results
+of a framework.
+
+A validation set of samples is typed once with only the framework's thresholds (the
+baseline), then with each candidate set of engine parameters. Candidates that change the
+type, targets (or alleles) of any sample are rejected, and the fastest of the rest is kept.
+"""
+import itertools
+import logging
+from typing import Union
+
+from camlhmp.classifier import Classifier
+from camlhmp.concordance import (classify_samples, get_baseline_framework,
+                                 get_discordance)
+from camlhmp.engines import get_engine
+from camlhmp.engines.blast import HIT_LIMIT_PARAMS
+from camlhmp.framework import read_framework
+from camlhmp.utils import validate_file
+
+TUNE_COLS = [
+    "candidate",
+    "params",
+    "time",
+    "speedup",
+    "discordant",
+    "discordance",
+    "selected",
+]
+
+# Larger words seed fewer alignments, the defaults are 28 (megablast) and 3 (proteins)
+TUNE_WORD_SIZES = {
+    "blastn": [32, 48, 64],
+    "tblastn": [4, 5, 6],
+    "blastp": [4, 5, 6],
+}
+
+# Candidates must beat the baseline by at least this much, to not be picked on timing noise
+TUNE_MIN_SPEEDUP = 1.05
+
+TUNE_HIT_LIMITS = [
+    {"max_hsps": 1},
+    {"max_target_seqs": 1, "max_hsps": 1},
+]
+
+
+def format_engine_params(params: dict) -> str:
+    """
+    Format engine parameters to be reported.
+
+    Args:
+        params (dict): the engine parameters
+
+    Returns:
+        str: the sorted parameters as 'KEY=VALUE' separated by ';', or '-' if there are none
+
+    Examples:
+        >>> from camlhmp.tune import format_engine_params
+        >>> format_engine_params({"word_size": 32, "max_hsps": 1})
+        'max_hsps=1;word_size=32'
+    """
+    return ";".join(f"{key}={val}" for key, val in sorted(params.items())) if params else "-"
+
+
+def get_tune_candidates(engine: str, tool: str, mode: str = "targets", word_sizes: list = None) -> dict:
+    """
+    Get the candidate engine parameters to benchmark.
+
+    Candidates are the engine's presets and, for BLAST+, each combination of a larger word
+    size and limits on the hits reported. Hit limits are not used for regions, as coverage
+    of a region is summed across all its hits.
+
+    Args:
+        engine (str): the engine of the framework
+        tool (str): the tool of the framework
+        mode (str, optional): How the framework is evaluated ('targets', 'regions' or
+            'alleles'). Defaults to "targets".
+        word_sizes (list, optional): The word sizes to try. Defaults to those in
+            `TUNE_WORD_SIZES` for the tool.
+
+    Returns:
+        dict: the validated parameters of each candidate {name: params}
+
+    Raises:
+        ValueError: if the engine has no parameters to tune
+
+    Examples:
+        >>> from camlhmp.tune import get_tune_candidates
+        >>> candidates = get_tune_candidates("blast", "blastn")
+    """
+    engine = get_engine(engine)
+    candidates = dict(engine.presets)
+    if engine.name == "blast":
+        word_sizes = TUNE_WORD_SIZES.get(tool, []) if word_sizes is None else word_sizes
+        for word_size, hit_limit in itertools.product([None] + list(word_sizes), [{}] + TUNE_HIT_LIMITS):
+            params = {**hit_limit, "word_size": word_size} if word_size else dict(hit_limit)
+            if params:
+                candidates[format_engine_params(params)] = params
+
+    # Skip candidates the tool does not support, and any that would be tried twice
+    tried = {}
+    for name, params in candidates.items():
+        if mode == "regions" and any(param in params for param in HIT_LIMIT_PARAMS):
+            continue
+        try:
+            params = engine.validate_params(tool, dict(params))
+        except ValueError as e:
+            logging.debug(f"Skipping candidate {name}: {e}")
+            continue
+        if params not in tried.values():
+            tried[name] = params
+
+    if not tried:
+        raise ValueError(f"Engine {engine.name} has no parameters to tune for {tool}")
+    return tried
+
+
+def tune_engine_params(
+    framework: Union[str, dict],
+    targets: str,
+    samples: dict,
+    mode: str = "targets",
+    candidates: dict = None,
+    min_pident: float = None,
+    min_coverage: int = None,
+    min_speedup: float = TUNE_MIN_SPEEDUP,
+) -> list:
+    """
+    Benchmark candidate engine parameters against the baseline on a validation set.
+
+    Args:
+        framework (str|dict): The framework YAML file, or an already parsed framework
+        targets (str): The targets in FASTA format
+        samples (dict): The file of each sample {name: path}
+        mode (str, optional): How the framework is evaluated ('targets', 'regions' or
+            'alleles'). Defaults to "targets".
+        candidates (dict, optional): The parameters of each candidate {name: params}.
+            Defaults to those from `get_tune_candidates`.
+        min_pident (float, optional): The minimum percent identity to count a hit.
+            Defaults to the framework's params, or 95.
+        min_coverage (int, optional): The minimum percent coverage to count a hit.
+            Defaults to the framework's params, or 95.
+        min_speedup (float, optional): How much faster than the baseline the selected
+            candidate must be. Defaults to `TUNE_MIN_SPEEDUP`.
+
+    Returns:
+        list: a dict for the baseline and each candidate with the columns in `TUNE_COLS`,
+            plus its `engine_params`
+
+    Raises:
+        ValueError: if a candidate parameter is not supported by the engine
+
+    Examples:
+        >>> from camlhmp.tune import tune_engine_params, get_tuned_params
+        >>> rows = tune_engine_params("sccmec.yaml", "sccmec.fasta", samples)
+        >>> tuned = get_tuned_params(rows)
+    """
+    framework = read_framework(validate_file(framework)) if not isinstance(framework, dict) else framework
+    baseline_framework = get_baseline_framework(framework)
+    if candidates is None:
+        candidates = get_tune_candidates(framework["engine"]["type"], framework["engine"]["tool"], mode=mode)
+    thresholds = {"min_pident": min_pident, "min_coverage": min_coverage}
+
+    logging.debug(f"Typing {len(samples)} samples with the baseline")
+    baseline_results = classify_samples(Classifier(baseline_framework, targets, mode=mode, **thresholds), samples)
+    baseline_time = sum(seconds for _, seconds in baseline_results.values())
+    rows = [
+        {
+            "candidate": "baseline",
+            "params": "-",
+            "time": round(baseline_time, 3),
+            "speedup": 1.0,
+            "discordant": 0,
+            "discordance": "",
+            "selected": False,
+            "engine_params": {},
+        }
+    ]
+
+    for name, params in candidates.items():
+        logging.debug(f"Typing {len(samples)} samples with {name} ({params})")
+        classifier = Classifier(baseline_framework, targets, mode=mode, params=params, **thresholds)
+        results = classify_samples(classifier, samples)
+        seconds = sum(seconds for _, seconds in results.values())
+
+        discordance = []
+        for sample, (result, _) in results.items():
+            changed = get_discordance(mode, baseline_results[sample][0], result, framework["targets"])
+            if changed:
+                discordance.append(f"{sample}:{','.join(changed)}")
+        rows.append(
+            {
+                "candidate": name,
+                "params": format_engine_params(params),
+                "time": round(seconds, 3),
+                "speedup": round(baseline_time / seconds, 2) if seconds else 0.0,
+                "discordant": len(discordance),
+                "discordance": ";".join(discordance),
+                "selected": False,
+                "engine_params": params,
+            }
+        )
+
+    tuned = get_tuned_params(rows, min_speedup=min_speedup)
+    for row in rows:
+        row["selected"] = row is tuned
+    return rows
+
+
+def get_tuned_params(rows: list, min_speedup: float = TUNE_MIN_SPEEDUP) -> Union[dict, None]:
+    """
+    Get the fastest candidate that is concordant with, and faster than, the baseline.
+
+    Args:
+        rows (list): The baseline and candidates (e.g. from `tune_engine_params`)
+        min_speedup (float, optional): How much faster than the baseline the candidate must
+            be. Defaults to `TUNE_MIN_SPEEDUP`.
+
+    Returns:
+        dict: the row of the fastest concordant candidate, or None if none beat the baseline
+
+    Examples:
+        >>> from camlhmp.tune import get_tuned_params
+        >>> tuned = get_tuned_params(rows)
+        >>> tuned["engine_params"]
+        {'max_hsps': 1, 'word_size': 32}
+    """
+    baseline = next(row for row in rows if row["candidate"] == "baseline")
+    concordant = [
+        row for row in rows
+        if row["candidate"] != "baseline" and not row["discordant"] and row["time"] * min_speedup < baseline["time"]
+    ]
+    return min(concordant, key=lambda row: row["time"]) if concordant else None
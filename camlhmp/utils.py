@@ -1,73 +1,388 @@
+import bz2
 import csv
+import gzip
 import logging
+import lzma
+import os
+import signal
 import string
+import subprocess
 import sys
+import threading
+import time
+import warnings
+from contextlib import contextmanager
 from pathlib import Path
-from shutil import which
+from shutil import disk_usage, which
 from sys import platform
-from typing import Union
+from typing import TYPE_CHECKING, Union
 
 import yaml
-from Bio import SeqIO
-from executor import ExternalCommand, ExternalCommandFailed
 from rich import print
 
+from camlhmp.faidx import get_seq_lengths
+
+if TYPE_CHECKING:
+    from Bio.SeqRecord import SeqRecord
+
+# Bytes read at a time when streaming FASTA files
+READ_SIZE = 1024 * 1024
+
+
+def _import_zstandard():
+    """Import the optional `zstandard`, only when zstd compression is needed"""
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "zstd compression requires zstandard, please install it (e.g. `pip install camlhmp[zstd]`)"
+        ) from e
+    return zstandard
+
+
+def _zstd_open(filename: str, mode: str = "rb"):
+    """Open a zstd compressed file, reading every frame (e.g. of an appended summary)"""
+    zstandard = _import_zstandard()
+    if mode == "rb":
+        return zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), read_across_frames=True, closefd=True)
+    return zstandard.open(filename, mode)
+
+
+# Magic bytes of the compression formats that can be read
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b": gzip.open,
+    b"BZh": bz2.open,
+    b"\xfd7zXZ\x00": lzma.open,
+    b"\x28\xb5\x2f\xfd": _zstd_open,
+}
+
+# File extensions of the compression formats that can be written
+COMPRESSION_EXTENSIONS = {
+    "none": "",
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+# File extensions of compression formats that can be read, but not written
+READ_ONLY_EXTENSIONS = [".bz2", ".xz"]
+
+# Characters of a command's stdout and stderr written to the log
+LOG_OUTPUT_LIMIT = 2000
+
+# Seconds a timed out command has to exit after SIGTERM, before it is killed
+KILL_GRACE = 5
+
+# Memory backed filesystem for temporary files that cannot be avoided
+TMPFS_DIR = "/dev/shm"
+
+# Set to 1 to always use TMPFS_DIR for temporary files, or 0 to never use it
+TMPFS_ENV = "CAML_TMPFS"
+
+# Free bytes TMPFS_DIR needs to be used when not requested (containers often limit it to 64 MB)
+TMPFS_MIN_FREE = 1024**3
+
+
+class CommandError(subprocess.CalledProcessError):
+    """
+    An external command failed or timed out.
+
+    Batch runs can catch this to retry or skip a sample, it is a `CalledProcessError` so
+    existing handlers still apply.
+
+    Attributes:
+        cmd (str): The command that was executed
+        returncode (int): The exit code (negative if killed by a signal)
+        stdout (str): The captured stdout
+        stderr (str): The captured stderr
+        timed_out (bool): If the command was killed for exceeding its timeout
+        usage (dict): The resources used by the command (see `run_command`)
+    """
+
+    def __init__(
+        self, returncode: int, cmd: str, stdout: str = "", stderr: str = "", timed_out: bool = False, usage=None
+    ):
+        super().__init__(returncode, cmd, output=stdout, stderr=stderr)
+        self.timed_out = timed_out
+        self.usage = usage or {}
+
+    def __str__(self):
+        reason = f"timed out after {self.usage.get('wall_time', 0):.1f}s" if self.timed_out else f"exit code {self.returncode}"
+        message = f"Command failed ({reason}): {self.cmd}"
+        if self.stderr:
+            message += f"\n{_truncate(self.stderr)}"
+        return message
+
+
+def _truncate(text: str, limit: int = LOG_OUTPUT_LIMIT) -> str:
+    """Keep the end of long output, which is usually where errors are"""
+    if len(text) <= limit:
+        return text
+    return f"[{len(text) - limit} characters truncated]...{text[-limit:]}"
+
+
+def get_tmpdir(min_free: int = TMPFS_MIN_FREE) -> Union[str, None]:
+    """
+    Get the directory for temporary files, preferring a memory backed filesystem.
+
+    An explicit `TMPDIR` is always respected. Otherwise `TMPFS_DIR` is used if it is
+    requested (`CAML_TMPFS=1`), or if it has at least `min_free` bytes free and is not
+    disabled (`CAML_TMPFS=0`). A small tmpfs would fail on large inputs, in which case
+    the system default is used.
+
+    Args:
+        min_free (int, optional): The free bytes `TMPFS_DIR` needs to be used when not
+            requested. Defaults to `TMPFS_MIN_FREE`.
+
+    Returns:
+        Union[str, None]: the directory, or None for the system default
+
+    Examples:
+        >>> import tempfile
+        >>> from camlhmp.utils import get_tmpdir
+        >>> with tempfile.TemporaryDirectory(prefix="camlhmp-", dir=get_tmpdir()) as tmpdir:
+        ...     pass
+    """
+    requested = os.environ.get(TMPFS_ENV, "").strip().lower()
+    if "TMPDIR" in os.environ or requested in ["0", "false", "no"]:
+        return None
+    if not os.path.isdir(TMPFS_DIR) or not os.access(TMPFS_DIR, os.W_OK | os.X_OK):
+        return None
+    if requested in ["1", "true", "yes"]:
+        return TMPFS_DIR
+
+    free = disk_usage(TMPFS_DIR).free
+    if free < min_free:
+        logging.debug(f"Only {free} bytes free in {TMPFS_DIR}, using the default temporary directory")
+        return None
+    return TMPFS_DIR
+
+
+def _write_pipe(fd: int, data):
+    """Write bytes, or the contents of a binary file handle, to a pipe then close it"""
+    try:
+        chunks = [data] if isinstance(data, bytes) else iter(lambda: data.read(READ_SIZE), b"")
+        for chunk in chunks:
+            view = memoryview(chunk)
+            while view:
+                view = view[os.write(fd, view):]
+    except BrokenPipeError:
+        # The command exited without reading everything
+        logging.debug(f"Pipe {fd} was closed before all data was written")
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def pipe_input(data):
+    """
+    Provide data to a command through a pipe, instead of a file.
+
+    The data is written from a background thread, so it can be larger than the pipe buffer.
+    Pass the yielded descriptor as `stdin`, or as `/dev/fd/{fd}` with `pass_fds`.
+
+    Args:
+        data (bytes|BinaryIO): In-memory data, or a binary file handle (e.g. a decompressing
+            handle from `open_seqfile`) which is streamed and closed
+
+    Yields:
+        int: the read end of the pipe
+
+    Examples:
+        >>> from camlhmp.utils import pipe_input, run_command
+        >>> with pipe_input(b">seq1\nACGT\n") as fd:
+        ...     result = run_command("grep -c '>'", stdin=fd)
+    """
+    read_fd, write_fd = os.pipe()
+    writer = threading.Thread(target=_write_pipe, args=[write_fd, data], daemon=True)
+    writer.start()
+    try:
+        yield read_fd
+    finally:
+        os.close(read_fd)
+        writer.join()
+        if not isinstance(data, bytes):
+            data.close()
+
+
+def run_command(
+    cmd: str, directory: str = None, timeout: float = None, stdin: int = None, pass_fds: list = None
+) -> dict:
+    """
+    Run a shell command, capturing its output and the resources it used.
+
+    The command runs in its own process group with `pipefail`, so a timeout stops the whole
+    pipeline: it is sent SIGTERM, then SIGKILL if it has not exited after `KILL_GRACE`
+    seconds. Only the end of long output is logged.
+
+    Args:
+        cmd (str): The command to be executed
+        directory (str, optional): The directory to execute the command in. Defaults to the
+            current directory.
+        timeout (float, optional): Seconds before the command is stopped. Defaults to None.
+        stdin (int, optional): A file descriptor to use as stdin (e.g. from `pipe_input`).
+            Defaults to None (no stdin).
+        pass_fds (list, optional): File descriptors the command can read as `/dev/fd/{fd}`.
+            Defaults to None.
+
+    Returns:
+        dict: the `stdout`, `stderr` and `returncode` of the command, and its `usage`
+            (`wall_time`, `user_time` and `system_time` in seconds, and `max_rss` in KB)
+
+    Raises:
+        CommandError: if the command fails or times out
+
+    Examples:
+        >>> from camlhmp.utils import run_command
+        >>> result = run_command("blastn -version", timeout=60)
+        >>> result["usage"]["max_rss"]
+    """
+    logging.debug(f"Running: {cmd}")
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        ["bash", "-o", "pipefail", "-c", cmd],
+        cwd=directory,
+        stdin=subprocess.DEVNULL if stdin is None else stdin,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+        pass_fds=pass_fds or (),
+    )
+
+    # Drain both pipes while waiting, so large outputs cannot fill them
+    output = {"stdout": [], "stderr": []}
+    readers = [
+        threading.Thread(target=lambda name=name, fh=fh: output[name].append(fh.read()), daemon=True)
+        for name, fh in [["stdout", process.stdout], ["stderr", process.stderr]]
+    ]
+    for reader in readers:
+        reader.start()
+
+    timed_out = threading.Event()
+
+    def stop(sig):
+        if sig == signal.SIGTERM:
+            timed_out.set()
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            return
+        if sig == signal.SIGTERM:
+            killer = threading.Timer(KILL_GRACE, stop, [signal.SIGKILL])
+            killer.daemon = True
+            killer.start()
+
+    timer = threading.Timer(timeout, stop, [signal.SIGTERM]) if timeout else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+    try:
+        # wait4 reports the resources of this child (and the processes it waited on)
+        _, status, rusage = os.wait4(process.pid, 0)
+    except BaseException:
+        # Do not leave the command running if we are interrupted
+        stop(signal.SIGKILL)
+        process.wait()
+        raise
+    finally:
+        if timer:
+            timer.cancel()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    for reader in readers:
+        reader.join()
+    process.stdout.close()
+    process.stderr.close()
+
+    stdout = "".join(output["stdout"])
+    stderr = "".join(output["stderr"])
+    usage = {
+        "wall_time": time.perf_counter() - start_time,
+        "user_time": rusage.ru_utime,
+        "system_time": rusage.ru_stime,
+        # Linux reports KB, macOS reports bytes
+        "max_rss": rusage.ru_maxrss // 1024 if platform == "darwin" else rusage.ru_maxrss,
+    }
+    logging.debug(
+        f"Finished in {usage['wall_time']:.2f}s (user {usage['user_time']:.2f}s, system {usage['system_time']:.2f}s, "
+        f"max RSS {usage['max_rss']} KB) with exit code {process.returncode}"
+    )
+    if stdout:
+        logging.debug(f"stdout ({len(stdout)} characters): {_truncate(stdout)}")
+    if stderr:
+        logging.debug(f"stderr ({len(stderr)} characters): {_truncate(stderr)}")
+
+    if process.returncode or timed_out.is_set():
+        raise CommandError(
+            process.returncode, cmd, stdout=stdout, stderr=stderr, timed_out=timed_out.is_set(), usage=usage
+        )
+    return {"stdout": stdout, "stderr": stderr, "returncode": process.returncode, "usage": usage}
+
 
 def execute(
-    cmd,
-    directory=Path.cwd(),
-    capture=False,
-    stdout_file=None,
-    stderr_file=None,
-    allow_fail=False,
-):
-    """
-    A simple wrapper around executor.
-    
+    cmd: str,
+    directory: str = None,
+    capture: bool = False,
+    timeout: float = None,
+    stdout_file: str = None,
+    stderr_file: str = None,
+    allow_fail: bool = False,
+) -> Union[bool, list, CommandError]:
+    """
+    Execute a shell command (see `run_command`).
+
     Args:
         cmd (str): The command to be executed
-        directory (Path, optional): The directory to execute the command in. Defaults to Path.cwd().
-        capture (bool, optional): Capture the output of the command. Defaults to False.
-        stdout_file (Path, optional): The file to write stdout to. Defaults to None.
-        stderr_file (Path, optional): The file to write stderr to. Defaults to None.
-        allow_fail (bool, optional): Allow the command to fail. Defaults to False.
+        directory (str, optional): The directory to execute the command in. Defaults to the
+            current directory.
+        capture (bool, optional): Return the output of the command. Defaults to False.
+        timeout (float, optional): Seconds before the command is stopped. Defaults to None.
+        stdout_file (str, optional): Deprecated, also write stdout to this file. Defaults
+            to None.
+        stderr_file (str, optional): Deprecated, also write stderr to this file. Defaults
+            to None.
+        allow_fail (bool, optional): Deprecated, return the `CommandError` of a failed
+            command instead of raising it. Defaults to False.
 
     Returns:
-        Union[bool, list]: True if successful, otherwise a list of stdout and stderr
+        Union[bool, list, CommandError]: a list of stdout and stderr if `capture`, otherwise
+            True. The error if the command failed and `allow_fail` is set.
 
     Raises:
-        ExternalCommandFailed: If the command fails and allow_fail is True
+        CommandError: if the command fails or times out, and `allow_fail` is not set
 
     Examples:
         >>> from camlhmp.utils import execute
-        >>> stdout, stderr = execute(
-                f"{cat_type} {subject} | {engine} -query {query} -subject - -outfmt '6 {outfmt}' {qcov_hsp_perc} {perc_identity}",
-                capture=True,
-            )
+        >>> stdout, stderr = execute("makeblastdb -version", capture=True)
     """
-    try:
-        command = ExternalCommand(
-            cmd,
-            directory=directory,
-            capture=True,
-            capture_stderr=True,
-            stdout_file=stdout_file,
-            stderr_file=stderr_file,
+    deprecated = {"stdout_file": stdout_file, "stderr_file": stderr_file, "allow_fail": allow_fail}
+    deprecated = [name for name, val in deprecated.items() if val]
+    if deprecated:
+        warnings.warn(
+            f"execute() arguments {', '.join(deprecated)} are deprecated, use run_command() and handle CommandError instead",
+            DeprecationWarning,
+            stacklevel=2,
         )
 
-        command.start()
-        logging.debug(command.decoded_stdout)
-        logging.debug(command.decoded_stderr)
-
-        if capture:
-            return [command.decoded_stdout, command.decoded_stderr]
-        return True
-    except ExternalCommandFailed as e:
-        if allow_fail:
-            logging.error(e)
-            sys.exit(e.returncode)
-        else:
-            return None
+    error = None
+    try:
+        result = run_command(cmd, directory=directory, timeout=timeout)
+    except CommandError as e:
+        error = e
+        result = {"stdout": e.stdout, "stderr": e.stderr}
+
+    for output_file, text in [[stdout_file, result["stdout"]], [stderr_file, result["stderr"]]]:
+        if output_file:
+            with open(output_file, "wt") as fh:
+                fh.write(text)
+
+    if error:
+        if not allow_fail:
+            raise error
+        logging.error(error)
+        return error
+    if capture:
+        return [result["stdout"], result["stderr"]]
+    return True
 
 
 def check_dependencies():
@@ -179,7 +494,108 @@ def file_exists_error(filename: str, force: bool = False):
         )
 
 
-def parse_seq(seqfile: str, format: str) -> SeqIO:
+def open_seqfile(seqfile: str):
+    """
+    Open a sequence file for reading bytes, decompressing it if needed.
+
+    Compression (gzip, bzip2, xz or zstd) is detected from the first bytes of the file, not
+    its extension.
+
+    Args:
+        seqfile (str): input file to be read
+
+    Returns:
+        BinaryIO: a file handle that yields uncompressed bytes
+
+    Examples:
+        >>> from camlhmp.utils import open_seqfile
+        >>> with open_seqfile("data.fasta.gz") as fh:
+        ...     header = fh.readline()
+    """
+    with open(seqfile, "rb") as fh:
+        magic = fh.read(6)
+    for prefix, open_fn in COMPRESSION_MAGIC.items():
+        if magic.startswith(prefix):
+            return open_fn(seqfile, "rb")
+    return open(seqfile, "rb")
+
+
+def is_compressed(seqfile: str) -> bool:
+    """
+    Determine if a sequence file is compressed.
+
+    Args:
+        seqfile (str): input file to check
+
+    Returns:
+        bool: True if the file is gzip, bzip2, xz or zstd compressed
+    """
+    with open(seqfile, "rb") as fh:
+        magic = fh.read(6)
+    return any(magic.startswith(prefix) for prefix in COMPRESSION_MAGIC)
+
+
+def read_fasta(seqfile: Union[str, bytes], uppercase: bool = False, headers: bool = False):
+    """
+    Stream the records of a (optionally compressed) FASTA file.
+
+    A lightweight alternative to `Bio.SeqIO` for when only the IDs or the raw sequences
+    are needed. The file is read in large blocks of bytes and split into records without
+    creating SeqRecord objects, only one block plus the current record is held in memory.
+
+    Args:
+        seqfile (str|bytes): input file to be read, or sequences in FASTA format
+        uppercase (bool, optional): convert sequences to uppercase. Defaults to False.
+        headers (bool, optional): return the full header line (without '>') instead of
+            the ID. Defaults to False.
+
+    Yields:
+        list: the ID (first word of the header), or the header, and sequence of each record
+
+    Examples:
+        >>> from camlhmp.utils import read_fasta
+        >>> for name, seq in read_fasta("data.fasta.gz"):
+        ...     print(name, len(seq))
+    """
+    if isinstance(seqfile, bytes):
+        # Already in memory, no need to read it in blocks
+        yield from _parse_fasta_block(seqfile, uppercase, headers)
+        return
+
+    with open_seqfile(seqfile) as fh:
+        # Read large blocks and only split them at record boundaries ('\n>')
+        pending = []
+        previous = b""
+        for chunk in iter(lambda: fh.read(READ_SIZE), b""):
+            boundary = (previous[-1:] + chunk).rfind(b"\n>")
+            if boundary == -1:
+                pending.append(chunk)
+            else:
+                cut = boundary - len(previous[-1:]) + 1
+                pending.append(chunk[:cut])
+                yield from _parse_fasta_block(b"".join(pending), uppercase, headers)
+                pending = [chunk[cut:]]
+            previous = chunk
+        yield from _parse_fasta_block(b"".join(pending), uppercase, headers)
+
+
+def _parse_fasta_block(block: bytes, uppercase: bool = False, headers: bool = False):
+    """Parse complete FASTA records from a block of bytes"""
+    start = 0 if block.startswith(b">") else block.find(b"\n>") + 1
+    if not start and not block.startswith(b">"):
+        return
+    for record in block[start + 1 :].split(b"\n>"):
+        header, _, seq = record.partition(b"\n")
+        if headers:
+            name = header.rstrip().decode()
+        else:
+            words = header.split(maxsplit=1)
+            name = words[0].decode() if words else ""
+        seq = seq.translate(None, b" \t\r\n")
+        yield [name, (seq.upper() if uppercase else seq).decode()]
+
+
+def parse_seq(seqfile: str, format: str) -> "SeqRecord":
     """
     Parse a sequence file containing a single record.
 
@@ -194,11 +610,14 @@ def parse_seq(seqfile: str, format: str) -> SeqIO:
         >>> from camlhmp.utils import parse_seq
         >>> seq = parse_seq("data.fasta", "fasta")
     """
+    # Bio.SeqIO is slow to import, only load it when records are needed
+    from Bio import SeqIO
+
     with open(seqfile, "rt") as fh:
         return SeqIO.read(fh, format)
 
 
-def parse_seqs(seqfile: str, format: str) -> SeqIO:
+def parse_seqs(seqfile: str, format: str) -> list:
     """
     Parse a sequence file containing a multiple records.
 
@@ -213,6 +632,8 @@ def parse_seqs(seqfile: str, format: str) -> SeqIO:
         >>> from camlhmp.utils import parse_seqs
         >>> seqs = parse_seqs("data.fasta", "fasta")
     """
+    from Bio import SeqIO
+
     with open(seqfile, "rt") as fh:
         return list(SeqIO.parse(fh, format))
 
@@ -221,9 +642,12 @@ def parse_seq_lengths(seqfile: str, format: str) -> dict:
     """
     Parse a sequence file and return the lengths of the sequences.
 
+    FASTA files are read through their index (or streamed if compressed) without parsing
+    the sequences, other formats are parsed with Biopython.
+
     Args:
         seqfile (str): input file to be read
-        format (str): format of the input file
+        format (str): format of the input file (e.g. 'fasta' or 'genbank')
 
     Returns:
         dict: a dictionary of sequence lengths
@@ -232,10 +656,15 @@ def parse_seq_lengths(seqfile: str, format: str) -> dict:
         >>> from camlhmp.utils import parse_seq_lengths
         >>> lengths = parse_seq_lengths("data.fasta", "fasta")
     """
-    lengths = {}
-    for seq in parse_seqs(seqfile, "fasta"):
-        logging.debug(f"Processing {seq.id} with length {len(seq.seq)}")
-        lengths[seq.id] = len(seq.seq)
+    if format != "fasta":
+        lengths = {seq.id: len(seq.seq) for seq in parse_seqs(seqfile, format)}
+    elif is_compressed(seqfile):
+        # Compressed files can not be indexed, stream them instead
+        lengths = {name: len(seq) for name, seq in read_fasta(seqfile)}
+    else:
+        # Lengths come from a saved index, no need to parse the sequences
+        lengths = get_seq_lengths(seqfile)
+    logging.debug(f"Sequence lengths: {lengths}")
     return lengths
 
 
@@ -286,9 +715,91 @@ def parse_yaml(yamlfile: str) -> Union[list, dict]:
         return yaml.safe_load(fh)
 
 
+def open_output(output: str):
+    """
+    Open a file for writing text, compressing it based on its extension.
+
+    Files ending in `.gz` are gzip compressed and files ending in `.zst` are zstd
+    compressed (requires the optional `zstandard`). Text is compressed as it is written,
+    so the uncompressed output is never held in memory or written to disk.
+
+    Args:
+        output (str): The output file
+
+    Returns:
+        TextIO: a file handle for writing text
+
+    Examples:
+        >>> from camlhmp.utils import open_output
+        >>> with open_output("camlhmp.blastn.tsv.gz") as fh:
+        ...     fh.write("qseqid\tsseqid\n")
+    """
+    if str(output).endswith(".gz"):
+        # Favor speed over size, hit tables compress well even at low levels
+        return gzip.open(output, "wt", compresslevel=6)
+    elif str(output).endswith(".zst"):
+        return _zstd_open(output, "wt")
+    return open(output, "w")
+
+
+def get_output_compression(output: str) -> str:
+    """
+    Get the compression of an output file from its extension.
+
+    Args:
+        output (str): The output file
+
+    Returns:
+        str: the compression (a key of `COMPRESSION_EXTENSIONS`)
+
+    Raises:
+        ValueError: if the extension is of a compression that can only be read
+
+    Examples:
+        >>> from camlhmp.utils import get_output_compression
+        >>> get_output_compression("all-samples.tsv.zst")
+        'zstd'
+    """
+    suffix = Path(output).suffix
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if extension and suffix == extension:
+            return compression
+    if suffix in READ_ONLY_EXTENSIONS:
+        raise ValueError(
+            f"Unable to write {output}, expected no compression or one of: "
+            f"{', '.join(ext for ext in COMPRESSION_EXTENSIONS.values() if ext)}"
+        )
+    return "none"
+
+
+def compress_bytes(data: bytes, compression: str) -> bytes:
+    """
+    Compress bytes as a complete gzip member or zstd frame.
+
+    Members and frames can be appended to a file one after another, and are read back
+    as a single stream (e.g. by `open_seqfile`).
+
+    Args:
+        data (bytes): The bytes to compress
+        compression (str): The compression (a key of `COMPRESSION_EXTENSIONS`)
+
+    Returns:
+        bytes: the compressed bytes (unchanged if `compression` is 'none')
+
+    Examples:
+        >>> from camlhmp.utils import compress_bytes
+        >>> fh.write(compress_bytes(rows, get_output_compression(output)))
+    """
+    if compression == "gzip":
+        return gzip.compress(data)
+    elif compression == "zstd":
+        return _import_zstandard().ZstdCompressor().compress(data)
+    return data
+
+
 def write_tsv(data: list, output: str):
     """
-    Write the dictionary to a TSV file.
+    Write the dictionary to a TSV file, compressed if it ends in `.gz` or `.zst`.
 
     Args:
         data (list): a list of dicts to be written
@@ -299,7 +810,7 @@ def write_tsv(data: list, output: str):
         >>> write_tsv(data, "results.tsv")
     """
     logging.debug(f"Writing TSV results to {output}")
-    with open(output, "w") as csvfile:
+    with open_output(output) as csvfile:
         writer = csv.DictWriter(csvfile, delimiter="\t", fieldnames=data[0].keys())
         writer.writeheader()
         if next(iter(data[0].values())) != "NO_HITS":
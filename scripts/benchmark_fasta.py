@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Compare the speed of camlhmp's FASTA reader to Bio.SeqIO on the test fixtures.
+
+Usage:
+    python scripts/benchmark_fasta.py [FASTA ...]
+"""
+import gzip
+import sys
+import time
+from pathlib import Path
+
+from camlhmp.utils import read_fasta
+
+DEFAULT_FIXTURES = sorted(str(f) for f in Path(__file__).parents[1].glob("tests/data/blast/*/*.f*a*"))
+
+
+def time_it(fn, repeat: int = 5) -> float:
+    """Return the best wall time of several runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def seqio_lengths(fasta: str) -> dict:
+    from Bio import SeqIO
+
+    open_fn = gzip.open if fasta.endswith(".gz") else open
+    with open_fn(fasta, "rt") as fh:
+        return {record.id: len(record.seq) for record in SeqIO.parse(fh, "fasta")}
+
+
+def camlhmp_lengths(fasta: str) -> dict:
+    return {name: len(seq) for name, seq in read_fasta(fasta)}
+
+
+def main():
+    start = time.perf_counter()
+    from Bio import SeqIO  # noqa: F401
+
+    print(f"Bio.SeqIO import: {time.perf_counter() - start:.3f}s\n")
+    print(f"{'file':<40} {'Bio.SeqIO':>10} {'camlhmp':>10} {'speedup':>8}")
+    for fasta in sys.argv[1:] or DEFAULT_FIXTURES:
+        assert seqio_lengths(fasta) == camlhmp_lengths(fasta), f"Lengths differ for {fasta}"
+        seqio = time_it(lambda: seqio_lengths(fasta))
+        camlhmp = time_it(lambda: camlhmp_lengths(fasta))
+        print(f"{Path(fasta).name:<40} {seqio:>9.4f}s {camlhmp:>9.4f}s {seqio / camlhmp:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Compare the speed and calls of the kmer engine to BLAST+ on the test fixtures.
+
+Each assembly is typed with its framework twice, once with the framework's own engine
+(BLAST+) and once with `engine.type: kmer`. The regions fixtures are complete genomes
+(~6.5 Mb), the targets fixtures are SCCmec regions. Typing with BLAST+ is skipped if
+`blastn` is not installed.
+
+Usage:
+    python scripts/benchmark_kmer.py [--repeat N]
+"""
+
+import argparse
+import shutil
+import time
+from pathlib import Path
+
+from camlhmp.classifier import Classifier
+from camlhmp.framework import read_framework
+
+DATA = Path(__file__).parents[1] / "tests" / "data" / "blast"
+FRAMEWORKS = [
+    [
+        "regions",
+        DATA / "regions" / "pseudomonas-serogroup.yaml",
+        DATA / "regions" / "pseudomonas-serogroup.fasta",
+    ],
+    [
+        "targets",
+        DATA / "targets" / "sccmec-partial.yaml",
+        DATA / "targets" / "sccmec-partial.fasta",
+    ],
+]
+
+
+def time_it(classifier: Classifier, sample: Path, repeat: int) -> list:
+    """Return the best wall time of several runs, and the type that was called"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = classifier.classify(sample)["result"]
+        best = min(best, time.perf_counter() - start)
+    return [best, result["type"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs of each sample, the fastest is reported",
+    )
+    args = parser.parse_args()
+
+    has_blast = shutil.which("blastn") is not None
+    print(
+        f"{'sample':<28} {'size':>8} {'kmer':>9} {'blastn':>9} {'speedup':>8}  calls (kmer/blastn)"
+    )
+    for mode, yaml, targets in FRAMEWORKS:
+        framework = read_framework(yaml)
+        kmer = Classifier(
+            {**framework, "engine": {**framework["engine"], "type": "kmer"}},
+            targets,
+            mode=mode,
+        )
+        blast = Classifier(framework, targets, mode=mode) if has_blast else None
+        samples = sorted(
+            p
+            for p in yaml.parent.iterdir()
+            if p.suffix in [".fasta", ".gz"] and p != targets
+        )
+        for sample in samples:
+            kmer_time, kmer_type = time_it(kmer, sample, args.repeat)
+            size = f"{sample.stat().st_size / 1e6:.1f}MB"
+            if blast:
+                blast_time, blast_type = time_it(blast, sample, args.repeat)
+                print(
+                    f"{sample.name:<28} {size:>8} {kmer_time:>8.2f}s {blast_time:>8.2f}s "
+                    f"{blast_time / kmer_time:>7.1f}x  {kmer_type}/{blast_type}"
+                )
+            else:
+                print(
+                    f"{sample.name:<28} {size:>8} {kmer_time:>8.2f}s {'-':>9} {'-':>8}  {kmer_type}/-"
+                )
+    if not has_blast:
+        print("\nblastn was not found, only the kmer engine was timed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+import camlhmp.bitmap as bitmap
+from camlhmp.bitmap import (add_sample, empty_bitmap_index, get_samples,
+                            query_bitmap, read_bitmap_index,
+                            update_bitmap_index, write_bitmap_index)
+
+
+def get_cohort(total):
+    return [
+        [f"sample{i:04d}", {"mecA": i % 2 == 0, "ccrA2": i % 3 == 0}, {"IV": i % 3 == 0, "V": i % 5 == 0}]
+        for i in range(total)
+    ]
+
+
+def test_bitmap_round_trip(tmp_path):
+    index = empty_bitmap_index("sccmec")
+    for sample, target_states, type_states in get_cohort(10):
+        add_sample(index, sample, target_states, type_states)
+    write_bitmap_index(index, tmp_path / "cohort.bitmap")
+
+    read = read_bitmap_index(tmp_path / "cohort.bitmap")
+    assert read["samples"] == index["samples"]
+    assert read["bitsets"] == index["bitsets"]
+    assert get_samples(read, query_bitmap(read, types=["IV"], lacks=["mecA"])) == ["sample0003", "sample0009"]
+
+
+def test_update_bitmap_index_matches_in_memory(tmp_path, monkeypatch):
+    # Little room, so the index is rewritten a few times along the way
+    monkeypatch.setattr(bitmap, "MIN_CAPACITY", 8)
+    monkeypatch.setattr(bitmap, "MIN_SLOTS", 1)
+    monkeypatch.setattr(bitmap, "HEADER_SIZE", 64)
+    path = tmp_path / "cohort.bitmap"
+    index = empty_bitmap_index("sccmec")
+    for sample, target_states, type_states in get_cohort(100):
+        assert update_bitmap_index(path, "sccmec", sample, target_states, type_states) == add_sample(
+            index, sample, target_states, type_states
+        )
+
+    read = read_bitmap_index(path)
+    assert read["samples"] == index["samples"]
+    assert read["bitsets"] == index["bitsets"]
+    assert query_bitmap(read, has=["mecA", "ccrA2"]) == query_bitmap(index, has=["mecA", "ccrA2"])
+    assert query_bitmap(read, has=["mecA", "ccrA2"]).bit_count() == 17
+
+
+def test_update_bitmap_index_in_place(tmp_path):
+    path = tmp_path / "cohort.bitmap"
+    cohort = get_cohort(20)
+    update_bitmap_index(path, "sccmec", *cohort[0])
+    inode = os.stat(path).st_ino
+
+    # With room to spare, samples are added without rewriting the file
+    for sample, target_states, type_states in cohort[1:]:
+        update_bitmap_index(path, "sccmec", sample, target_states, type_states)
+    assert os.stat(path).st_ino == inode
+    assert len(read_bitmap_index(path)["samples"]) == 20
+
+
+def test_update_bitmap_index_new_keys(tmp_path):
+    path = tmp_path / "cohort.bitmap"
+    update_bitmap_index(path, "sccmec", "sample01", {"mecA": True}, {"IV": True})
+    update_bitmap_index(path, "sccmec", "sample02", {"mecA": True, "mecC": True}, {"XI": True})
+
+    index = read_bitmap_index(path)
+    assert get_samples(index, query_bitmap(index, has=["mecA"])) == ["sample01", "sample02"]
+    assert get_samples(index, query_bitmap(index, has=["mecC"])) == ["sample02"]
+    assert get_samples(index, query_bitmap(index, types=["IV", "XI"])) == ["sample01", "sample02"]
+
+
+def test_retyped_sample_replaces_states(tmp_path):
+    path = tmp_path / "cohort.bitmap"
+    update_bitmap_index(path, "sccmec", "sample01", {"mecA": True}, {"IV": True})
+    update_bitmap_index(path, "sccmec", "sample02", {"mecA": True}, {"IV": False})
+    update_bitmap_index(path, "sccmec", "sample01", {"mecA": False}, {"IV": False})
+
+    index = read_bitmap_index(path)
+    assert get_samples(index, query_bitmap(index, has=["mecA"])) == ["sample02"]
+    assert get_samples(index, query_bitmap(index, lacks=["mecA"])) == ["sample01"]
+    assert query_bitmap(index, types=["IV"]) == 0
+    assert query_bitmap(index).bit_count() == 2
+
+
+def test_interrupted_update_is_cleaned_up(tmp_path):
+    path = tmp_path / "cohort.bitmap"
+    update_bitmap_index(path, "sccmec", "sample01", {"mecA": True}, {"IV": True})
+
+    # Leave the bits of a second sample behind, as if its update never finished
+    with open(path, "r+b") as fh:
+        header, start = bitmap.read_header(fh, path)
+        size = start - len(bitmap.BITMAP_MAGIC)
+        bitmap.write_header(fh, {**header, "pending": 1}, size)
+        fh.seek(start)
+        fh.write(b"\x03")
+
+    update_bitmap_index(path, "sccmec", "sample02", {"mecA": False}, {"IV": False})
+    index = read_bitmap_index(path)
+    assert index["samples"] == ["sample01", "sample02"]
+    assert get_samples(index, query_bitmap(index, has=["mecA"])) == ["sample01"]
+
+
+def test_update_bitmap_index_schema_mismatch(tmp_path):
+    path = tmp_path / "cohort.bitmap"
+    update_bitmap_index(path, "sccmec", "sample01", {"mecA": True}, {"IV": True})
+    with pytest.raises(ValueError, match="is an index of sccmec"):
+        update_bitmap_index(path, "spatyper", "sample02", {"t002": True}, {"t002": True})
+
+
+def test_read_bitmap_index_not_an_index(tmp_path):
+    path = tmp_path / "cohort.bitmap"
+    path.write_text("not an index\n")
+    with pytest.raises(ValueError, match="is not a camlhmp bitmap index"):
+        read_bitmap_index(path)
+
+
+def test_get_samples():
+    index = {"samples": [f"sample{i}" for i in range(200)]}
+    assert get_samples(index, 0) == []
+    assert get_samples(index, 1) == ["sample0"]
+    assert get_samples(index, (1 << 199) | (1 << 64) | 0b101) == ["sample0", "sample2", "sample64", "sample199"]
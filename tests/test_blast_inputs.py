@@ -0,0 +1,77 @@
+from collections import namedtuple
+
+import pytest
+
+import camlhmp.utils
+from camlhmp.engines.blast import split_query_by_task
+from camlhmp.utils import get_tmpdir, read_fasta
+
+QUERY = b">short\nACGTACGTACGT\n>long1\nACGT\nACGT\n>long2\nTTTT\n>other\nGGGG\n"
+TASKS = {"short": "blastn-short", "long1": "megablast", "long2": "megablast"}
+
+DiskUsage = namedtuple("DiskUsage", ["total", "used", "free"])
+
+
+@pytest.fixture
+def tmpfs(tmp_path, monkeypatch):
+    monkeypatch.delenv("TMPDIR", raising=False)
+    monkeypatch.delenv("CAML_TMPFS", raising=False)
+    monkeypatch.setattr(camlhmp.utils, "TMPFS_DIR", str(tmp_path))
+    return tmp_path
+
+
+def set_free(monkeypatch, free):
+    monkeypatch.setattr(camlhmp.utils, "disk_usage", lambda path: DiskUsage(free, 0, free))
+
+
+def test_tmpfs_used_with_enough_space(tmpfs, monkeypatch):
+    set_free(monkeypatch, 2 * camlhmp.utils.TMPFS_MIN_FREE)
+    assert get_tmpdir() == str(tmpfs)
+
+
+def test_small_tmpfs_is_not_used(tmpfs, monkeypatch):
+    # e.g. the 64 MB /dev/shm of a Docker container
+    set_free(monkeypatch, 64 * 1024**2)
+    assert get_tmpdir() is None
+    assert get_tmpdir(min_free=32 * 1024**2) == str(tmpfs)
+
+
+def test_tmpfs_requested(tmpfs, monkeypatch):
+    set_free(monkeypatch, 0)
+    monkeypatch.setenv("CAML_TMPFS", "1")
+    assert get_tmpdir() == str(tmpfs)
+
+
+def test_tmpfs_disabled_or_tmpdir_set(tmpfs, monkeypatch):
+    set_free(monkeypatch, 2 * camlhmp.utils.TMPFS_MIN_FREE)
+    monkeypatch.setenv("CAML_TMPFS", "0")
+    assert get_tmpdir() is None
+    monkeypatch.setenv("CAML_TMPFS", "1")
+    monkeypatch.setenv("TMPDIR", str(tmpfs))
+    assert get_tmpdir() is None
+
+
+def test_missing_tmpfs(tmpfs, monkeypatch):
+    monkeypatch.setattr(camlhmp.utils, "TMPFS_DIR", str(tmpfs / "missing"))
+    monkeypatch.setenv("CAML_TMPFS", "1")
+    assert get_tmpdir() is None
+
+
+@pytest.mark.parametrize("in_memory", [True, False])
+def test_split_query_by_task(tmp_path, in_memory):
+    query = QUERY
+    if not in_memory:
+        query = tmp_path / "targets.fasta"
+        query.write_bytes(QUERY)
+
+    groups = {task: list(read_fasta(group)) for task, group in split_query_by_task(query, TASKS)}
+    assert groups == {
+        "blastn-short": [["short", "ACGTACGTACGT"]],
+        "megablast": [["long1", "ACGTACGT"], ["long2", "TTTT"]],
+        None: [["other", "GGGG"]],
+    }
+
+
+def test_single_task_is_not_split():
+    assert split_query_by_task(QUERY, {"short": "megablast"}) == [["megablast", QUERY]]
+    assert split_query_by_task(QUERY) == [[None, QUERY]]
@@ -0,0 +1,101 @@
+import shlex
+
+import pytest
+
+import camlhmp.engines.blast as blast
+from camlhmp.engines.blast import (BLASTN_COLS, BLASTN_TASKS, get_blast_cmd,
+                                   get_blastn_tasks, run_blast,
+                                   select_blastn_task)
+
+
+def write_targets(tmp_path, lengths):
+    targets = tmp_path / "targets.fasta"
+    with open(targets, "w") as fh:
+        for name, length in lengths.items():
+            fh.write(f">{name}\n{'ACGT' * (length // 4)}{'A' * (length % 4)}\n")
+    (tmp_path / "subject.fna").write_text(">contig1\nACGTACGT\n")
+    return targets
+
+
+@pytest.mark.parametrize(
+    "length,min_pident,expected",
+    [
+        [24, 95, "blastn-short"],
+        [49, 95, "blastn-short"],
+        [49, 80, "blastn-short"],
+        [50, 95, "megablast"],
+        [50, 90, "megablast"],
+        [50, 89.9, "dc-megablast"],
+        [2000, 80, "dc-megablast"],
+        [2000, 100, "megablast"],
+    ],
+)
+def test_select_blastn_task(length, min_pident, expected):
+    assert select_blastn_task(length, min_pident) == expected
+
+
+def test_get_blastn_tasks(tmp_path):
+    targets = write_targets(tmp_path, {"primer": 20, "edge": 50, "gene": 1000})
+    assert get_blastn_tasks(targets, 95) == {"primer": "blastn-short", "edge": "megablast", "gene": "megablast"}
+    assert get_blastn_tasks(targets, 85) == {"primer": "blastn-short", "edge": "dc-megablast", "gene": "dc-megablast"}
+
+    # A forced task applies to every target
+    assert set(get_blastn_tasks(targets, 95, task="blastn").values()) == {"blastn"}
+    with pytest.raises(ValueError, match="Unsupported blastn task"):
+        get_blastn_tasks(targets, 95, task="megablastn")
+
+
+def test_get_blast_cmd_task():
+    cmd = shlex.split(get_blast_cmd("blastn", "subject.fna", "targets.fasta", 95, 90, task="dc-megablast"))
+    assert cmd[cmd.index("-task") + 1] == "dc-megablast"
+    assert cmd[cmd.index("-word_size") + 1] == str(BLASTN_TASKS["dc-megablast"])
+
+    # An explicit word size replaces the one of the task
+    cmd = shlex.split(
+        get_blast_cmd("blastn", "subject.fna", "targets.fasta", 95, 90, task="megablast", options={"word_size": 16})
+    )
+    assert cmd[cmd.index("-word_size") + 1] == "16"
+
+    # Tasks only apply to blastn
+    assert "-task" not in get_blast_cmd("tblastn", "subject.fna", "targets.faa", 95, 90, task="megablast")
+
+
+def test_run_blast_searches_each_task(tmp_path, monkeypatch):
+    targets = write_targets(tmp_path, {"primer": 20, "gene1": 1000, "gene2": 800})
+    tasks = get_blastn_tasks(targets, 95)
+    searches = []
+
+    def fake_run_command(cmd, timeout=None, stdin=None, pass_fds=None):
+        # Report a hit for every target of the group
+        args = shlex.split(cmd)
+        with open(args[args.index("-query") + 1]) as fh:
+            names = [line[1:].strip() for line in fh if line.startswith(">")]
+        searches.append([args[args.index("-task") + 1], names])
+        hits = ["\t".join([name, "contig1"] + ["1"] * (len(BLASTN_COLS) - 2)) for name in names]
+        return {"stdout": "\n".join(hits) + "\n", "stderr": ""}
+
+    monkeypatch.setattr(blast, "run_command", fake_run_command)
+    target_hits, results, _ = run_blast("blastn", str(tmp_path / "subject.fna"), str(targets), 95, 90, tasks=tasks)
+
+    assert sorted(searches) == [["blastn-short", ["primer"]], ["megablast", ["gene1", "gene2"]]]
+    assert sorted(target_hits) == ["gene1", "gene2", "primer"]
+    assert sorted(hit["qseqid"] for hit in results) == ["gene1", "gene2", "primer"]
+
+
+def test_run_blast_single_task_is_one_search(tmp_path, monkeypatch):
+    targets = write_targets(tmp_path, {"gene1": 1000, "gene2": 800})
+    searches = []
+
+    def fake_run_command(cmd, timeout=None, stdin=None, pass_fds=None):
+        searches.append(cmd)
+        return {"stdout": "", "stderr": ""}
+
+    monkeypatch.setattr(blast, "run_command", fake_run_command)
+    _, results, _ = run_blast(
+        "blastn", str(tmp_path / "subject.fna"), str(targets), 95, 90, tasks=get_blastn_tasks(targets, 95)
+    )
+
+    # The targets file is passed to BLAST+ as is
+    assert len(searches) == 1
+    assert f"-query {targets}" in searches[0]
+    assert results[0]["qseqid"] == "NO_HITS"
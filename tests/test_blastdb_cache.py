@@ -0,0 +1,61 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+import camlhmp.engines.blast
+from camlhmp.engines.blast import (evict_blastdb_cache, get_blastdb_lock,
+                                   lock_blastdb_entry, subject_blastdb)
+from camlhmp.utils import CommandError
+
+
+def make_entries(cache_dir, names):
+    entries = []
+    for i, name in enumerate(names):
+        entry = cache_dir / name
+        entry.mkdir()
+        (entry / "subject.nsq").write_text("ACGT")
+        # Oldest first
+        os.utime(entry, (time.time() - 100 + i, time.time() - 100 + i))
+        entries.append(entry)
+    return entries
+
+
+def test_evict_least_recently_used(tmp_path):
+    old, mid, new = make_entries(tmp_path, ["old", "mid", "new"])
+    evicted = evict_blastdb_cache(tmp_path, 1)
+    assert sorted(evicted) == sorted([str(old), str(mid)])
+    assert new.exists() and not old.exists() and not mid.exists()
+    assert not get_blastdb_lock(old).exists()
+
+
+def test_evict_skips_entries_in_use(tmp_path):
+    old, new = make_entries(tmp_path, ["old", "new"])
+    with lock_blastdb_entry(old):
+        assert evict_blastdb_cache(tmp_path, 1) == []
+        assert old.exists()
+    assert evict_blastdb_cache(tmp_path, 1) == [str(old)]
+    assert not old.exists()
+
+
+def test_lock_files_are_not_entries(tmp_path):
+    (entry,) = make_entries(tmp_path, ["only"])
+    with lock_blastdb_entry(entry):
+        assert get_blastdb_lock(entry).exists()
+        assert evict_blastdb_cache(tmp_path, 1) == []
+
+
+def test_failed_builds_are_removed(tmp_path, monkeypatch):
+    def fail(subject, outdir):
+        (Path(outdir) / "subject.nsq").write_text("partial")
+        raise CommandError(1, "makeblastdb")
+
+    monkeypatch.setattr(camlhmp.engines.blast, "make_blastdb", fail)
+    subject = tmp_path / "subject.fasta"
+    subject.write_text(">contig\nACGT\n")
+    cache_dir = tmp_path / "cache"
+    with pytest.raises(CommandError):
+        with subject_blastdb(subject, cache_dir=cache_dir):
+            pass
+    assert [path.name for path in cache_dir.iterdir() if not path.name.endswith(".lock")] == []
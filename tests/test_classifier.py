@@ -0,0 +1,58 @@
+import csv
+from pathlib import Path
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from camlhmp.classifier import Classifier
+from camlhmp.cli.blast.regions import camlhmp_blast_regions
+from camlhmp.cli.blast.targets import camlhmp_blast_targets
+
+DATA = Path(__file__).parent / "data" / "blast"
+
+# Command, framework, targets and sample of each mode
+MODES = {
+    "targets": [
+        camlhmp_blast_targets,
+        DATA / "targets" / "sccmec-partial.yaml",
+        DATA / "targets" / "sccmec-partial.fasta",
+        DATA / "targets" / "sccmec-multiple.fasta",
+    ],
+    "regions": [
+        camlhmp_blast_regions,
+        DATA / "regions" / "pseudomonas-serogroup.yaml",
+        DATA / "regions" / "pseudomonas-serogroup.fasta",
+        DATA / "regions" / "O1-GCF_000504045.fna.gz",
+    ],
+}
+
+
+def read_tsv(tsv):
+    with open(tsv) as fh:
+        return list(csv.DictReader(fh, delimiter="\t"))
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_cli_matches_classifier(tmp_path, mode):
+    command, framework_yaml, targets, sample = MODES[mode]
+    with open(framework_yaml) as fh:
+        framework = yaml.safe_load(fh)
+    framework["engine"]["type"] = "kmer"
+    kmer_yaml = tmp_path / "kmer.yaml"
+    with open(kmer_yaml, "w") as fh:
+        yaml.safe_dump(framework, fh)
+
+    result = CliRunner().invoke(
+        command, ["-i", sample, "-y", kmer_yaml, "-t", targets, "-o", tmp_path / "out", "-p", "sample01"]
+    )
+    assert result.exit_code == 0, result.output
+
+    # The commands and the Classifier finalize the results the same way
+    expected = Classifier(kmer_yaml, targets, mode=mode).classify(sample, prefix="sample01")
+    assert read_tsv(tmp_path / "out" / "sample01.tsv") == [
+        {column: str(value) for column, value in expected["result"].items()}
+    ]
+    assert read_tsv(tmp_path / "out" / "sample01.details.tsv") == [
+        {column: str(value) for column, value in row.items()} for row in expected["details"]
+    ]
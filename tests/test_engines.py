@@ -0,0 +1,216 @@
+import shlex
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+import camlhmp.engines
+import camlhmp.engines.blast
+from camlhmp.cli.blast.targets import camlhmp_blast_targets
+from camlhmp.engines import (Engine, get_engine, get_engine_params,
+                             parse_engine_params)
+from camlhmp.engines.blast import BLAST_PRESETS, BlastEngine
+from camlhmp.engines.kmer import KmerEngine
+
+TARGETS_DIR = Path(__file__).parent / "data" / "blast" / "targets"
+TARGETS_YAML = TARGETS_DIR / "sccmec-partial.yaml"
+TARGETS_FASTA = TARGETS_DIR / "sccmec-partial.fasta"
+
+
+class EchoEngine(Engine):
+    """Reports every target as a hit, and accepts any parameter"""
+
+    name = "echo"
+    presets = {"fast": {"speed": "fast", "depth": "1"}}
+
+    def validate_params(self, tool, params):
+        return dict(params)
+
+    def stream_hits(self, tool, subject, query, min_pident, min_coverage, index=None, params=None):
+        yield {"qseqid": query}
+
+    def search(self, tool, subject, query, min_pident, min_coverage, index=None, params=None):
+        return super().search(tool, subject, query, min_pident, min_coverage, index=index, params=params)
+
+
+class IncompleteEngine(Engine):
+    """Does not implement `search`"""
+
+    name = "incomplete"
+
+    def stream_hits(self, tool, subject, query, min_pident, min_coverage, index=None, params=None):
+        yield from []
+
+
+class NotAnEngine:
+    name = "other"
+
+
+@pytest.fixture
+def plugins(monkeypatch):
+    monkeypatch.setattr(
+        camlhmp.engines,
+        "BUILTIN_ENGINES",
+        {
+            **camlhmp.engines.BUILTIN_ENGINES,
+            "echo": "tests.test_engines:EchoEngine",
+            "incomplete": "tests.test_engines:IncompleteEngine",
+            "other": "tests.test_engines:NotAnEngine",
+        },
+    )
+
+
+def framework(params=None, presets=None):
+    engine = {"type": "echo", "tool": "blastn"}
+    if params is not None:
+        engine["params"] = params
+    if presets is not None:
+        engine["presets"] = presets
+    return {"engine": engine}
+
+
+def test_builtin_engines():
+    assert isinstance(get_engine("blast"), BlastEngine)
+    assert isinstance(get_engine("kmer"), KmerEngine)
+    with pytest.raises(ValueError, match="Unsupported engine"):
+        get_engine("missing")
+
+
+def test_plugin_engines(plugins):
+    engine = get_engine("echo")
+    assert engine.search("blastn", "input.fasta", "targets.fasta", 95, 95) == [
+        ["targets.fasta"],
+        [{"qseqid": "targets.fasta"}],
+        "",
+    ]
+
+
+def test_broken_plugins_fail_to_load(plugins):
+    with pytest.raises(ValueError, match="incomplete"):
+        get_engine("incomplete")
+    with pytest.raises(ValueError, match="not a subclass"):
+        get_engine("other")
+    with pytest.raises(TypeError):
+        IncompleteEngine()
+
+
+def test_parse_engine_params():
+    assert parse_engine_params(None) == {}
+    assert parse_engine_params(["max_hsps=1", " dust = no ", "evalue=1e-5=x"]) == {
+        "max_hsps": "1",
+        "dust": "no",
+        "evalue": "1e-5=x",
+    }
+    # A parameter given twice keeps its last value
+    assert parse_engine_params(["max_hsps=1", "max_hsps=2"]) == {"max_hsps": "2"}
+    for value in ["max_hsps", "=1"]:
+        with pytest.raises(ValueError, match="KEY=VALUE"):
+            parse_engine_params([value])
+
+
+def test_engine_params_precedence(plugins):
+    engine = get_engine("echo")
+    assert get_engine_params(engine, "blastn", framework()) == {}
+    # Preset, then the framework, then the command line
+    assert get_engine_params(engine, "blastn", framework({"depth": "2"}), preset="fast") == {
+        "speed": "fast",
+        "depth": "2",
+    }
+    assert get_engine_params(
+        engine, "blastn", framework({"depth": "2"}), preset="fast", params={"depth": "3"}
+    ) == {"speed": "fast", "depth": "3"}
+    # Thresholds are not engine parameters
+    assert get_engine_params(engine, "blastn", framework({"min_pident": 90, "min_coverage": 80})) == {}
+
+
+def test_engine_presets_precedence(plugins):
+    engine = get_engine("echo")
+    # A preset declared by the framework is used, unless another is given
+    declared = framework({"preset": "fast"})
+    assert get_engine_params(engine, "blastn", declared) == {"speed": "fast", "depth": "1"}
+    assert get_engine_params(
+        engine, "blastn", framework({"preset": "fast"}, {"tuned": {"depth": "4"}}), preset="tuned"
+    ) == {"depth": "4"}
+    # Presets of the framework replace those of the engine with the same name
+    assert get_engine_params(engine, "blastn", framework(presets={"fast": {"depth": "5"}}), preset="fast") == {
+        "depth": "5"
+    }
+    with pytest.raises(ValueError, match="Unknown preset"):
+        get_engine_params(engine, "blastn", framework(), preset="missing")
+
+
+def blast_framework(params=None, presets=None):
+    blast = framework(params, presets)
+    blast["engine"]["type"] = "blast"
+    return blast
+
+
+def test_blast_presets():
+    engine = get_engine("blast")
+    assert get_engine_params(engine, "blastn", blast_framework(), preset="fast") == BLAST_PRESETS["fast"]
+    assert get_engine_params(engine, "blastn", blast_framework(), preset="sensitive") == {
+        "task": "blastn",
+        "dust": "no",
+    }
+    # The framework's params override the preset, and the command line overrides both
+    assert get_engine_params(engine, "blastn", blast_framework({"max_hsps": 3}), preset="fast") == {
+        "max_target_seqs": 1,
+        "max_hsps": 3,
+    }
+    assert get_engine_params(
+        engine, "blastn", blast_framework({"max_hsps": 3, "preset": "fast"}), params={"max_hsps": "5"}
+    ) == {"max_target_seqs": 1, "max_hsps": 5}
+    # Presets are validated against the tool like any other parameter
+    with pytest.raises(ValueError, match="task"):
+        get_engine_params(engine, "tblastn", blast_framework(), preset="sensitive")
+
+
+@pytest.fixture
+def blast_commands(monkeypatch):
+    commands = []
+
+    def fake_run_command(cmd, timeout=None, stdin=None, pass_fds=None):
+        commands.append(shlex.split(cmd))
+        return {"stdout": "", "stderr": ""}
+
+    monkeypatch.setattr(camlhmp.engines.blast, "run_command", fake_run_command)
+    return commands
+
+
+def get_option(cmd, option):
+    return cmd[cmd.index(option) + 1] if option in cmd else None
+
+
+@pytest.mark.parametrize(
+    "params,args,expected",
+    [
+        [{}, ["--preset", "fast"], {"-max_target_seqs": "1", "-max_hsps": "1", "-task": "megablast"}],
+        [{"max_hsps": 3}, ["--preset", "fast"], {"-max_target_seqs": "1", "-max_hsps": "3"}],
+        [
+            {"max_hsps": 3, "preset": "fast"},
+            ["--engine-param", "max_hsps=5"],
+            {"-max_target_seqs": "1", "-max_hsps": "5"},
+        ],
+        [{}, ["--preset", "sensitive"], {"-task": "blastn", "-dust": "no"}],
+        [{}, ["--preset", "sensitive", "--blast-task", "megablast"], {"-task": "megablast", "-dust": "no"}],
+    ],
+)
+def test_cli_engine_params_precedence(tmp_path, monkeypatch, blast_commands, params, args, expected):
+    with open(TARGETS_YAML) as fh:
+        framework_yaml = yaml.safe_load(fh)
+    framework_yaml["engine"]["params"] = {**(framework_yaml["engine"].get("params") or {}), **params}
+    framework_path = tmp_path / "sccmec.yaml"
+    with open(framework_path, "w") as fh:
+        yaml.safe_dump(framework_yaml, fh)
+
+    cli_args = ["-i", str(TARGETS_DIR / "sccmec-i.fasta"), "-y", str(framework_path), "-t", str(TARGETS_FASTA)]
+    cli_args += ["-o", str(tmp_path / "out")] + args
+    # Options given on the command line are checked against sys.argv
+    monkeypatch.setattr(sys, "argv", ["camlhmp-blast-targets"] + cli_args)
+    result = CliRunner().invoke(camlhmp_blast_targets, cli_args)
+    assert result.exit_code == 0, result.output
+
+    assert len(blast_commands) == 1
+    assert {option: get_option(blast_commands[0], option) for option in expected} == expected
@@ -0,0 +1,70 @@
+import pytest
+
+from camlhmp.extract import (extract_from_reference, extract_targets,
+                             stream_targets, write_targets)
+
+REFERENCES = {
+    "ref1.fasta": "ACGTACGTAAACCCGGGTTT" * 5,
+    "ref2.fasta": "TTTTGGGGCCCCAAAA" * 5,
+}
+
+
+@pytest.fixture
+def targets(tmp_path):
+    refs = tmp_path / "refs"
+    refs.mkdir()
+    for name, seq in REFERENCES.items():
+        (refs / name).write_text(f">{name}\n{seq}\n")
+    # Targets alternate between references, so every FASTA is written to more than once
+    rows = []
+    for i in range(6):
+        for name in REFERENCES:
+            rows.append(
+                {
+                    "file": name,
+                    "format": "fasta",
+                    "target": f"target{i % 3}",
+                    "accession": f"{name}:{i}",
+                    "type": "A",
+                    "start": str(i + 1),
+                    "stop": str(i + 20),
+                    "strand": "-" if i % 2 else "+",
+                }
+            )
+    return rows, refs
+
+
+@pytest.mark.parametrize("max_open", [1, 2, 128])
+def test_stream_matches_in_memory(tmp_path, targets, max_open):
+    rows, refs = targets
+    streamed = stream_targets(rows, refs, tmp_path / "streamed", max_open=max_open)
+    written = write_targets(extract_targets(rows, refs), tmp_path / "written")
+    assert [path.rsplit("/", 1)[1] for path in streamed] == ["target0.fasta", "target1.fasta", "target2.fasta"]
+
+    # Streamed FASTAs are ordered by reference file rather than by row, compare records as sets
+    for streamed_fasta, written_fasta in zip(sorted(streamed), sorted(written)):
+        with open(streamed_fasta) as fh:
+            streamed_records = fh.read().split(">")
+        with open(written_fasta) as fh:
+            written_records = fh.read().split(">")
+        assert len(streamed_records) == len(written_records) == 5
+        assert sorted(streamed_records) == sorted(written_records)
+
+
+def test_stream_overwrites_previous_output(tmp_path, targets):
+    rows, refs = targets
+    stream_targets(rows, refs, tmp_path / "out", max_open=1)
+    stream_targets(rows, refs, tmp_path / "out", max_open=1)
+    with open(tmp_path / "out" / "target0.fasta") as fh:
+        assert fh.read().count(">") == 4
+
+
+def test_extract_from_irregular_fasta(tmp_path):
+    # Lines of varying width can not be located through the index
+    reference = tmp_path / "ref.fasta"
+    reference.write_text(">ref\nACGTACGTAC\nGTACG\nTTTTTGGGGG\n")
+    seq = "ACGTACGTACGTACGTTTTTGGGGG"
+    assert extract_from_reference(reference, "fasta", [[0, 2, 8, "+"], [1, 9, 20, "-"]]) == [
+        [0, seq[1:8]],
+        [1, "AAAAACGTACGT"],
+    ]
@@ -0,0 +1,104 @@
+import gzip
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from camlhmp.faidx import (build_fasta_index, fetch_seqs, get_fasta_index,
+                           get_index_path)
+from camlhmp.utils import parse_seq_lengths, read_fasta
+
+DATA = Path(__file__).parent / "data" / "blast"
+TARGETS = DATA / "targets" / "sccmec-partial.fasta"
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    cache = tmp_path / "cache"
+    monkeypatch.setenv("CAML_CACHE_DIR", str(cache))
+    return cache
+
+
+def write_fasta(path, records, width=60):
+    with open(path, "w") as fh:
+        for name, seq in records:
+            fh.write(f">{name} description\n")
+            for i in range(0, len(seq), width):
+                fh.write(seq[i : i + width] + "\n")
+    return path
+
+
+def test_seq_lengths_match_records(tmp_path):
+    fasta = shutil.copy(TARGETS, tmp_path / "targets.fasta")
+    expected = {name: len(seq) for name, seq in read_fasta(fasta)}
+    assert parse_seq_lengths(fasta, "fasta") == expected
+    # The second call reads the saved index
+    assert parse_seq_lengths(fasta, "fasta") == expected
+
+
+def test_index_is_not_saved_next_to_fasta(tmp_path, cache_dir):
+    fasta = shutil.copy(TARGETS, tmp_path / "targets.fasta")
+    parse_seq_lengths(fasta, "fasta")
+    assert not list(tmp_path.glob("*.fai"))
+    assert get_index_path(fasta).exists()
+    assert get_index_path(fasta).parent == cache_dir / "faidx"
+
+
+def test_index_is_rebuilt_when_fasta_changes(tmp_path):
+    fasta = write_fasta(tmp_path / "seqs.fasta", [["a", "ACGT" * 10]])
+    assert parse_seq_lengths(fasta, "fasta") == {"a": 40}
+    write_fasta(fasta, [["a", "ACGT" * 10], ["b", "AC"]])
+    os.utime(fasta, ns=(0, 10**9))
+    assert parse_seq_lengths(fasta, "fasta") == {"a": 40, "b": 2}
+
+
+def test_unwritable_cache_keeps_index_in_memory(tmp_path, monkeypatch):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    monkeypatch.setenv("CAML_CACHE_DIR", str(blocker))
+    fasta = write_fasta(tmp_path / "seqs.fasta", [["a", "ACGT" * 10]])
+    assert [entry["length"] for entry in get_fasta_index(fasta)] == [40]
+
+
+def test_compressed_lengths(tmp_path, cache_dir):
+    fasta = tmp_path / "seqs.fasta.gz"
+    with gzip.open(fasta, "wt") as fh:
+        fh.write(">a\nACGTACGT\nACG\n>b\nAC\n")
+    assert parse_seq_lengths(fasta, "fasta") == {"a": 11, "b": 2}
+    # Compressed files are streamed, not indexed
+    assert not (cache_dir / "faidx").exists()
+    assert not list(tmp_path.glob("*.fai"))
+
+
+def test_other_formats_are_parsed(tmp_path):
+    fastq = tmp_path / "reads.fastq"
+    fastq.write_text("@r1\nACGTAC\n+\nIIIIII\n@r2\nACG\n+\nIII\n")
+    assert parse_seq_lengths(fastq, "fastq") == {"r1": 6, "r2": 3}
+
+
+def test_fetch_slices(tmp_path):
+    seqs = [["a", "ACGTTGCA" * 40], ["b", "GGCCAATT" * 3]]
+    fasta = write_fasta(tmp_path / "seqs.fasta", seqs, width=50)
+    regions = [["a", 0, None], ["a", 45, 155], ["b", 10, 12], ["a", 310, 1000]]
+    expected = [
+        ["a", seqs[0][1]],
+        ["a", seqs[0][1][45:155]],
+        ["b", seqs[1][1][10:12]],
+        ["a", seqs[0][1][310:]],
+    ]
+    assert list(fetch_seqs(fasta, regions)) == expected
+
+
+def test_irregular_records(tmp_path):
+    fasta = tmp_path / "irregular.fasta"
+    fasta.write_text(">a\nACGT\nACGTACGT\nAC\n>b\nACGT\nAC\n")
+    index = build_fasta_index(fasta)
+    assert [[entry["name"], entry["length"], entry["linebases"]] for entry in index] == [["a", 14, 0], ["b", 6, 4]]
+    # Irregular records can not be located by the index, but are still read and sliced
+    assert list(fetch_seqs(fasta)) == [["a", "ACGTACGTACGTAC"], ["b", "ACGTAC"]]
+    assert list(fetch_seqs(fasta, [["a", 2, 6], ["a", 10, None], ["b", 3, 5]])) == [
+        ["a", "GTAC"],
+        ["a", "GTAC"],
+        ["b", "TA"],
+    ]
@@ -0,0 +1,74 @@
+from pathlib import Path
+
+import pytest
+
+from camlhmp.engines.blast import BLASTN_COLS
+from camlhmp.framework import read_framework
+from camlhmp.parsers.blast import read_blast_hits
+from camlhmp.state import get_run_state, is_state_current, write_run_state
+from camlhmp.utils import write_tsv
+
+DATA = Path(__file__).parent / "data" / "blast" / "targets"
+TARGETS_YAML = DATA / "sccmec-partial.yaml"
+TARGETS_FASTA = DATA / "sccmec-partial.fasta"
+
+
+def hit(qseqid, pident, qstart, qend, qlen=100):
+    values = {col: "0" for col in BLASTN_COLS}
+    values.update({"qseqid": qseqid, "sseqid": "contig", "pident": str(pident), "qlen": str(qlen)})
+    values.update({"qstart": str(qstart), "qend": str(qend)})
+    return values
+
+
+@pytest.mark.parametrize("name", ["camlhmp.blastn.tsv", "camlhmp.blastn.tsv.gz"])
+def test_read_blast_hits_refilters(tmp_path, name):
+    hits = [hit("ccrA1", 100, 1, 100), hit("ccrB1", 90, 1, 100), hit("mecA", 100, 1, 50)]
+    write_tsv(hits, tmp_path / name)
+
+    target_hits, results = read_blast_hits(tmp_path / name)
+    assert target_hits == ["ccrA1", "ccrB1", "mecA"]
+    assert results == hits
+
+    # Identity is only filtered for blastn, coverage of each HSP for every tool
+    assert read_blast_hits(tmp_path / name, 95, 95)[0] == ["ccrA1"]
+    assert read_blast_hits(tmp_path / name, 95, 95, tool="tblastn")[0] == ["ccrA1", "ccrB1"]
+
+
+def test_read_blast_hits_without_hits(tmp_path):
+    write_tsv([dict(zip(BLASTN_COLS, ["NO_HITS"] * len(BLASTN_COLS)))], tmp_path / "camlhmp.blastn.tsv")
+    target_hits, results = read_blast_hits(tmp_path / "camlhmp.blastn.tsv")
+    assert target_hits == []
+    assert results[0]["qseqid"] == "NO_HITS"
+
+
+def test_read_blast_hits_missing_columns(tmp_path):
+    (tmp_path / "hits.tsv").write_text("qseqid\tpident\nccrA1\t100\n")
+    with pytest.raises(ValueError, match="missing expected columns"):
+        read_blast_hits(tmp_path / "hits.tsv")
+
+
+def test_type_changes_keep_the_state(tmp_path):
+    framework = read_framework(TARGETS_YAML)
+    state = get_run_state(DATA / "sccmec-i.fasta", TARGETS_FASTA, framework, min_pident=95)
+    write_run_state(state, tmp_path / "camlhmp.state.json")
+
+    # A new version that only changes the types can reuse the hits
+    updated = {**framework, "metadata": {**framework["metadata"], "version": "0.0.2"}, "types": []}
+    current = get_run_state(DATA / "sccmec-i.fasta", TARGETS_FASTA, updated, min_pident=95)
+    assert is_state_current(tmp_path / "camlhmp.state.json", current)
+
+    # Other inputs, targets or settings cannot
+    for changed in [
+        get_run_state(DATA / "sccmec-ii.fasta", TARGETS_FASTA, framework, min_pident=95),
+        get_run_state(DATA / "sccmec-i.fasta", DATA / "sccmec-ii.fasta", framework, min_pident=95),
+        get_run_state(DATA / "sccmec-i.fasta", TARGETS_FASTA, framework, min_pident=90),
+    ]:
+        assert not is_state_current(tmp_path / "camlhmp.state.json", changed)
+
+
+def test_unreadable_state(tmp_path):
+    framework = read_framework(TARGETS_YAML)
+    state = get_run_state(DATA / "sccmec-i.fasta", TARGETS_FASTA, framework)
+    assert not is_state_current(tmp_path / "missing.state.json", state)
+    (tmp_path / "camlhmp.state.json").write_text("{not json")
+    assert not is_state_current(tmp_path / "camlhmp.state.json", state)
@@ -0,0 +1,134 @@
+import json
+from pathlib import Path
+
+import yaml
+from click.testing import CliRunner
+
+from camlhmp.cli.blast.regions import camlhmp_blast_regions
+from camlhmp.cli.blast.targets import camlhmp_blast_targets
+from camlhmp.jsonl import get_record, write_record
+
+DATA = Path(__file__).parent / "data" / "blast"
+TARGETS_YAML = DATA / "targets" / "sccmec-partial.yaml"
+TARGETS_FASTA = DATA / "targets" / "sccmec-partial.fasta"
+REGIONS_YAML = DATA / "regions" / "pseudomonas-serogroup.yaml"
+REGIONS_FASTA = DATA / "regions" / "pseudomonas-serogroup.fasta"
+
+RESULT = {
+    "sample": "sample01",
+    "type": "IV",
+    "targets": "ccrA2,ccrB2,mecA",
+    "coverage": "100.00,99.50,100.00",
+    "hits": "1,1,2",
+    "schema": "sccmec",
+    "schema_version": "1.0.0",
+    "camlhmp_version": "1.1.0",
+    "params": "min-coverage=80",
+    "comment": "",
+}
+HIT = {
+    "sample": "sample01",
+    "qseqid": "mecA",
+    "sseqid": "contig1",
+    "pident": "99.5",
+    "qcovs": "100",
+    "qlen": "2007",
+    "slen": "35000",
+    "qstart": "1",
+    "qend": "2007",
+    "sstart": "100",
+    "send": "2106",
+    "length": "2007",
+    "evalue": "0.0",
+    "bitscore": "3672",
+}
+
+
+def kmer_framework(yaml_path, tmp_path):
+    with open(yaml_path) as fh:
+        framework = yaml.safe_load(fh)
+    framework["engine"]["type"] = "kmer"
+    framework_yaml = tmp_path / f"{yaml_path.stem}-kmer.yaml"
+    with open(framework_yaml, "w") as fh:
+        yaml.safe_dump(framework, fh)
+    return framework_yaml
+
+
+def test_get_record_types_values():
+    details = [{"sample": "sample01", "type": "IV", "status": "True", "targets": "ccrA2,mecA", "missing": ""}]
+    record = get_record("targets", RESULT, details, [HIT, {**HIT, "qseqid": "ccrA2", "pident": "98.1"}])
+
+    assert [record["sample"], record["mode"], record["schema"], record["schema_version"]] == [
+        "sample01",
+        "targets",
+        "sccmec",
+        "1.0.0",
+    ]
+    assert record["result"]["targets"] == ["ccrA2", "ccrB2", "mecA"]
+    assert record["result"]["coverage"] == [100.0, 99.5, 100.0]
+    assert record["result"]["hits"] == [1, 1, 2]
+    assert record["details"] == [
+        {"sample": "sample01", "type": "IV", "status": True, "targets": ["ccrA2", "mecA"], "missing": []}
+    ]
+    assert [hit["qseqid"] for hit in record["hits"]] == ["mecA", "ccrA2"]
+    assert record["hits"][0]["qlen"] == 2007 and record["hits"][1]["pident"] == 98.1
+
+
+def test_get_record_optional_tables():
+    record = get_record("targets", RESULT)
+    assert "details" not in record and "hits" not in record
+
+    # Samples without hits have a placeholder row, which is not a hit
+    assert get_record("targets", RESULT, hits=[{"sample": "NO_HITS"}])["hits"] == []
+
+
+def test_write_record_stdout(capsys):
+    write_record(get_record("targets", RESULT), "-")
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["result"]["type"] == "IV"
+
+
+def test_write_record_appends(tmp_path):
+    output = tmp_path / "results.jsonl"
+    write_record(get_record("targets", RESULT), output)
+    write_record(get_record("targets", {**RESULT, "sample": "sample02", "type": "V"}), output)
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [[record["sample"], record["result"]["type"]] for record in records] == [["sample01", "IV"], ["sample02", "V"]]
+
+
+def test_targets_jsonl_stdout(tmp_path):
+    result = CliRunner().invoke(
+        camlhmp_blast_targets,
+        ["-i", DATA / "targets" / "sccmec-iv.fasta", "-y", kmer_framework(TARGETS_YAML, tmp_path)]
+        + ["-t", TARGETS_FASTA, "-o", tmp_path / "out", "--jsonl", "-", "--jsonl-hits"],
+    )
+    assert result.exit_code == 0, result.output
+
+    # Only the record is written to STDOUT, the results table is not rendered
+    lines = result.stdout.splitlines()
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    assert [record["sample"], record["mode"], record["result"]["type"]] == ["camlhmp", "targets", "IV"]
+    assert {row["type"] for row in record["details"]} >= {"I", "IV"}
+    assert all(isinstance(hit["pident"], float) for hit in record["hits"])
+    assert {hit["qseqid"] for hit in record["hits"]} >= set(record["result"]["targets"])
+
+
+def test_regions_jsonl_file(tmp_path):
+    output = tmp_path / "results.jsonl"
+    for sample in ["O1-GCF_000504045.fna.gz", "O5-GCF_000006765.fna.gz"]:
+        result = CliRunner().invoke(
+            camlhmp_blast_regions,
+            ["-i", DATA / "regions" / sample, "-y", kmer_framework(REGIONS_YAML, tmp_path), "-t", REGIONS_FASTA]
+            + ["-o", tmp_path / sample, "-p", sample.split("-")[0], "--jsonl", output],
+        )
+        assert result.exit_code == 0, result.output
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [[record["sample"], record["mode"], record["result"]["type"]] for record in records] == [
+        ["O1", "regions", "O1"],
+        ["O5", "regions", "O5"],
+    ]
+    assert all("hits" not in record for record in records)
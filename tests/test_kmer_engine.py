@@ -0,0 +1,165 @@
+import random
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+import yaml
+from click.testing import CliRunner
+
+import camlhmp.engines.kmer as kmer
+from camlhmp.classifier import Classifier
+from camlhmp.cli.blast.targets import camlhmp_blast_targets
+from camlhmp.concordance import get_discordance
+from camlhmp.framework import read_framework
+
+DATA = Path(__file__).parent / "data" / "blast"
+TARGETS_YAML = DATA / "targets" / "sccmec-partial.yaml"
+TARGETS_FASTA = DATA / "targets" / "sccmec-partial.fasta"
+REGIONS_YAML = DATA / "regions" / "pseudomonas-serogroup.yaml"
+REGIONS_FASTA = DATA / "regions" / "pseudomonas-serogroup.fasta"
+
+# Sample files and the type expected for each
+TARGET_SAMPLES = {
+    "sccmec-i.fasta": "I",
+    "sccmec-ii.fasta": "II",
+    "sccmec-iii.fasta": "III",
+    "sccmec-iv.fasta": "IV",
+    "sccmec-multiple.fasta": "multiple",
+    "sccmec-negative.fasta": "-",
+}
+REGION_SAMPLES = {
+    "NT-GCF_000292685.fna.gz": "-",
+    "O1-GCF_000504045.fna.gz": "O1",
+    "O2-GCF_029857015.fna.gz": "O2",
+    "O5-GCF_000006765.fna.gz": "O5",
+}
+
+requires_blast = pytest.mark.skipif(shutil.which("blastn") is None, reason="BLAST+ (blastn) is not installed")
+
+
+def kmer_framework(yaml):
+    framework = read_framework(yaml)
+    return {**framework, "engine": {**framework["engine"], "type": "kmer"}}
+
+
+@pytest.fixture(scope="module")
+def kmer_targets():
+    return Classifier(kmer_framework(TARGETS_YAML), TARGETS_FASTA, mode="targets")
+
+
+@pytest.fixture(scope="module")
+def kmer_regions():
+    return Classifier(kmer_framework(REGIONS_YAML), REGIONS_FASTA, mode="regions")
+
+
+@pytest.mark.parametrize("sample,expected", TARGET_SAMPLES.items())
+def test_kmer_targets_calls(kmer_targets, sample, expected):
+    assert kmer_targets.classify(DATA / "targets" / sample)["result"]["type"] == expected
+
+
+@pytest.mark.parametrize("sample,expected", REGION_SAMPLES.items())
+def test_kmer_regions_calls(kmer_regions, sample, expected):
+    assert kmer_regions.classify(DATA / "regions" / sample)["result"]["type"] == expected
+
+
+def test_kmer_rejects_protein_frameworks():
+    # The alleles fixture is a tblastn framework, the k-mer engine only searches nucleotides
+    with pytest.raises(ValueError, match="tblastn"):
+        Classifier(
+            kmer_framework(DATA / "alleles" / "spn-pbptype.yaml"),
+            DATA / "alleles" / "spn-pbptype.fasta",
+            mode="alleles",
+        )
+
+
+@requires_blast
+@pytest.mark.parametrize("sample", TARGET_SAMPLES)
+def test_kmer_targets_concordance(kmer_targets, sample):
+    blast = Classifier(TARGETS_YAML, TARGETS_FASTA, mode="targets")
+    expected = blast.classify(DATA / "targets" / sample)["result"]
+    result = kmer_targets.classify(DATA / "targets" / sample)["result"]
+    assert get_discordance("targets", expected, result, blast.framework["targets"]) == []
+
+
+@requires_blast
+@pytest.mark.parametrize("sample", REGION_SAMPLES)
+def test_kmer_regions_concordance(kmer_regions, sample):
+    blast = Classifier(REGIONS_YAML, REGIONS_FASTA, mode="regions")
+    expected = blast.classify(DATA / "regions" / sample)["result"]
+    result = kmer_regions.classify(DATA / "regions" / sample)["result"]
+    assert get_discordance("regions", expected, result, blast.framework["targets"]) == []
+
+
+def _slow_hashes(seq, k):
+    """Hash each canonical k-mer one at a time"""
+    codes = {"A": 0, "C": 1, "G": 2, "T": 3}
+    hashes = []
+    for i in range(len(seq) - k + 1):
+        forward = seq[i : i + k]
+        if any(base not in codes for base in forward):
+            hashes.append(int(kmer.INVALID_HASH))
+            continue
+        packed = [
+            sum(codes[b] << (2 * (k - j - 1)) for j, b in enumerate(s))
+            for s in [forward, kmer.reverse_complement(forward)]
+        ]
+        hashes.append((min(packed) * int(kmer.HASH_MULTIPLIER)) % 2**64)
+    return hashes
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 1 << 16])
+def test_kmer_hashes_and_minimizers(monkeypatch, chunk_size):
+    monkeypatch.setattr(kmer, "CHUNK_SIZE", chunk_size)
+    rng = random.Random(42)
+    seq = "".join(rng.choice("ACGT") for _ in range(300)) + "N" + "ACGT" * 5
+
+    hashes, canonical = kmer.kmer_hashes(seq, k=15)
+    assert hashes.tolist() == _slow_hashes(seq, 15)
+    # A sequence and its reverse complement share the same canonical k-mers
+    reverse, _ = kmer.kmer_hashes(kmer.reverse_complement(seq), k=15)
+    assert sorted(hashes.tolist()) == sorted(reverse.tolist())
+    assert canonical.dtype == bool and len(canonical) == len(hashes)
+
+    expected = set()
+    for start in range(len(hashes) - 10 + 1):
+        window = hashes[start : start + 10]
+        position = start + int(np.argmin(window))  # argmin returns the leftmost minimum
+        if hashes[position] != kmer.INVALID_HASH:
+            expected.add(position)
+    assert kmer.get_minimizers(hashes, w=10).tolist() == sorted(expected)
+
+
+def test_minimizers_prefer_leftmost_ties():
+    # Windows [1, 3, 1] and [4, 4, 4] have tied minimums, the first of each is kept
+    hashes = np.array([5, 1, 3, 1, 4, 4, 4], dtype=np.uint64)
+    assert kmer.get_minimizers(hashes, w=3).tolist() == [1, 3, 4]
+
+
+def test_banded_align():
+    assert kmer.banded_align("ACGTACGT", "ACGTACGT") == ["MMMMMMMM", 8, 8]
+    assert kmer.banded_align("ACGTACGT", "ACGAACGT") == ["MMMXMMMM", 8, 8]
+    ops, target_len, subject_len = kmer.banded_align("ACGTTTACGT", "ACGTACGT")
+    assert [ops.count("D"), target_len, subject_len] == [2, 10, 8]
+    # Extension stops before a run of mismatches drops the score too far
+    assert kmer.banded_align(
+        "ACGTACGTAC" + "A" * 20, "ACGTACGTAC" + "C" * 20, extend=True
+    ) == ["M" * 10, 10, 10]
+
+
+def test_kmer_skips_subject_prefilter(tmp_path, caplog):
+    with open(TARGETS_YAML) as fh:
+        framework = yaml.safe_load(fh)
+    framework["engine"]["type"] = "kmer"
+    framework_yaml = tmp_path / "sccmec-kmer.yaml"
+    with open(framework_yaml, "w") as fh:
+        yaml.safe_dump(framework, fh)
+
+    result = CliRunner().invoke(
+        camlhmp_blast_targets,
+        ["-i", DATA / "targets" / "sccmec-i.fasta", "-y", framework_yaml, "-t", TARGETS_FASTA]
+        + ["-o", tmp_path / "out", "--subject-prefilter"],
+    )
+    assert result.exit_code == 0, result.output
+    assert "skipping for engine=kmer" in caplog.text
+    assert (tmp_path / "out" / "camlhmp.tsv").read_text().splitlines()[1].split("\t")[1] == "I"
@@ -0,0 +1,100 @@
+from pathlib import Path
+
+import pytest
+
+import camlhmp.orfs
+from camlhmp.engines.blast import BLASTN_COLS, evict_blastdb_cache
+from camlhmp.orfs import ORF_COLS, restore_orf_coordinates, subject_orfs
+
+# A 30 codon ORF on the forward strand
+SUBJECT = ">contig1\nATG" + "GCT" * 29 + "TAA\n"
+
+
+def write_orfs(path, orfs):
+    with open(path, "w") as fh:
+        fh.write("\t".join(ORF_COLS) + "\n")
+        for orf in orfs:
+            fh.write("\t".join(str(val) for val in orf) + "\n")
+    return str(path)
+
+
+def make_hit(qseqid, sseqid, pident, qstart, qend, sstart, send, qlen=100):
+    vals = {
+        "qseqid": qseqid,
+        "sseqid": sseqid,
+        "pident": str(pident),
+        "qcovs": "100",
+        "qlen": str(qlen),
+        "slen": "200",
+        "length": str(qend - qstart + 1),
+        "qstart": str(qstart),
+        "qend": str(qend),
+        "sstart": str(sstart),
+        "send": str(send),
+    }
+    return {col: vals.get(col, "0") for col in BLASTN_COLS}
+
+
+def test_restore_orf_coordinates(tmp_path):
+    orfs_tsv = write_orfs(
+        tmp_path / "orfs.tsv",
+        [["orf1", "contig1", "+", 101, 400, 5000], ["orf2", "contig2", "-", 1001, 1300, 8000]],
+    )
+    results = restore_orf_coordinates(
+        [make_hit("pbp1a", "orf1", 100, 1, 100, 1, 100), make_hit("pbp2b", "orf2", 100, 1, 50, 1, 50)],
+        orfs_tsv,
+    )
+    assert [results[0]["sseqid"], results[0]["sstart"], results[0]["send"], results[0]["slen"]] == [
+        "contig1", "101", "400", "5000"
+    ]
+    # Minus strand coordinates are reversed, as tblastn reports them
+    assert [results[1]["sseqid"], results[1]["sstart"], results[1]["send"]] == ["contig2", "1300", "1151"]
+    assert results[1]["qcovs"] == "50"
+
+
+def test_restore_orf_coordinates_keeps_low_identity_hits(tmp_path):
+    # Like tblastn, hits are not filtered by identity, min_pident is applied downstream
+    orfs_tsv = write_orfs(tmp_path / "orfs.tsv", [["orf1", "contig1", "+", 1, 300, 5000]])
+    results = restore_orf_coordinates([make_hit("pbp1a", "orf1", 80.5, 1, 100, 1, 100)], orfs_tsv)
+    assert len(results) == 1 and results[0]["pident"] == "80.5"
+
+
+def test_restore_orf_coordinates_no_hits(tmp_path):
+    orfs_tsv = write_orfs(tmp_path / "orfs.tsv", [["orf1", "contig1", "+", 1, 300, 5000]])
+    no_hits = dict(zip(BLASTN_COLS, ["NO_HITS"] * len(BLASTN_COLS)))
+    assert restore_orf_coordinates([no_hits], orfs_tsv) == [no_hits]
+
+
+def test_subject_orfs_are_cached(tmp_path):
+    subject = tmp_path / "subject.fasta"
+    subject.write_text(SUBJECT)
+    cache_dir = tmp_path / "cache"
+    with subject_orfs(subject, tmp_path, cache_dir) as (orfs_faa, orfs_tsv, orf_time):
+        assert Path(orfs_faa).read_text().startswith(">orf_1\nM" + "A" * 29 + "\n")
+    with subject_orfs(subject, tmp_path, cache_dir) as (cached_faa, _, cached_time):
+        assert [cached_faa, cached_time] == [orfs_faa, 0]
+
+
+def test_subject_orfs_are_not_evicted_while_in_use(tmp_path):
+    subject = tmp_path / "subject.fasta"
+    subject.write_text(SUBJECT)
+    cache_dir = tmp_path / "cache"
+    with subject_orfs(subject, tmp_path, cache_dir) as (orfs_faa, orfs_tsv, _):
+        assert evict_blastdb_cache(cache_dir, 0) == []
+        assert Path(orfs_tsv).exists()
+    assert evict_blastdb_cache(cache_dir, 0) == [str(Path(orfs_faa).parent)]
+
+
+def test_failed_predictions_are_removed(tmp_path, monkeypatch):
+    def fail(subject, outdir, min_length):
+        (Path(outdir) / "orfs.faa").write_text("partial")
+        raise ValueError("bad input")
+
+    monkeypatch.setattr(camlhmp.orfs, "predict_orfs", fail)
+    subject = tmp_path / "subject.fasta"
+    subject.write_text(SUBJECT)
+    cache_dir = tmp_path / "cache"
+    with pytest.raises(ValueError):
+        with subject_orfs(subject, tmp_path, cache_dir):
+            pass
+    assert [path.name for path in cache_dir.iterdir() if not path.name.endswith(".lock")] == []
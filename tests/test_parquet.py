@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import pytest
+
+from camlhmp.engines.blast import BLASTN_COLS
+from camlhmp.parquet import convert_rows, get_column_type, write_parquet
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def make_result(sample, schema, version, type="I"):
+    return {
+        "sample": sample,
+        "type": type,
+        "targets": "ccrA1,mecA",
+        "schema": schema,
+        "schema_version": version,
+        "camlhmp_version": "1.1.4",
+        "params": "min-coverage=95;min-pident=95",
+        "comment": "",
+    }
+
+
+def make_hit(qseqid):
+    vals = {"qseqid": qseqid, "sseqid": "contig1", "pident": "99.5", "qlen": "100", "bitscore": "180.2"}
+    return {col: vals.get(col, "1") for col in BLASTN_COLS}
+
+
+def test_column_types():
+    assert get_column_type("details", "coverage") == "list<float64>"
+    assert get_column_type("details", "status") == "bool"
+    assert get_column_type("results", "mecA_pident") == "float64"
+    # Partition columns are never numbers, even if they end like one
+    assert get_column_type("results", "schema_version") == "string"
+    assert get_column_type("hits", "slen") == "int64"
+    assert convert_rows([{"type": "I", "targets": ""}], "results") == [{"type": "I", "targets": []}]
+
+
+def test_partitioned_by_schema(tmp_path):
+    write_parquet([make_result("a", "sccmec", "1.0.0")], tmp_path, "results", "a", "sccmec", "1.0.0")
+    write_parquet([make_result("b", "sccmec", "1.0.0")], tmp_path, "results", "b", "sccmec", "1.0.0")
+    write_parquet([make_result("a", "sccmec", "1.1.0", "II")], tmp_path, "results", "a", "sccmec", "1.1.0")
+    write_parquet([make_result("a", "spa", "1.0.0", "t008")], tmp_path, "results", "a", "spa", "1.0.0")
+
+    files = sorted(str(path.relative_to(tmp_path)) for path in Path(tmp_path).rglob("*.parquet"))
+    assert files == [
+        "results/schema=sccmec/schema_version=1.0.0/a-0.parquet",
+        "results/schema=sccmec/schema_version=1.0.0/b-0.parquet",
+        "results/schema=sccmec/schema_version=1.1.0/a-0.parquet",
+        "results/schema=spa/schema_version=1.0.0/a-0.parquet",
+    ]
+
+    # Only the partition of a schema is read when filtering on it
+    table = pq.read_table(tmp_path / "results", filters=[("schema", "=", "sccmec"), ("schema_version", "=", "1.1.0")])
+    assert table.column("type").to_pylist() == ["II"]
+    assert table.column("targets").to_pylist() == [["ccrA1", "mecA"]]
+
+
+def test_rewrites_replace_a_sample(tmp_path):
+    for type in ["I", "II"]:
+        write_parquet([make_result("a", "sccmec", "1.0.0", type)], tmp_path, "results", "a", "sccmec", "1.0.0")
+    assert pq.read_table(tmp_path / "results").column("type").to_pylist() == ["II"]
+
+
+def test_hits_are_partitioned(tmp_path):
+    no_hits = dict(zip(BLASTN_COLS, ["NO_HITS"] * len(BLASTN_COLS)))
+    write_parquet([make_hit("mecA"), no_hits], tmp_path, "hits", "a", "sccmec", "1.0.0")
+    table = pq.read_table(tmp_path / "hits" / "schema=sccmec" / "schema_version=1.0.0" / "a-0.parquet")
+    # Placeholder rows are dropped and numbers are typed
+    assert table.column("sample").to_pylist() == ["a"]
+    assert table.column("slen").to_pylist() == [1]
+    assert table.column("pident").to_pylist() == [99.5]
@@ -0,0 +1,52 @@
+import gzip
+import random
+
+import pytest
+
+from camlhmp.prefilter import (SEED_SIZE, get_subject_prefilter_conflicts,
+                               prefilter_targets)
+
+RNG = random.Random(42)
+MECA, BLAZ = ["".join(RNG.choice("ACGT") for _ in range(300)) for _ in range(2)]
+TARGETS = f">mecA methicillin resistance\n{MECA}\n>blaZ\n{BLAZ}\n"
+SUBJECT = f">contig1\nGGGGG{MECA}GGGGG\n"
+
+
+def test_megablast_does_not_conflict():
+    assert get_subject_prefilter_conflicts({"mecA": "megablast"}, {}) == []
+    assert get_subject_prefilter_conflicts(None, None) == []
+
+
+def test_other_tasks_conflict():
+    tasks = {"mecA": "megablast", "IS431": "blastn-short", "ccrA1": "dc-megablast"}
+    assert get_subject_prefilter_conflicts(tasks, {}) == ["blastn-short", "dc-megablast"]
+
+
+def test_small_word_size_conflicts():
+    tasks = {"mecA": "megablast"}
+    assert get_subject_prefilter_conflicts(tasks, {"word_size": SEED_SIZE - 1}) == [f"word_size={SEED_SIZE - 1}"]
+    assert get_subject_prefilter_conflicts(tasks, {"word_size": SEED_SIZE}) == []
+    assert get_subject_prefilter_conflicts(tasks, {"word_size": 32}) == []
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_prefilter_targets(tmp_path, compressed):
+    targets = tmp_path / ("targets.fasta.gz" if compressed else "targets.fasta")
+    subject = tmp_path / ("subject.fasta.gz" if compressed else "subject.fasta")
+    for path, text in [[targets, TARGETS], [subject, SUBJECT]]:
+        if compressed:
+            with gzip.open(path, "wt") as fh:
+                fh.write(text)
+        else:
+            path.write_text(text)
+
+    output = tmp_path / "kept.fasta"
+    assert prefilter_targets(subject, targets, output, 95, 95) == [["mecA"], ["blaZ"]]
+    # Full headers are kept in the output
+    assert output.read_text() == f">mecA methicillin resistance\n{MECA}\n"
+
+
+def test_other_engines_conflict():
+    # The kmer engine seeds hits with k-mers shorter than the prefilter's seeds
+    assert get_subject_prefilter_conflicts(None, {}, engine="kmer") == ["engine=kmer"]
+    assert get_subject_prefilter_conflicts({"mecA": "megablast"}, {}, engine="blast") == []
@@ -0,0 +1,60 @@
+import gzip
+import io
+from pathlib import Path
+
+import pytest
+from Bio import SeqIO
+
+import camlhmp.utils
+from camlhmp.utils import read_fasta
+
+DATA = Path(__file__).parent / "data" / "blast"
+RECORDS = ">seq1 a description\nACGTacgt\nNNNN\n>seq2\n\nTTTT\r\nGG\n>empty\n>seq3 >not a header\nAC GT\n"
+EXPECTED = [["seq1", "ACGTacgtNNNN"], ["seq2", "TTTTGG"], ["empty", ""], ["seq3", "ACGT"]]
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 1024])
+def test_block_boundaries(tmp_path, monkeypatch, read_size):
+    # Records must be reassembled no matter where the blocks are split
+    monkeypatch.setattr(camlhmp.utils, "READ_SIZE", read_size)
+    fasta = tmp_path / "seqs.fasta"
+    fasta.write_text(RECORDS)
+    assert list(read_fasta(fasta)) == EXPECTED
+
+
+def test_compressed(tmp_path):
+    fasta = tmp_path / "seqs.fasta.gz"
+    with gzip.open(fasta, "wt") as fh:
+        fh.write(RECORDS)
+    assert list(read_fasta(fasta)) == EXPECTED
+
+
+def test_uppercase(tmp_path):
+    fasta = tmp_path / "seqs.fasta"
+    fasta.write_text(RECORDS)
+    assert list(read_fasta(fasta, uppercase=True))[0] == ["seq1", "ACGTACGTNNNN"]
+
+
+def test_empty_file(tmp_path):
+    fasta = tmp_path / "empty.fasta"
+    fasta.write_text("")
+    assert list(read_fasta(fasta)) == []
+
+
+@pytest.mark.parametrize("fasta", ["targets/sccmec-partial.fasta", "regions/O1-GCF_000504045.fna.gz"])
+def test_matches_biopython(monkeypatch, fasta):
+    monkeypatch.setattr(camlhmp.utils, "READ_SIZE", 4096)
+    with camlhmp.utils.open_seqfile(DATA / fasta) as fh:
+        expected = [[record.id, str(record.seq)] for record in SeqIO.parse(io.TextIOWrapper(fh), "fasta")]
+    assert list(read_fasta(DATA / fasta)) == expected
+
+
+def test_headers(tmp_path):
+    fasta = tmp_path / "seqs.fasta"
+    fasta.write_text(RECORDS)
+    assert [header for header, _ in read_fasta(fasta, headers=True)] == [
+        "seq1 a description",
+        "seq2",
+        "empty",
+        "seq3 >not a header",
+    ]
@@ -0,0 +1,80 @@
+import subprocess
+import time
+
+import pytest
+
+import camlhmp.utils
+from camlhmp.utils import CommandError, execute, run_command
+
+
+def test_output_and_usage():
+    result = run_command("echo out; echo err >&2")
+    assert result["stdout"] == "out\n"
+    assert result["stderr"] == "err\n"
+    assert result["returncode"] == 0
+    assert set(result["usage"]) == {"wall_time", "user_time", "system_time", "max_rss"}
+
+
+def test_directory(tmp_path):
+    assert run_command("pwd", directory=tmp_path)["stdout"].strip() == str(tmp_path)
+
+
+def test_large_output_does_not_block():
+    # More than a pipe buffer on both stdout and stderr
+    result = run_command("head -c 1000000 /dev/zero; head -c 1000000 /dev/zero >&2", timeout=30)
+    assert len(result["stdout"]) == len(result["stderr"]) == 1000000
+
+
+def test_failure():
+    with pytest.raises(CommandError) as e:
+        run_command("echo partial; echo broken >&2; exit 3")
+    assert e.value.returncode == 3
+    assert e.value.stdout == "partial\n"
+    assert "broken" in str(e.value)
+    assert not e.value.timed_out
+    assert isinstance(e.value, subprocess.CalledProcessError)
+
+
+def test_pipefail():
+    with pytest.raises(CommandError):
+        run_command("false | cat")
+
+
+def test_timeout_stops_the_pipeline(tmp_path):
+    start = time.perf_counter()
+    with pytest.raises(CommandError) as e:
+        run_command(f"sleep 30 | cat; touch {tmp_path}/finished", timeout=0.5)
+    assert e.value.timed_out
+    assert "timed out" in str(e.value)
+    assert time.perf_counter() - start < 10
+    assert not (tmp_path / "finished").exists()
+
+
+def test_timeout_kills_commands_ignoring_sigterm(monkeypatch):
+    monkeypatch.setattr(camlhmp.utils, "KILL_GRACE", 0.5)
+    start = time.perf_counter()
+    with pytest.raises(CommandError) as e:
+        run_command("trap '' TERM; sleep 30", timeout=0.5)
+    assert e.value.timed_out
+    assert e.value.returncode < 0
+    assert time.perf_counter() - start < 10
+
+
+def test_execute():
+    assert execute("true") is True
+    assert execute("echo out", capture=True) == ["out\n", ""]
+    with pytest.raises(CommandError):
+        execute("exit 1")
+
+
+def test_execute_deprecated_arguments(tmp_path):
+    with pytest.warns(DeprecationWarning, match="stdout_file"):
+        assert execute("echo out; echo err >&2", stdout_file=tmp_path / "out", stderr_file=tmp_path / "err")
+    assert (tmp_path / "out").read_text() == "out\n"
+    assert (tmp_path / "err").read_text() == "err\n"
+
+    with pytest.warns(DeprecationWarning, match="allow_fail"):
+        error = execute("echo failed >&2; exit 2", allow_fail=True, stderr_file=tmp_path / "err")
+    assert isinstance(error, CommandError)
+    assert error.returncode == 2
+    assert (tmp_path / "err").read_text() == "failed\n"
@@ -0,0 +1,140 @@
+import csv
+import gzip
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from camlhmp.cli.blast.targets import camlhmp_blast_targets
+from camlhmp.framework import read_framework
+from camlhmp.state import (get_reusable_hits, get_run_state, is_state_current,
+                           write_run_state)
+from camlhmp.utils import read_fasta
+
+DATA = Path(__file__).parent / "data" / "blast" / "targets"
+TARGETS_YAML = DATA / "sccmec-partial.yaml"
+TARGETS_FASTA = DATA / "sccmec-partial.fasta"
+
+requires_blast = pytest.mark.skipif(shutil.which("blastn") is None, reason="BLAST+ (blastn) is not installed")
+
+
+@pytest.fixture
+def framework():
+    return read_framework(TARGETS_YAML)
+
+
+def write_previous_run(tmp_path, framework, hits_tsv, hits_output="all", hits_compression="none"):
+    state = get_run_state(
+        DATA / "sccmec-i.fasta",
+        TARGETS_FASTA,
+        framework,
+        hits_tsv=hits_tsv,
+        hits_output=hits_output,
+        hits_compression=hits_compression,
+        min_pident=95,
+    )
+    write_run_state(state, tmp_path / "camlhmp.state.json")
+    return state
+
+
+def test_hits_do_not_change_the_state(tmp_path, framework):
+    state = write_previous_run(tmp_path, framework, tmp_path / "camlhmp.blastn.tsv", hits_output="typed")
+    assert state["hits"] == {"file": "camlhmp.blastn.tsv", "output": "typed", "compression": "none"}
+    current = get_run_state(DATA / "sccmec-i.fasta", TARGETS_FASTA, framework, min_pident=95)
+    assert is_state_current(tmp_path / "camlhmp.state.json", current)
+
+
+def test_all_hits_are_reused(tmp_path, framework):
+    state = write_previous_run(tmp_path, framework, tmp_path / "camlhmp.blastn.tsv")
+    (tmp_path / "camlhmp.blastn.tsv").write_text("qseqid\n")
+    assert get_reusable_hits(tmp_path / "camlhmp.state.json", state) == str(tmp_path / "camlhmp.blastn.tsv")
+
+
+@pytest.mark.parametrize("hits_output", ["passed", "typed"])
+def test_partial_hits_are_not_reused(tmp_path, framework, hits_output):
+    state = write_previous_run(tmp_path, framework, tmp_path / "camlhmp.blastn.tsv", hits_output=hits_output)
+    (tmp_path / "camlhmp.blastn.tsv").write_text("qseqid\n")
+    assert get_reusable_hits(tmp_path / "camlhmp.state.json", state) is None
+
+
+def test_changed_settings_are_not_reused(tmp_path, framework):
+    write_previous_run(tmp_path, framework, tmp_path / "camlhmp.blastn.tsv")
+    (tmp_path / "camlhmp.blastn.tsv").write_text("qseqid\n")
+    current = get_run_state(DATA / "sccmec-i.fasta", TARGETS_FASTA, framework, min_pident=90)
+    assert get_reusable_hits(tmp_path / "camlhmp.state.json", current) is None
+
+
+def test_previous_compression_is_used(tmp_path, framework):
+    write_previous_run(tmp_path, framework, tmp_path / "camlhmp.blastn.tsv.gz", hits_compression="gzip")
+    (tmp_path / "camlhmp.blastn.tsv.gz").write_bytes(gzip.compress(b"qseqid\n"))
+    # A stale table with the current run's name must not be picked up instead
+    (tmp_path / "camlhmp.blastn.tsv").write_text("qseqid\n")
+    current = get_run_state(
+        DATA / "sccmec-i.fasta", TARGETS_FASTA, framework, hits_tsv=tmp_path / "camlhmp.blastn.tsv", min_pident=95
+    )
+    assert get_reusable_hits(tmp_path / "camlhmp.state.json", current) == str(tmp_path / "camlhmp.blastn.tsv.gz")
+
+
+def test_missing_or_unrecorded_hits_are_not_reused(tmp_path, framework):
+    state = write_previous_run(tmp_path, framework, tmp_path / "camlhmp.blastn.tsv")
+    assert get_reusable_hits(tmp_path / "camlhmp.state.json", state) is None
+
+    # States written before the hits were recorded
+    (tmp_path / "camlhmp.blastn.tsv").write_text("qseqid\n")
+    legacy = {key: val for key, val in state.items() if key != "hits"}
+    (tmp_path / "camlhmp.state.json").write_text(json.dumps(legacy))
+    assert get_reusable_hits(tmp_path / "camlhmp.state.json", state) is None
+
+
+def run_targets(sample, framework_yaml, outdir, *args):
+    result = CliRunner().invoke(
+        camlhmp_blast_targets,
+        ["-i", sample, "-y", framework_yaml, "-t", TARGETS_FASTA, "-o", outdir, "--silent", *args],
+    )
+    assert result.exit_code == 0, result.output
+    with open(f"{outdir}/camlhmp.tsv", newline="") as fh:
+        return next(csv.DictReader(fh, delimiter="\t"))["type"]
+
+
+@requires_blast
+@pytest.mark.parametrize("hits_output", ["all", "typed"])
+def test_incremental_with_new_type(tmp_path, hits_output):
+    # A sample with only ccrA1 is untyped, until a type made of just ccrA1 is added
+    sample = tmp_path / "ccrA1.fasta"
+    seq = next(seq for name, seq in read_fasta(TARGETS_FASTA) if name == "ccrA1")
+    sample.write_text(f">contig\n{'A' * 200}{seq}{'A' * 200}\n")
+    with open(TARGETS_YAML) as fh:
+        new_framework = yaml.safe_load(fh)
+    new_framework["types"].append({"name": "A1", "targets": ["ccrA1"]})
+    new_framework["metadata"]["version"] = "0.0.2"
+    new_yaml = tmp_path / "sccmec-partial-new.yaml"
+    with open(new_yaml, "w") as fh:
+        yaml.safe_dump(new_framework, fh)
+
+    outdir = tmp_path / "out"
+    assert run_targets(sample, TARGETS_YAML, outdir, "--incremental", "--hits-output", hits_output) == "-"
+    # The rerun writes all hits, but can only reuse those of a previous run that did too
+    assert run_targets(sample, new_yaml, outdir, "--incremental") == "A1"
+
+
+def test_state_is_only_recorded_when_incremental(tmp_path):
+    # The kmer engine does not require BLAST+
+    with open(TARGETS_YAML) as fh:
+        kmer_framework = yaml.safe_load(fh)
+    kmer_framework["engine"]["type"] = "kmer"
+    kmer_yaml = tmp_path / "sccmec-kmer.yaml"
+    with open(kmer_yaml, "w") as fh:
+        yaml.safe_dump(kmer_framework, fh)
+
+    sample = DATA / "sccmec-i.fasta"
+    outdir = tmp_path / "out"
+    assert run_targets(sample, kmer_yaml, outdir) == "I"
+    assert not (outdir / "camlhmp.state.json").exists()
+
+    assert run_targets(sample, kmer_yaml, outdir, "--incremental") == "I"
+    assert json.loads((outdir / "camlhmp.state.json").read_text())["hits"]["output"] == "all"
+    # A recorded state does not block a plain rerun
+    assert run_targets(sample, kmer_yaml, outdir, "--force") == "I"
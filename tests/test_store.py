@@ -0,0 +1,81 @@
+import csv
+import sqlite3
+
+import pytest
+from click.testing import CliRunner
+
+from camlhmp.cli.query import camlhmp_query
+from camlhmp.store import get_target_rows, open_store, query_runs, store_run
+
+
+def add_sample(db, sample, type, found, schema="sccmec"):
+    run = {"sample": sample, "schema": schema, "schema_version": "1.0.0", "mode": "targets", "type": type}
+    type_rows = [{"type": type, "status": True, "targets": ",".join(found)}]
+    target_results = {target: target in found for target in ["ccrA1", "ccrA2", "mecA"]}
+    return store_run(db, run, type_rows, get_target_rows("targets", target_results))
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = tmp_path / "camlhmp.sqlite"
+    add_sample(db, "a", "I", ["ccrA1", "mecA"])
+    add_sample(db, "b", "II", ["ccrA2", "mecA"])
+    add_sample(db, "c", "-", ["ccrA2"])
+    add_sample(db, "a", "spa-t008", ["mecA"], schema="spa")
+    return db
+
+
+def samples(runs):
+    return [[run["sample"], run["schema"]] for run in runs]
+
+
+def test_query_round_trip(db):
+    conn = open_store(db, readonly=True)
+    try:
+        assert samples(query_runs(conn, has=["ccrA2"], lacks=["mecA"])) == [["c", "sccmec"]]
+        assert samples(query_runs(conn, has=["mecA"], schema="sccmec")) == [["a", "sccmec"], ["b", "sccmec"]]
+        assert samples(query_runs(conn, types=["II", "spa-t008"])) == [["a", "spa"], ["b", "sccmec"]]
+        assert samples(query_runs(conn, not_types=["I", "-"], schema="sccmec")) == [["b", "sccmec"]]
+    finally:
+        conn.close()
+
+
+def test_latest_run_of_each_sample(db):
+    add_sample(db, "a", "-", [])
+    conn = open_store(db, readonly=True)
+    try:
+        assert [run["type"] for run in query_runs(conn, schema="sccmec") if run["sample"] == "a"] == ["-"]
+        assert [run["type"] for run in query_runs(conn, schema="sccmec", latest=False) if run["sample"] == "a"] == [
+            "I",
+            "-",
+        ]
+    finally:
+        conn.close()
+
+
+def test_readonly_leaves_the_database_unchanged(tmp_path):
+    db = tmp_path / "other.sqlite"
+    sqlite3.connect(db).close()
+    conn = open_store(db, readonly=True)
+    try:
+        # No tables are created and the journal mode is not changed to WAL
+        assert conn.execute("SELECT name FROM sqlite_master").fetchall() == []
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("CREATE TABLE runs (id INTEGER)")
+    finally:
+        conn.close()
+
+
+def test_query_cli(db, tmp_path):
+    output = tmp_path / "matches.tsv"
+    result = CliRunner().invoke(camlhmp_query, ["--db", db, "--has", "mecA", "--schema", "sccmec", "-o", output])
+    assert result.exit_code == 0, result.output
+    with open(output, newline="") as fh:
+        assert [row["sample"] for row in csv.DictReader(fh, delimiter="\t")] == ["a", "b"]
+
+    # Queries can not change the database
+    result = CliRunner().invoke(camlhmp_query, ["--db", db, "--sql", "DELETE FROM runs"])
+    assert isinstance(result.exception, sqlite3.OperationalError)
+    result = CliRunner().invoke(camlhmp_query, ["--db", db, "--count"])
+    assert result.output.strip().endswith("4")
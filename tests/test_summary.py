@@ -0,0 +1,84 @@
+import fcntl
+import io
+import multiprocessing
+import time
+
+import pytest
+
+from camlhmp.summary import append_summary, merge_summaries
+from camlhmp.utils import is_compressed, open_seqfile
+
+COLUMNS = ["sample", "type"]
+
+
+def append_rows(output, worker, count, barrier):
+    barrier.wait()
+    for i in range(count):
+        append_summary([{"sample": f"sample{worker}-{i}", "type": "A"}], output, COLUMNS)
+
+
+def read_lines(output):
+    assert is_compressed(output) == str(output).endswith((".gz", ".zst"))
+    with io.TextIOWrapper(open_seqfile(output)) as fh:
+        return fh.read().splitlines()
+
+
+@pytest.mark.parametrize("name", ["summary.tsv", "summary.tsv.gz", "summary.tsv.zst"])
+def test_concurrent_appends_write_one_header(tmp_path, name):
+    output = str(tmp_path / name)
+    ctx = multiprocessing.get_context("fork")
+    barrier = ctx.Barrier(9)
+    workers = [ctx.Process(target=append_rows, args=(output, worker, 20, barrier)) for worker in range(8)]
+    # Hold the lock until every worker has opened the still empty summary
+    with open(output, "ab") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        time.sleep(0.5)
+        fcntl.flock(fh, fcntl.LOCK_UN)
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    lines = read_lines(output)
+    assert lines.count("sample\ttype") == 1
+    assert lines[0] == "sample\ttype"
+    assert len(lines) == 1 + 8 * 20
+
+
+@pytest.mark.parametrize("name", ["summary.tsv", "summary.tsv.gz", "summary.tsv.zst"])
+def test_header_only_when_new(tmp_path, name):
+    output = tmp_path / name
+    append_summary([], output, COLUMNS)
+    append_summary([{"sample": "a", "type": "A"}], output, COLUMNS)
+    assert read_lines(output) == ["sample\ttype", "a\tA"]
+
+
+def test_mismatched_columns(tmp_path):
+    output = tmp_path / "summary.tsv"
+    append_summary([], output, COLUMNS)
+    with pytest.raises(ValueError, match="do not match"):
+        append_summary([], output, ["sample", "type", "comment"])
+
+
+@pytest.mark.parametrize("name", ["all.tsv.gz", "all.tsv.zst"])
+def test_merge_summaries(tmp_path, name):
+    inputs = []
+    for i in range(3):
+        tsv = tmp_path / f"sample{i}.tsv"
+        tsv.write_text(f"sample\ttype\nsample{i}\tA\n")
+        inputs.append(tsv)
+    output = tmp_path / name
+    assert merge_summaries(inputs, output, buffer_size=2) == 3
+    assert read_lines(output) == ["sample\ttype", "sample0\tA", "sample1\tA", "sample2\tA"]
+
+
+@pytest.mark.parametrize("name", ["summary.tsv.bz2", "summary.tsv.xz"])
+def test_unsupported_compression(tmp_path, name):
+    output = tmp_path / name
+    with pytest.raises(ValueError, match="expected no compression or one of: .gz, .zst"):
+        append_summary([{"sample": "a", "type": "A"}], output, COLUMNS)
+    with pytest.raises(ValueError, match="expected no compression"):
+        merge_summaries([], output)
+    assert not output.exists()
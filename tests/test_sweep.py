@@ -0,0 +1,38 @@
+import pytest
+
+from camlhmp.sweep import flag_type_changes, get_task_groups, parse_grid
+
+
+@pytest.fixture
+def targets(tmp_path):
+    fasta = tmp_path / "targets.fasta"
+    fasta.write_text(f">mecA\n{'A' * 200}\n>short\n{'C' * 30}\n")
+    return fasta
+
+
+def test_parse_grid():
+    assert parse_grid("95,90,95") == [90, 95]
+    assert parse_grid("90:100:5") == [90, 95, 100]
+    with pytest.raises(ValueError):
+        parse_grid("90-100")
+
+
+def test_task_groups_follow_identity(targets):
+    # Divergent identities are searched with dc-megablast, short targets always with blastn-short
+    assert get_task_groups(targets, [95, 80, 85, 90]) == [
+        [{"mecA": "dc-megablast", "short": "blastn-short"}, [80, 85]],
+        [{"mecA": "megablast", "short": "blastn-short"}, [90, 95]],
+    ]
+
+
+def test_fixed_task_is_one_group(targets):
+    assert get_task_groups(targets, [80, 95], task="blastn") == [
+        [{"mecA": "blastn", "short": "blastn"}, [80, 95]],
+    ]
+
+
+def test_flag_type_changes():
+    sweep = [{"type": "I", "type_changed": False}, {"type": "I", "type_changed": True}]
+    assert [row["type_changed"] for row in flag_type_changes("sample", sweep)] == [False, False]
+    sweep.append({"type": "II", "type_changed": False})
+    assert [row["type_changed"] for row in flag_type_changes("sample", sweep)] == [True, True, True]
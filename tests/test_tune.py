@@ -0,0 +1,60 @@
+import pytest
+
+from camlhmp.engines.blast import BLAST_PRESETS, HIT_LIMIT_PARAMS
+from camlhmp.tune import get_tune_candidates, get_tuned_params
+
+
+def test_tune_candidates_blastn():
+    candidates = get_tune_candidates("blast", "blastn")
+    assert candidates["fast"] == BLAST_PRESETS["fast"]
+    assert candidates["sensitive"] == BLAST_PRESETS["sensitive"]
+    assert candidates["word_size=32"] == {"word_size": 32}
+    assert candidates["max_hsps=1;word_size=64"] == {"max_hsps": 1, "word_size": 64}
+
+    # The same parameters are only tried once, under the first name they were given
+    params = list(candidates.values())
+    assert all(params.count(candidate) == 1 for candidate in params)
+    assert "max_hsps=1;max_target_seqs=1" not in candidates
+
+
+def test_tune_candidates_regions_have_no_hit_limits():
+    candidates = get_tune_candidates("blast", "blastn", mode="regions")
+    assert "fast" not in candidates
+    assert not any(param in params for params in candidates.values() for param in HIT_LIMIT_PARAMS)
+    assert sorted(candidates) == ["sensitive", "word_size=32", "word_size=48", "word_size=64"]
+
+
+def test_tune_candidates_tool_and_word_sizes():
+    # Tasks and dust filtering only apply to blastn
+    candidates = get_tune_candidates("blast", "tblastn", word_sizes=[5])
+    assert "sensitive" not in candidates
+    assert candidates["word_size=5"] == {"word_size": 5}
+    assert not any(params.get("word_size") not in [None, 5] for params in candidates.values())
+
+    with pytest.raises(ValueError, match="no parameters to tune"):
+        get_tune_candidates("blast", "tblastn", mode="regions", word_sizes=[])
+    with pytest.raises(ValueError, match="no parameters to tune"):
+        get_tune_candidates("kmer", "blastn")
+
+
+def tune_rows(candidates):
+    rows = [{"candidate": "baseline", "time": 10.0, "discordant": 0}]
+    return rows + [{"candidate": name, "time": time, "discordant": discordant} for name, time, discordant in candidates]
+
+
+def test_tuned_params_fastest_concordant():
+    rows = tune_rows([["word_size=32", 8.0, 0], ["fast", 5.0, 2], ["word_size=64", 6.0, 0]])
+    assert get_tuned_params(rows)["candidate"] == "word_size=64"
+
+
+def test_tuned_params_discordance_gate():
+    # Faster candidates that change a call are never selected
+    assert get_tuned_params(tune_rows([["fast", 5.0, 1], ["sensitive", 2.0, 3]])) is None
+
+
+def test_tuned_params_min_speedup_gate():
+    # 9.6s is within timing noise of the 10s baseline at the default speedup
+    rows = tune_rows([["word_size=32", 9.6, 0], ["word_size=48", 10.5, 0]])
+    assert get_tuned_params(rows) is None
+    assert get_tuned_params(rows, min_speedup=1.0)["candidate"] == "word_size=32"
+    assert get_tuned_params(tune_rows([["word_size=32", 5.0, 0]]), min_speedup=2.5) is None